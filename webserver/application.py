@@ -1,175 +1,479 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, make_response, Response
 from flask_cors import CORS
+from functools import wraps
 import sqlite3
 import json
+import base64
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+import time
+import heapq
+import storage
+import rollups
+from cache import response_cache
+from events import broker
+import ingest
+import export
+import instrumentation
+import wire
+import payloads
+import payload_store
+import optimizer
+import livestats
+import zlib
 
 app = Flask(__name__)
+# Request bodies over this size are refused with 413 before a view reads them
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_BODY_BYTES', str(64 * 1024 * 1024)))
 CORS(app)
-
-DB_NAME = os.getenv('DB_NAME', 'data.db')
-
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+instrumentation.init_app(app)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Columns pushed to live dashboards for each new row (same names as /api/stats)
+EVENT_COLUMNS = {
+    'transmissions': '''id, timestamp, sf, bw, cr, type, source, rssi as avg_rssi, snr as avg_snr,
+        datarate as avg_datarate, latency as avg_latency, compression_ratio as avg_compression''',
+    'receptions': 'id, timestamp, rssi, snr'
+}
+
+# Larger writes are announced with a single 'resync' event instead of row by row
+EVENT_MAX_ROWS = 500
+
+# Running per-source and last-hour figures for /api/stats (see livestats.py)
+live_stats = livestats.LiveStats(storage.connection, storage.changes.poll)
+# Rows committed by other processes (other workers of serve.py, the serial gateway) expire
+# cached responses too
+response_cache.watch(storage.changes.poll)
+
+def write_rows(table, values):
+    # Shared write path for every ingest route: one transaction, then cache invalidation
+    # and a live update for connected dashboards
+    new_rows = []
+    with storage.transaction() as conn:
+        ingest.insert_rows(conn, table, values)
+        # Rows written in one transaction get contiguous ids ending at last_insert_rowid()
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        if broker.has_subscribers() and len(values) <= EVENT_MAX_ROWS:
+            new_rows = conn.execute(f'''
+                SELECT {EVENT_COLUMNS[table]} FROM {table} WHERE id > ? AND id <= ? ORDER BY id
+            ''', (last_id - len(values), last_id)).fetchall()
+    live_stats.add(table, values, last_id)
+    response_cache.invalidate(table)
+    instrumentation.ingested_rows.inc(table, amount=len(values))
+    comparison = live_stats.comparison() if table == 'transmissions' and broker.has_subscribers() else None
+
+    if new_rows:
+        broker.publish(table[:-1], {'rows': [dict(row) for row in new_rows]})
+    elif broker.has_subscribers():
+        broker.publish('resync', {'table': table})
+    if comparison:
+        broker.publish('comparison', comparison)
+
+ingest_queue = ingest.create_queue(write_rows)
+
+def submit_rows(table, values):
+    # Single-row ingest: validated rows are queued for the background writer and
+    # acknowledged right away, or written inline when INGEST_MODE=sync
+    if ingest.INGEST_MODE == 'sync':
+        write_rows(table, values)
+        return jsonify({'status': 'success'}), 201
+    if not ingest_queue.submit(table, values):
+        response = jsonify({'error': 'ingest queue is full, retry later'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    return jsonify({'status': 'queued'}), 202
+
+def optional(value, cast):
+    return None if value is None else cast(value)
+
+def transmission_row(data):
+    if not isinstance(data, dict):
+        raise ValueError('row must be a JSON object')
+    return (
+        str(data['type']), str(data['data']), int(data['sf']), int(data['bw']), int(data['cr']),
+        optional(data['rssi'], float), optional(data['snr'], float), optional(data['delay'], int),
+        optional(data['datarate'], float), optional(data['latency'], float),
+        str(data.get('source', 'standard')), float(data.get('compressionRatio', 1.0))
+    )
+
+def reception_row(data):
+    if not isinstance(data, dict):
+        raise ValueError('row must be a JSON object')
+    return (str(data['data']), optional(data['rssi'], float), optional(data['snr'], float))
+
+# Upper bound on a batch body after gzip decoding
+BATCH_MAX_BYTES = 64 * 1024 * 1024
+
+def batch_body():
+    # Batch uploads may be sent with Content-Encoding: gzip
+    body = request.get_data()
+    if request.content_encoding != 'gzip':
+        return body
+    decompressor = zlib.decompressobj(wbits=31)
+    try:
+        body = decompressor.decompress(body, BATCH_MAX_BYTES)
+    except zlib.error:
+        raise ValueError('body is not valid gzip')
+    if decompressor.unconsumed_tail:
+        raise ValueError(f'batch is larger than {BATCH_MAX_BYTES} bytes once decompressed')
+    if not decompressor.eof:
+        raise ValueError('gzip body is truncated')
+    if decompressor.unused_data:
+        raise ValueError('unexpected data after the gzip stream')
+    return body
+
+def read_batch():
+    # Accept either a JSON array or newline-delimited JSON (one object per line)
+    body = batch_body().decode('utf-8')
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson') or not body.lstrip().startswith('['):
+        rows = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(e)
+        return rows
+    rows = json.loads(body)
+    if not isinstance(rows, list):
+        raise ValueError('batch body must be a JSON array or NDJSON')
+    return rows
+
+def insert_binary_batch(table):
+    # Binary batches (see wire.py) are typed by their layout, so there is no per-row
+    # validation: the batch is either decoded whole or rejected
+    try:
+        values = wire.decode(batch_body(), table)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if values:
+        try:
+            write_rows(table, values)
+        except sqlite3.Error as e:
+            return jsonify({'error': str(e)}), 500
+    return jsonify({'status': 'success', 'inserted': len(values), 'rejected': 0, 'errors': []}), 201
+
+def insert_batch(table, make_row):
+    if request.mimetype == wire.MIMETYPE:
+        return insert_binary_batch(table)
+    try:
+        rows = read_batch()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Validate every row up front so one bad record doesn't abort the batch
+    values = []
+    errors = []
+    for index, item in enumerate(rows):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            values.append(make_row(item))
+        except KeyError as e:
+            errors.append({'index': index, 'error': f'missing field {e}'})
+        except (TypeError, ValueError) as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    if values:
+        try:
+            write_rows(table, values)
+        except sqlite3.Error as e:
+            return jsonify({'error': str(e)}), 500
+
+    result = {'status': 'success', 'inserted': len(values), 'rejected': len(errors), 'errors': errors}
+    if not values and errors:
+        result['status'] = 'error'
+        return jsonify(result), 400
+    if errors:
+        result['status'] = 'partial'
+        return jsonify(result), 207
+    return jsonify(result), 201
+
 @app.route('/api/transmission', methods=['POST'])
 def add_transmission():
     try:
         data = request.get_json()
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO transmissions (
-                type, data, sf, bw, cr, rssi, snr, delay, datarate, latency, source, compression_ratio
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data['type'], data['data'], data['sf'], data['bw'], data['cr'],
-            data['rssi'], data['snr'], data['delay'], data['datarate'],
-            data['latency'], data.get('source', 'standard'), data.get('compressionRatio', 1.0)
-        ))
-        
-        conn.commit()
-        conn.close()
-        return jsonify({'status': 'success'}), 201
+        return submit_rows('transmissions', [transmission_row(data)])
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/transmissions/batch', methods=['POST'])
+def add_transmissions_batch():
+    return insert_batch('transmissions', transmission_row)
+
 @app.route('/api/reception', methods=['POST'])
 def add_reception():
     try:
         data = request.get_json()
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO receptions (data, rssi, snr) VALUES (?, ?, ?)
-        ''', (data['data'], data['rssi'], data['snr']))
-        
-        conn.commit()
-        conn.close()
-        return jsonify({'status': 'success'}), 201
+        return submit_rows('receptions', [reception_row(data)])
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/receptions/batch', methods=['POST'])
+def add_receptions_batch():
+    return insert_batch('receptions', reception_row)
+
+def data_version(conn):
+    # Row ids only ever grow, so the newest id of each table identifies the data snapshot
+    row = conn.execute('''
+        SELECT (SELECT MAX(id) FROM transmissions), (SELECT MAX(id) FROM receptions)
+    ''').fetchone()
+    return row[0] or 0, row[1] or 0
+
+def versioned(window=None):
+    # Answer 304 Not Modified without running the view when no rows were added since the
+    # client's last poll. window (seconds) also expires the ETag for views that depend on
+    # the current time, such as the last-hour reception averages.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with storage.connection() as conn:
+                transmissions_id, receptions_id = data_version(conn)
+            etag = f'{transmissions_id}-{receptions_id}'
+            if window:
+                etag += f'-{int(time.time() // window)}'
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def parse_since_id():
+    since_id = request.args.get('since_id', type=int)
+    if 'since_id' in request.args and since_id is None:
+        raise ValueError('since_id must be an integer')
+    return since_id
+
+# Columns exposed by /api/stats, keyed by their name in the response
+STATS_COLUMNS = {
+    'id': 'id',
+    'sf': 'sf',
+    'bw': 'bw',
+    'cr': 'cr',
+    'type': 'type',
+    'timestamp': 'timestamp',
+    'source': 'source',
+    'avg_rssi': 'rssi',
+    'avg_snr': 'snr',
+    'avg_datarate': 'datarate',
+    'avg_latency': 'latency',
+    'avg_compression': 'compression_ratio',
+    # Resolved to the payload text after the page is read (see payload_store.py)
+    'data': 'payload_id'
+}
+
+STATS_DEFAULT_LIMIT = 100
+STATS_MAX_LIMIT = 1000
+# since_id polls at most this many ids behind the newest row read the new rows by rowid
+# and order them in Python; further behind, the page walk stops early anyway
+STATS_SEEK_IDS = 2 * STATS_MAX_LIMIT
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(f"{row['timestamp']}|{row['id']}".encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return timestamp, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('invalid cursor')
+
+def parse_limit(default, maximum):
+    # Read the raw value: get(type=int) falls back to the default on bad input
+    raw = request.args.get('limit')
+    if raw is None:
+        return min(default, maximum)
+    try:
+        limit = int(raw)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, maximum)
+
+def parse_fields():
+    fields = request.args.get('fields')
+    if not fields:
+        return list(STATS_COLUMNS)
+    selected = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in selected if f not in STATS_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    # id and timestamp are always returned so the client can page
+    return [f for f in STATS_COLUMNS if f in selected or f in ('id', 'timestamp')]
+
+# Fields decoded_data is computed from, added to the page when ?decode=1
+DECODE_FIELDS = ('type', 'source', 'avg_compression', 'data')
+
+def newest_rows(cursor, count):
+    # The count newest rows by (timestamp, id), newest first, of a cursor in any order.
+    # Fetched in chunks so a poll far behind doesn't hold every new row at once.
+    newest = []
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            return newest
+        newest = heapq.nlargest(count, newest + rows, key=lambda row: (row['timestamp'] or '', row['id']))
+
+def decoded_data(row):
+    # Only the enhanced sender compresses its payloads
+    if row['source'] != 'enhanced' or row['data'] is None:
+        return row['data']
+    return payloads.decompress(row['type'], row['data'], row['avg_compression'])
+
 @app.route('/api/stats')
+@versioned(window=60)
+@response_cache.cached('transmissions', 'receptions')
 def get_stats():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get all transmission metrics with timestamp and type
-    cursor.execute('''
-        SELECT sf, bw, cr, type, timestamp, source, rssi as avg_rssi, snr as avg_snr,
-        datarate as avg_datarate, latency as avg_latency, compression_ratio as avg_compression, data
-        FROM transmissions
-        ORDER BY timestamp DESC
-    ''')
-    
-    transmission_stats = cursor.fetchall()
-    
-    # Get reception quality metrics
-    cursor.execute('''
-        SELECT AVG(rssi) as avg_rssi, AVG(snr) as avg_snr
-        FROM receptions
-        WHERE timestamp >= datetime('now', '-1 hour')
-    ''')
-    
-    reception_stats = cursor.fetchone()
-    
-    # Get average data rate and latency by source
-    cursor.execute('''
-        SELECT source, AVG(datarate) as avg_datarate, AVG(latency) as avg_latency, 
-        AVG(compression_ratio) as avg_compression
-        FROM transmissions
-        GROUP BY source
-    ''')
-    
-    source_metrics = cursor.fetchall()
-    
-    # Get performance comparison between standard and enhanced
-    cursor.execute('''
-        SELECT 
-            'comparison' as metric,
-            (SELECT AVG(datarate) FROM transmissions WHERE source = 'enhanced') / 
-            NULLIF((SELECT AVG(datarate) FROM transmissions WHERE source = 'standard'), 0) as datarate_improvement,
-            (SELECT AVG(latency) FROM transmissions WHERE source = 'standard') / 
-            NULLIF((SELECT AVG(latency) FROM transmissions WHERE source = 'enhanced'), 0) as latency_improvement,
-            (SELECT AVG(compression_ratio) FROM transmissions WHERE source = 'enhanced') as compression_ratio
-    ''')
-    
-    comparison = cursor.fetchone()
+    try:
+        limit = parse_limit(STATS_DEFAULT_LIMIT, STATS_MAX_LIMIT)
+        fields = parse_fields()
+        since_id = parse_since_id()
+        cursor_position = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    decode = request.args.get('decode') == '1'
+    if decode:
+        fields = [f for f in STATS_COLUMNS if f in fields or f in DECODE_FIELDS]
+
+    # Newest page first, keyset-paginated on (timestamp, id)
+    conditions = []
+    params = []
+    if cursor_position:
+        conditions.append('(timestamp, id) < (?, ?)')
+        params.extend(cursor_position)
+    if since_id is not None:
+        conditions.append('id > ?')
+        params.append(since_id)
+    if request.args.get('since'):
+        conditions.append('timestamp >= ?')
+        params.append(request.args['since'])
+    if request.args.get('until'):
+        conditions.append('timestamp < ?')
+        params.append(request.args['until'])
+    if request.args.get('source'):
+        conditions.append('source = ?')
+        params.append(request.args['source'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    columns = ', '.join(f'{STATS_COLUMNS[f]} as {f}' for f in fields)
+
+    with storage.connection() as conn:
+        cursor = conn.cursor()
     
-    conn.close()
+        seek = since_id is not None and data_version(conn)[0] - since_id <= STATS_SEEK_IDS
+        if not seek:
+            # Get one page of transmission metrics with timestamp and type
+            cursor.execute(f'''
+                SELECT {columns}
+                FROM transmissions
+                {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', params + [limit + 1])
+            transmission_stats = cursor.fetchall()
+        else:
+            # Polls for new rows seek the rowid range after since_id. Walking an index in
+            # page order would read all of it when fewer than limit rows are new, so
+            # NOT INDEXED keeps the planner off the indexes and the page is ordered here.
+            cursor.execute(f'''
+                SELECT {columns}
+                FROM transmissions NOT INDEXED
+                {where}
+                ORDER BY id
+            ''', params)
+            transmission_stats = newest_rows(cursor, limit + 1)
+        next_cursor = None
+        if len(transmission_stats) > limit:
+            transmission_stats = transmission_stats[:limit]
+            next_cursor = encode_cursor(transmission_stats[-1])
+
+        # Only pages that include data pay for decoding, once per distinct payload
+        texts = payload_store.load(conn, [row['data'] for row in transmission_stats]) if 'data' in fields else None
     
+    transmission_stats = [dict(row) for row in transmission_stats]
+    if texts is not None:
+        for row in transmission_stats:
+            row['data'] = texts.get(row['data'])
+    if decode:
+        for row in transmission_stats:
+            row['decoded_data'] = decoded_data(row)
+
     return jsonify({
-        'transmission_stats': [dict(row) for row in transmission_stats],
-        'reception_stats': dict(reception_stats) if reception_stats else {},
-        'source_metrics': [dict(row) for row in source_metrics],
-        'comparison': dict(comparison) if comparison else {}
+        'transmission_stats': transmission_stats,
+        'next_cursor': next_cursor,
+        # Summary figures come from memory: constant time whatever the table sizes
+        'reception_stats': live_stats.reception_stats(),
+        'source_metrics': live_stats.source_metrics(),
+        'comparison': live_stats.comparison()
     })
 
 @app.route('/api/metrics')
+@versioned()
+@response_cache.cached('transmissions')
 def get_metrics():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get metrics for different SF values by source
-    cursor.execute('''
-        SELECT sf, source, AVG(rssi) as avg_rssi, AVG(snr) as avg_snr,
-        AVG(datarate) as avg_datarate, AVG(latency) as avg_latency,
-        AVG(compression_ratio) as avg_compression,
-        COUNT(*) as count
-        FROM transmissions
-        WHERE datarate > 0
-        GROUP BY sf, source
-        ORDER BY sf, source
-    ''')
+    # All three aggregations read the rollup tables maintained on insert (see rollups.py)
+    metric_averages = f'''
+        {rollups.avg('rssi')} as avg_rssi, {rollups.avg('snr')} as avg_snr,
+        {rollups.avg('datarate')} as avg_datarate, {rollups.avg('latency')} as avg_latency,
+        {rollups.avg('compression_ratio')} as avg_compression
+    '''
+
+    with storage.connection() as conn:
+        cursor = conn.cursor()
     
-    sf_metrics = cursor.fetchall()
+        # Get metrics for different SF values by source
+        cursor.execute(f'''
+            SELECT sf, source, {metric_averages},
+            SUM(count) as count
+            FROM rollup_hour
+            WHERE ok = 1
+            GROUP BY sf, source
+            ORDER BY sf, source
+        ''')
     
-    # Get metrics for different BW values by source
-    cursor.execute('''
-        SELECT bw, source, AVG(rssi) as avg_rssi, AVG(snr) as avg_snr,
-        AVG(datarate) as avg_datarate, AVG(latency) as avg_latency,
-        AVG(compression_ratio) as avg_compression,
-        COUNT(*) as count
-        FROM transmissions
-        WHERE datarate > 0
-        GROUP BY bw, source
-        ORDER BY bw, source
-    ''')
+        sf_metrics = cursor.fetchall()
     
-    bw_metrics = cursor.fetchall()
+        # Get metrics for different BW values by source
+        cursor.execute(f'''
+            SELECT bw, source, {metric_averages},
+            SUM(count) as count
+            FROM rollup_hour
+            WHERE ok = 1
+            GROUP BY bw, source
+            ORDER BY bw, source
+        ''')
     
-    # Get historical performance data for optimization analysis
-    cursor.execute('''
-        SELECT 
-            strftime('%Y-%m-%d %H:%M', timestamp) as time_period,
-            source,
-            AVG(sf) as avg_sf,
-            AVG(bw) as avg_bw,
-            AVG(cr) as avg_cr,
-            AVG(datarate) as avg_datarate,
-            AVG(latency) as avg_latency,
-            COUNT(*) as transmission_count
-        FROM transmissions
-        GROUP BY time_period, source
-        ORDER BY timestamp DESC
-        LIMIT 24
-    ''')
+        bw_metrics = cursor.fetchall()
     
-    historical_data = cursor.fetchall()
+        # Get historical performance data for optimization analysis. Ordering by the
+        # full key prefix lets SQLite walk the primary key backwards and stop after 24 groups.
+        cursor.execute(f'''
+            SELECT 
+                bucket as time_period,
+                source,
+                SUM(sf * count) * 1.0 / SUM(count) as avg_sf,
+                SUM(bw * count) * 1.0 / SUM(count) as avg_bw,
+                SUM(cr * count) * 1.0 / SUM(count) as avg_cr,
+                {rollups.avg('datarate')} as avg_datarate,
+                {rollups.avg('latency')} as avg_latency,
+                SUM(count) as transmission_count
+            FROM rollup_minute
+            GROUP BY bucket, source
+            ORDER BY bucket DESC, source DESC
+            LIMIT 24
+        ''')
     
-    conn.close()
+        historical_data = cursor.fetchall()
     
     return jsonify({
         'sf_metrics': [dict(row) for row in sf_metrics],
@@ -177,64 +481,238 @@ def get_metrics():
         'historical_data': [dict(row) for row in historical_data]
     })
 
+recommender = optimizer.Optimizer(storage.connection)
+
+@app.route('/api/recommend')
+@versioned()
+@response_cache.cached('transmissions')
+def get_recommendation():
+    # Best SF/BW/CR for a link by expected goodput, from its history (see optimizer.py)
+    try:
+        limit = parse_limit(5, optimizer.GRID[0] * optimizer.GRID[1] * optimizer.GRID[2])
+        payload_bytes = request.args.get('payload', optimizer.DEFAULT_PAYLOAD_BYTES, type=int)
+        if payload_bytes is None or not 1 <= payload_bytes <= optimizer.MAX_PAYLOAD_BYTES:
+            raise ValueError(f'payload must be an integer between 1 and {optimizer.MAX_PAYLOAD_BYTES}')
+        snr = request.args.get('snr', type=float)
+        if 'snr' in request.args and snr is None:
+            raise ValueError('snr must be a number')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(recommender.recommend(request.args.get('source') or None, payload_bytes, snr, limit))
+
+TIMESERIES_SOURCES = ['standard', 'enhanced']
+TIMESERIES_METRICS = ['rssi', 'snr', 'latency', 'datarate', 'compression_ratio']
+
+def average_points(rows):
+    # AVG() of every metric per (timestamp, source), in that order, for rows in any order
+    groups = {}
+    for timestamp, source, *values in rows:
+        sums = groups.get((timestamp, source))
+        if sums is None:
+            sums = groups[(timestamp, source)] = [[0, 0] for _ in values]
+        for total, value in zip(sums, values):
+            if value is not None:
+                total[0] += value
+                total[1] += 1
+    return [
+        (timestamp, source, *(total / count if count else None for total, count in sums))
+        for (timestamp, source), sums in sorted(groups.items())
+    ]
+
+def build_timeseries(rows):
+    # Single pass over rows ordered by timestamp: every distinct timestamp gets one slot on
+    # the shared axis and each source's series holds its value there, or None
+    timestamps = []
+    series = {source: {metric: [] for metric in TIMESERIES_METRICS} for source in TIMESERIES_SOURCES}
+    columns = [series[source][metric] for source in TIMESERIES_SOURCES for metric in TIMESERIES_METRICS]
+    slot = {source: [series[source][metric] for metric in TIMESERIES_METRICS] for source in TIMESERIES_SOURCES}
+    last_timestamp = None
+    for timestamp, source, *values in rows:
+        if timestamp != last_timestamp:
+            timestamps.append(timestamp)
+            for column in columns:
+                column.append(None)
+            last_timestamp = timestamp
+        for column, value in zip(slot[source], values):
+            column[-1] = value
+    return timestamps, series
+
+def downsample(timestamps, series, max_points):
+    # Min/max bucketing: split the axis into max_points / 2 buckets and keep, for every
+    # series, the smallest and largest value of each bucket in their original order. The
+    # bucket's first and last timestamps become the two shared axis slots.
+    n = len(timestamps)
+    if n <= max_points:
+        return timestamps, series
+    bucket_size = -(-n // max(max_points // 2, 1))
+    sampled_timestamps = []
+    sampled = {source: {metric: [] for metric in metrics} for source, metrics in series.items()}
+    for start in range(0, n, bucket_size):
+        end = min(start + bucket_size, n)
+        width = 1 if end - start == 1 else 2
+        sampled_timestamps.append(timestamps[start])
+        if width == 2:
+            sampled_timestamps.append(timestamps[end - 1])
+        for source, metrics in series.items():
+            for metric, values in metrics.items():
+                points = [(i, values[i]) for i in range(start, end) if values[i] is not None]
+                out = sampled[source][metric]
+                if not points:
+                    out.extend([None] * width)
+                elif width == 1:
+                    out.append(points[0][1])
+                else:
+                    low = min(points, key=lambda p: p[1])
+                    high = max(points, key=lambda p: p[1])
+                    first, second = sorted((low, high))
+                    out.extend([first[1], second[1]] if first != second else [first[1], None])
+    return sampled_timestamps, sampled
+
 @app.route('/api/timeseries')
+@versioned()
+@response_cache.cached('transmissions')
 def get_timeseries():
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get all transmissions with timestamp for time-series analysis
-    cursor.execute('''
-        SELECT timestamp, source, rssi, snr, latency, datarate, compression_ratio
-        FROM transmissions
-        WHERE datarate > 0
-        ORDER BY timestamp ASC
-    ''')
+    try:
+        since_id = parse_since_id()
+        max_points = request.args.get('max_points', type=int)
+        if 'max_points' in request.args and (max_points is None or max_points < 2):
+            raise ValueError('max_points must be an integer >= 2')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        last_id, _ = data_version(conn)
     
-    transmissions = cursor.fetchall()
+        # Get transmissions with timestamp for time-series analysis, optionally only
+        # those appended after since_id so the client can extend its charts. Rows from
+        # the same source within the same second are averaged into one point. Full loads
+        # read the partial idx_transmissions_timeseries (datarate > 0) in (timestamp,
+        # source) order, so grouping needs no sort. The unary + keeps the source filter
+        # off idx_transmissions_source, which would read each source's range and then
+        # sort the result.
+        # Increments seek the rowid range after since_id instead, and the few new rows
+        # are averaged here rather than sorted in SQL.
+        if since_id is None:
+            cursor.execute('''
+                SELECT timestamp, source, AVG(rssi), AVG(snr), AVG(latency), AVG(datarate),
+                AVG(compression_ratio)
+                FROM transmissions
+                WHERE datarate > 0 AND id <= ? AND +source IN ('standard', 'enhanced')
+                GROUP BY timestamp, source
+                ORDER BY timestamp, source
+            ''', (last_id,))
+            rows = cursor.fetchall()
+        else:
+            cursor.execute('''
+                SELECT timestamp, source, rssi, snr, latency, datarate, compression_ratio
+                FROM transmissions NOT INDEXED
+                WHERE id > ? AND id <= ? AND datarate > 0 AND source IN ('standard', 'enhanced')
+                ORDER BY id
+            ''', (since_id, last_id))
+            rows = average_points(cursor.fetchall())
     
-    # Format the results
-    result = {
-        'timestamps': [],
-        'standard': {
-            'rssi': [],
-            'snr': [],
-            'latency': [],
-            'datarate': [],
-            'compression_ratio': []
-        },
-        'enhanced': {
-            'rssi': [],
-            'snr': [],
-            'latency': [],
-            'datarate': [],
-            'compression_ratio': []
-        }
-    }
+        timestamps, series = build_timeseries(rows)
     
-    # Process the data
-    for row in transmissions:
-        timestamp, source, rssi, snr, latency, datarate, compression_ratio = row
-        
-        # Only add timestamp once
-        if timestamp not in result['timestamps']:
-            result['timestamps'].append(timestamp)
-        
-        # Add data to appropriate source
-        if source == 'standard':
-            result['standard']['rssi'].append(rssi)
-            result['standard']['snr'].append(snr)
-            result['standard']['latency'].append(latency)
-            result['standard']['datarate'].append(datarate)
-            result['standard']['compression_ratio'].append(compression_ratio)
-        elif source == 'enhanced':
-            result['enhanced']['rssi'].append(rssi)
-            result['enhanced']['snr'].append(snr)
-            result['enhanced']['latency'].append(latency)
-            result['enhanced']['datarate'].append(datarate)
-            result['enhanced']['compression_ratio'].append(compression_ratio)
+    if max_points:
+        timestamps, series = downsample(timestamps, series, max_points)
     
+    result = {'last_id': last_id, 'timestamps': timestamps}
+    result.update(series)
     return jsonify(result)
 
+_stream_watcher = None
+_stream_watcher_lock = threading.Lock()
+
+def watch_other_writers():
+    # Rows written by other processes never pass through this process's write_rows(), so
+    # while dashboards are connected, poll for them and announce them as resync events
+    while True:
+        time.sleep(storage.CHANGE_POLL_INTERVAL)
+        if not broker.has_subscribers():
+            continue
+        tables = live_stats.catch_up()
+        for table in tables:
+            broker.publish('resync', {'table': table})
+        if 'transmissions' in tables:
+            broker.publish('comparison', live_stats.comparison())
+
+def start_stream_watcher():
+    global _stream_watcher
+    with _stream_watcher_lock:
+        if _stream_watcher is None or not _stream_watcher.is_alive():
+            _stream_watcher = threading.Thread(target=watch_other_writers, name='stream-watcher', daemon=True)
+            _stream_watcher.start()
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+@app.route('/api/stream')
+def stream():
+    # Server-Sent Events feed of newly ingested rows and updated comparison figures.
+    # Under a WSGI server each open stream holds a thread; asgi.py serves this route on
+    # the event loop instead (broker.listen_async), without a thread per client.
+    start_stream_watcher()
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(broker.listen(last_event_id), mimetype='text/event-stream', headers=STREAM_HEADERS)
+
+@app.route('/api/export.csv')
+def export_csv():
+    # Streams the transmissions table as CSV, chunk by chunk, with the same filters as
+    # setup_db.py --extract (archived months in the range included); ?compress=gzip
+    # returns a .csv.gz download
+    since, until, source = request.args.get('since'), request.args.get('until'), request.args.get('source')
+    compress = request.args.get('compress') == 'gzip'
+
+    def generate():
+        compressor = zlib.compressobj(6, wbits=31) if compress else None
+        for chunk, _ in export.iter_partitions_csv(since, until, source):
+            data = chunk.encode('utf-8')
+            yield compressor.compress(data) if compressor else data
+        if compressor:
+            yield compressor.flush()
+
+    filename = 'transmissions.csv.gz' if compress else 'transmissions.csv'
+    return Response(generate(), mimetype='application/gzip' if compress else 'text/csv', headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+@app.route('/api/ingest')
+def get_ingest_stats():
+    return jsonify(ingest_queue.stats())
+
+@app.route('/api/cache')
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+instrumentation.register(instrumentation.Gauge(
+    'lora_ingest_queue_rows', 'Rows waiting for the background writer.', lambda: ingest_queue.stats()['queue_rows']))
+instrumentation.register(instrumentation.Gauge(
+    'lora_ingest_rejected_rows_total', 'Rows refused because the ingest queue was full.',
+    lambda: ingest_queue.rejected_rows, kind='counter'))
+instrumentation.register(instrumentation.Gauge(
+    'lora_cache_hits_total', 'Response cache hits.', lambda: response_cache.hits, kind='counter'))
+instrumentation.register(instrumentation.Gauge(
+    'lora_cache_misses_total', 'Response cache misses.', lambda: response_cache.misses, kind='counter'))
+instrumentation.register(instrumentation.Gauge(
+    'lora_stream_subscribers', 'Open live dashboard streams.', lambda: broker.subscribers))
+
+@app.route('/metrics')
+def get_prometheus_metrics():
+    # Prometheus text exposition format: request latency histograms per route, SQL time
+    # and rows per statement, response bytes and ingest counters
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+def shutdown():
+    # Graceful worker exit (serve.py, asgi.py): commit whatever the ingest queue still
+    # holds, then close the pooled connections
+    ingest_queue.flush(timeout=10)
+    ingest_queue.stop()
+    storage.close()
+
 # This is required for AWS Elastic Beanstalk - it looks for an object named 'application'
 application = app
 
@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+from a2wsgi import WSGIMiddleware
+
+import application
+from events import broker
+
+# ASGI entry point for async servers (uvicorn, hypercorn, daphne):
+#
+#   uvicorn asgi:app --workers 4        or        python3 serve.py --worker-class asgi
+#
+# The Flask views are unchanged, so routes and JSON shapes are identical to the WSGI app.
+# They run through a2wsgi's WSGIMiddleware on a pool of ASGI_THREADS threads, since their
+# sqlite3 calls block; the event loop only parses HTTP and holds idle connections.
+# a2wsgi hands response chunks to the loop through a bounded queue, so a slow client
+# pauses the view instead of the worker buffering its output. Routes that stream for
+# as long as the client reads (CSV exports) get their own middleware and pool of
+# ASGI_STREAM_THREADS, so slow downloads never hold the threads views run on.
+#
+# The live dashboard feed (/api/stream) doesn't go through Flask at all: it is served on
+# the event loop from broker.listen_async(), so hundreds of idle viewers hold a queue
+# each rather than a thread. Lifespan shutdown drains the ingest queue before the worker
+# exits.
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '32'))
+ASGI_STREAM_THREADS = int(os.getenv('ASGI_STREAM_THREADS', '32'))
+
+
+def dashboard_stream(headers):
+    application.start_stream_watcher()
+    try:
+        last_event_id = int(headers['last-event-id'])
+    except (KeyError, ValueError):
+        last_event_id = None
+    return broker.listen_async(last_event_id)
+
+
+class Dispatcher:
+    # event_streams maps GET paths to callables that take the request headers (lower-case
+    # names) and return an async iterator of Server-Sent Events messages; download_paths
+    # are the WSGI routes served on the separate stream pool
+    def __init__(self, wsgi_app, threads=ASGI_THREADS, stream_threads=ASGI_STREAM_THREADS,
+                 on_shutdown=None, event_streams=None, stream_headers=None, download_paths=()):
+        # WSGIMiddleware starts its threads on first use, so each forked worker gets its own
+        self.views = WSGIMiddleware(wsgi_app, workers=threads)
+        self.downloads = WSGIMiddleware(wsgi_app, workers=stream_threads)
+        self.download_paths = frozenset(download_paths)
+        self.on_shutdown = on_shutdown
+        self.event_streams = event_streams or {}
+        self.stream_headers = [(b'content-type', b'text/event-stream; charset=utf-8')] + [
+            (k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (stream_headers or {}).items()]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            open_stream = self.event_streams.get(scope['path']) if scope['method'] == 'GET' else None
+            if open_stream is not None:
+                await self._event_stream(open_stream, scope, receive, send)
+            elif scope['path'] in self.download_paths:
+                await self.downloads(scope, receive, send)
+            else:
+                await self.views(scope, receive, send)
+        else:
+            raise ValueError(f"unsupported ASGI scope type {scope['type']!r}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.on_shutdown:
+                    await asyncio.get_running_loop().run_in_executor(None, self.on_shutdown)
+                for middleware in (self.views, self.downloads):
+                    middleware.executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _event_stream(self, open_stream, scope, receive, send):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        events = open_stream(headers)
+
+        async def forward():
+            await send({'type': 'http.response.start', 'status': 200, 'headers': self.stream_headers})
+            async for message in events:
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+
+        forwarding = asyncio.ensure_future(forward())
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await asyncio.wait((forwarding, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            forwarding.cancel()
+            disconnected.cancel()
+            await asyncio.wait((forwarding,))
+            # Unsubscribes from the broker
+            await events.aclose()
+        if not forwarding.cancelled() and forwarding.exception() is not None:
+            raise forwarding.exception()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+
+app = Dispatcher(application.app, on_shutdown=application.shutdown,
+                 event_streams={'/api/stream': dashboard_stream}, stream_headers=application.STREAM_HEADERS,
+                 download_paths=('/api/export.csv',))
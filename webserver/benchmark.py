@@ -0,0 +1,374 @@
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import payload_store
+import storage
+import wire
+
+SPREADING_FACTORS = [7, 8, 9, 10, 11, 12]
+SF_WEIGHTS = [0.35, 0.2, 0.15, 0.12, 0.1, 0.08]
+BANDWIDTHS = [125000, 250000, 500000]
+BW_WEIGHTS = [0.6, 0.25, 0.15]
+CODING_RATES = [5, 6, 7, 8]
+CR_WEIGHTS = [0.55, 0.2, 0.15, 0.1]
+DATA_TYPES = ['text', 'number', 'random', 'image', 'audio']
+PAYLOADS = {
+    'text': ['Hello LoRa', 'Temperature report from node 4', 'C1:H1e2l2o'],
+    'number': ['23.5', '1013.25', '42'],
+    'random': ['RAND:8f3a9c', 'RAND:DICT:0a1b2c', 'RAND:ffffffff'],
+    'image': ['https://example.com/img/sensor.jpg', 'U1:img/sensor.jpg'],
+    'audio': ['https://example.com/audio/clip.mp3', 'U1:audio/clip.mp3']
+}
+FAILURE_RATE = 0.05
+
+INGEST_ROW = {
+    'type': 'text', 'data': 'Hello LoRa', 'sf': 7, 'bw': 125000, 'cr': 5, 'rssi': -85, 'snr': 7.5,
+    'delay': 0, 'datarate': 5468.75, 'latency': 120, 'source': 'enhanced', 'compressionRatio': 1.3
+}
+
+ENDPOINTS = {
+    'ingest': ('POST', '/api/transmission'),
+    'ingest_batch': ('POST', '/api/transmissions/batch'),
+    'ingest_binary': ('POST', '/api/transmissions/batch'),
+    'stats': ('GET', '/api/stats'),
+    'metrics': ('GET', '/api/metrics'),
+    'timeseries': ('GET', '/api/timeseries?max_points=500')
+}
+
+# Rows per request for the batch endpoints (JSON array vs the binary format in wire.py)
+BATCH_ROWS = 100
+
+
+def request_body(name):
+    # (content type, body) sent by a POST endpoint
+    if name == 'ingest_batch':
+        return 'application/json', json.dumps([INGEST_ROW] * BATCH_ROWS)
+    if name == 'ingest_binary':
+        return wire.MIMETYPE, wire.encode('transmissions', [INGEST_ROW] * BATCH_ROWS)
+    return 'application/json', json.dumps(INGEST_ROW)
+
+
+def synthetic_rows(count, days, rng, start_id=0):
+    # Vectorized generation of realistic transmissions: SF/BW/CR drawn from field-test like
+    # distributions, data rate derived from the LoRa bit rate, RSSI/SNR from a noisy link
+    # budget, and a small share of failed (no ACK) packets recorded the way the senders do
+    sf = rng.choice(SPREADING_FACTORS, count, p=SF_WEIGHTS)
+    bw = rng.choice(BANDWIDTHS, count, p=BW_WEIGHTS)
+    cr = rng.choice(CODING_RATES, count, p=CR_WEIGHTS)
+    enhanced = rng.random(count) < 0.5
+    failed = rng.random(count) < FAILURE_RATE
+    rssi = np.clip(rng.normal(-92, 12, count) + (sf - 7) * 1.5, -137, -30).round()
+    snr = np.clip(rng.normal(6, 4, count) - (bw / 125000 - 1), -20, 15).round(2)
+    datarate = (sf * bw / 2.0 ** sf * 4 / cr).round(2)
+    compression = np.where(enhanced, rng.uniform(1.0, 3.0, count), 1.0).round(2)
+    symbol_ms = 2.0 ** sf / (bw / 1000)
+    latency = (symbol_ms * (20 + 8 * cr) + rng.exponential(40, count)).round()
+    rssi = np.where(failed, -120, rssi)
+    snr = np.where(failed, 0, snr)
+    datarate = np.where(failed, 0, datarate)
+
+    start = datetime.now() - timedelta(days=days)
+    step = days * 86400 / max(count, 1)
+    types = rng.choice(DATA_TYPES, count)
+    choice = rng.integers(0, 1 << 30, count)
+    for i in range(count):
+        data_type = types[i]
+        payloads = PAYLOADS[data_type]
+        yield (
+            (start + timedelta(seconds=(start_id + i) * step)).strftime('%Y-%m-%d %H:%M:%S'),
+            data_type, payloads[choice[i] % len(payloads)], int(sf[i]), int(bw[i]), int(cr[i]),
+            int(rssi[i]), float(snr[i]), 0, float(datarate[i]), int(latency[i]),
+            'enhanced' if enhanced[i] else 'standard', float(compression[i])
+        )
+
+
+def seed(rows, days, chunk_rows=100000, seed_value=0):
+    # Fill the benchmark database in one transaction with indexes suspended
+    import setup_db
+    rng = np.random.default_rng(seed_value)
+    started = time.perf_counter()
+    with storage.transaction() as conn:
+        setup_db.create_schema(conn)
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM transmissions')
+        saved = setup_db.suspend_indexes(conn)
+        for offset in range(0, rows, chunk_rows):
+            count = min(chunk_rows, rows - offset)
+            batch = list(synthetic_rows(count, days, rng, offset))
+            conn.executemany('''
+                INSERT INTO transmissions (
+                    timestamp, type, payload_id, sf, bw, cr, rssi, snr, delay, datarate, latency, source, compression_ratio
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', payload_store.replace_texts(conn, batch, 2))
+        setup_db.restore_indexes(conn, saved)
+    return time.perf_counter() - started
+
+
+class TestClientDriver:
+    # In-process requests through Flask's test client: measures server work only
+    def __init__(self):
+        from application import app
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def request(method, path, body, content_type):
+            response = client.open(path, method=method, data=body, content_type=content_type)
+            response.get_data()
+            return response.status_code
+        return request
+
+
+class HTTPDriver:
+    # Real HTTP against a running server, one keep-alive connection per client
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+
+    def session(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+        def request(method, path, body, content_type):
+            conn.request(method, path, body=body, headers={'Content-Type': content_type})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        return request
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def drive(driver, name, concurrency, duration, cold, offset=0):
+    # Raw latencies (ms), error count and elapsed seconds for one endpoint
+    method, path = ENDPOINTS[name]
+    content_type, body = request_body(name) if method == 'POST' else ('application/json', None)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        request = driver.session()
+        local = []
+        failures = 0
+        n = 0
+        while time.perf_counter() < deadline:
+            target = path
+            if cold and method == 'GET':
+                # A unique query string defeats the response cache
+                target += ('&' if '?' in path else '?') + f'_bench={index}-{n}'
+            n += 1
+            started = time.perf_counter()
+            try:
+                status = request(method, target, body, content_type)
+            except Exception:
+                status = None
+            local.append((time.perf_counter() - started) * 1000)
+            if status is None or status >= 400:
+                failures += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failures
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(offset + i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def summarize(name, latencies, errors, elapsed):
+    method, _ = ENDPOINTS[name]
+    body = request_body(name)[1] if method == 'POST' else None
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'request_bytes': len(body) if body else 0,
+        'throughput_rps': len(latencies) / elapsed,
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else None
+        }
+    }
+
+
+def run_endpoint(driver, name, concurrency, duration, cold):
+    return summarize(name, *drive(driver, name, concurrency, duration, cold))
+
+
+def _drive_http(task):
+    url, name, concurrency, duration, cold, offset = task
+    return drive(HTTPDriver(url), name, concurrency, duration, cold, offset)
+
+
+def run_endpoint_processes(url, name, concurrency, duration, cold, processes):
+    # Spread the clients over several processes so the load generator's own GIL doesn't
+    # cap the throughput of a multi-worker server
+    import multiprocessing
+    shares = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    tasks = [(url, name, share, duration, cold, sum(shares[:i])) for i, share in enumerate(shares) if share]
+    with multiprocessing.get_context('spawn').Pool(len(tasks)) as pool:
+        results = pool.map(_drive_http, tasks)
+    latencies = [latency for result in results for latency in result[0]]
+    return summarize(name, latencies, sum(r[1] for r in results), max(r[2] for r in results))
+
+
+def start_server(db, workers, worker_class, port):
+    # serve.py in a subprocess, returned once it accepts connections
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py'),
+               '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+               '--worker-class', worker_class, '--db', db]
+    process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/ingest')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'serve.py with {workers} workers did not start')
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a database and benchmark the API.')
+    parser.add_argument('--db', default='bench.db', help='database file to seed and serve (default bench.db)')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic transmissions to seed (10k-10M)')
+    parser.add_argument('--days', type=float, default=7, help='time span covered by the seeded rows')
+    parser.add_argument('--no-seed', action='store_true', help='reuse the existing database contents')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma-separated subset of ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients per endpoint')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to drive each endpoint')
+    parser.add_argument('--cold', action='store_true', help='bypass the response cache on GET endpoints')
+    parser.add_argument('--url', help='benchmark a running server (e.g. http://localhost:8000) instead of the test client')
+    parser.add_argument('--workers', help='comma-separated worker counts (e.g. 1,2,4,8): start serve.py with each '
+                                          'and report how throughput scales')
+    parser.add_argument('--worker-class', default='threaded', help='serve.py worker class for --workers')
+    parser.add_argument('--client-processes', type=int, default=os.cpu_count() or 1,
+                        help='processes sharing the --concurrency clients in --workers runs (default: one per CPU)')
+    parser.add_argument('--port', type=int, default=18000, help='port serve.py listens on in --workers runs')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    storage.configure(db_name=args.db)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'db': args.db,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'driver': 'http' if args.url else 'test_client',
+        'cold': args.cold
+    }
+    if not args.no_seed:
+        print(f'Seeding {args.rows} rows into {args.db}...', file=sys.stderr)
+        report['seed_seconds'] = seed(args.rows, args.days)
+    with storage.connection() as conn:
+        report['rows'] = conn.execute('SELECT COUNT(*) FROM transmissions').fetchone()[0]
+
+    if args.workers:
+        # Throughput against serve.py at each worker count, on the same data
+        counts = [int(n) for n in args.workers.split(',')]
+        report.update(driver='serve.py', worker_class=args.worker_class, cpus=os.cpu_count(),
+                      client_processes=args.client_processes, scaling={})
+        for workers in counts:
+            process = start_server(args.db, workers, args.worker_class, args.port)
+            url = f'http://127.0.0.1:{args.port}'
+            try:
+                results = report['scaling'][workers] = {}
+                for name in endpoints:
+                    print(f'Driving {name} on {workers} workers with {args.concurrency} clients '
+                          f'for {args.duration}s...', file=sys.stderr)
+                    results[name] = run_endpoint_processes(url, name, args.concurrency, args.duration, args.cold,
+                                                           args.client_processes)
+            finally:
+                stop_server(process)
+        base = report['scaling'][counts[0]]
+        report['speedup'] = {
+            workers: {name: results[name]['throughput_rps'] / base[name]['throughput_rps']
+                      for name in endpoints if base[name]['throughput_rps']}
+            for workers, results in report['scaling'].items()
+        }
+    else:
+        driver = HTTPDriver(args.url) if args.url else TestClientDriver()
+        report['endpoints'] = {}
+        for name in endpoints:
+            print(f'Driving {name} with {args.concurrency} clients for {args.duration}s...', file=sys.stderr)
+            report['endpoints'][name] = run_endpoint(driver, name, args.concurrency, args.duration, args.cold)
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
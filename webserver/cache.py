@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, current_app
+
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '256'))
+CACHE_TTL = float(os.getenv('CACHE_TTL', '30'))
+
+
+class LRUBackend:
+    # Default in-process backend. Any object with the same get/set/clear methods
+    # (e.g. a wrapper around a shared Redis/memcached client) can be plugged in instead.
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    # Memoizes serialized JSON responses per endpoint + query string. Each cached view
+    # declares the tables it reads; writing to a table bumps that table's generation,
+    # which is part of the key, so only the affected entries stop matching. Writes from
+    # other processes are only seen through watch(), and then expire every entry.
+    def __init__(self, backend=None):
+        self.backend = backend or LRUBackend()
+        self._generations = {}
+        self._watch = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def watch(self, poll):
+        # poll() returns a counter that increases when another process writes (see
+        # storage.ChangeMonitor)
+        self._watch = poll
+
+    def _external(self):
+        return self._watch() if self._watch else 0
+
+    def invalidate(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def generation(self, table):
+        # Changes on every write to table; lets other in-process caches tell when to refresh
+        return self._generations.get(table, 0), self._external()
+
+    def key(self, tables):
+        query = '&'.join(sorted(f'{k}={v}' for k, v in request.args.items(multi=True)))
+        generations = ','.join(str(self._generations.get(table, 0)) for table in tables)
+        return f'{request.path}?{query}#{generations}~{self._external()}'
+
+    def cached(self, *tables):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self.key(tables)
+                body = self.backend.get(key)
+                if body is not None:
+                    self.hits += 1
+                    response = current_app.response_class(body, mimetype='application/json')
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+                self.misses += 1
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    self.backend.set(key, response.get_data())
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend) if hasattr(self.backend, '__len__') else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'invalidations': self.invalidations
+        }
+
+
+response_cache = ResponseCache()
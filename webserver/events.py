@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from itertools import islice
+
+EVENT_HISTORY = int(os.getenv('EVENT_HISTORY', '1024'))
+EVENT_HEARTBEAT = float(os.getenv('EVENT_HEARTBEAT', '15'))
+
+
+class Broker:
+    # In-process pub/sub for the live dashboard stream. Published events are formatted
+    # as Server-Sent Events once and kept in a shared ring buffer; every listener just
+    # walks the buffer with its own sequence number, so fan-out costs no per-client copies.
+    # Listeners that fall further behind than the buffer get a 'resync' event instead.
+    #
+    # listen() is a blocking generator for WSGI servers, where each open stream holds a
+    # thread. listen_async() serves the same stream on an asyncio event loop: each
+    # subscriber gets an asyncio.Queue, and publish() hands the event to every queue of a
+    # loop with a single call_soon_threadsafe(), so an idle client costs no thread.
+    def __init__(self, history=EVENT_HISTORY):
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._closed = False
+        self.subscribers = 0
+
+    def has_subscribers(self):
+        return self.subscribers > 0
+
+    def publish(self, name, payload):
+        with self._cond:
+            self._seq += 1
+            message = f'id: {self._seq}\nevent: {name}\ndata: {json.dumps(payload)}\n\n'
+            event = (self._seq, message)
+            self._events.append(event)
+            self._cond.notify_all()
+            loops = [(loop, tuple(queues)) for loop, queues in self._queues.items()]
+        for loop, queues in loops:
+            try:
+                loop.call_soon_threadsafe(_deliver, queues, event)
+            except RuntimeError:
+                # Loop already closed; its subscribers are gone
+                pass
+
+    def close(self):
+        # Ends every blocking listen() stream, so a stopping WSGI worker isn't kept alive
+        # by dashboards that never disconnect
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def listen(self, last_seq=None, heartbeat=EVENT_HEARTBEAT):
+        with self._cond:
+            self.subscribers += 1
+            # A Last-Event-ID from before a server restart can be ahead of our sequence
+            position = self._seq if last_seq is None else min(last_seq, self._seq)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                with self._cond:
+                    if self._seq == position and not self._closed:
+                        self._cond.wait(heartbeat)
+                    if self._closed:
+                        return
+                    current = self._seq
+                    oldest = self._events[0][0] if self._events else current + 1
+                    missed = oldest > position + 1 and current > position
+                    # Sequence numbers are contiguous, so new events start at a fixed offset
+                    pending = [] if missed else list(islice(self._events, max(position + 1 - oldest, 0), None))
+                if missed:
+                    yield _resync(current)
+                    position = current
+                    continue
+                if not pending:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                for seq, message in pending:
+                    yield message
+                position = pending[-1][0]
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    async def listen_async(self, last_seq=None, heartbeat=EVENT_HEARTBEAT):
+        # Same messages as listen(), yielded on the running event loop
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self._events.maxlen or 0)
+        with self._cond:
+            self.subscribers += 1
+            self._queues.setdefault(loop, set()).add(queue)
+            current = self._seq
+            position = current if last_seq is None else min(last_seq, current)
+            oldest = self._events[0][0] if self._events else current + 1
+            missed = oldest > position + 1 and current > position
+            # Events after the snapshot arrive through the queue
+            replay = [] if missed else list(islice(self._events, max(position + 1 - oldest, 0), None))
+        try:
+            yield 'retry: 3000\n\n'
+            if missed:
+                yield _resync(current)
+                position = current
+            for seq, message in replay:
+                yield message
+                position = seq
+            while True:
+                try:
+                    seq, message = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if seq is None:
+                    # The queue overflowed and was dropped
+                    with self._cond:
+                        current = self._seq
+                    yield _resync(current)
+                    position = current
+                elif seq > position:
+                    yield message
+                    position = seq
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                queues = self._queues.get(loop)
+                if queues is not None:
+                    queues.discard(queue)
+                    if not queues:
+                        del self._queues[loop]
+
+
+def _resync(seq):
+    return f'id: {seq}\nevent: resync\ndata: {{}}\n\n'
+
+
+_overflow = (None, None)
+
+
+def _deliver(queues, event):
+    # Runs on the subscribers' event loop
+    for queue in queues:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind gets a resync instead of the backlog
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_overflow)
+
+
+broker = Broker()
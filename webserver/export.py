@@ -0,0 +1,142 @@
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+
+import partitions
+import payload_store
+
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000'))
+
+
+# CSV columns, in the order transmissions had before its payloads moved to the store
+EXPORT_COLUMNS = ['id', 'timestamp', 'type', 'data', 'sf', 'bw', 'cr', 'rssi', 'snr', 'delay',
+                  'datarate', 'latency', 'source', 'compression_ratio']
+
+
+def export_query(since=None, until=None, source=None, inline=False, after=None, limit=None):
+    # inline: the partition keeps payload texts in a data column (archives written before
+    # the payload store); otherwise they are joined in from payloads and decoded.
+    # after/limit select one keyset page: rows past the (timestamp, id) -- or, without a
+    # time filter, id -- of the previous page's last row.
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append('(t.timestamp, t.id) > (?, ?)' if since or until else 't.id > ?')
+        params.extend(after)
+    if since:
+        conditions.append('t.timestamp >= ?')
+        params.append(since)
+    if until:
+        conditions.append('t.timestamp < ?')
+        params.append(until)
+    if source:
+        # Without a time filter, unary + keeps SQLite on the rowid b-tree: the source index
+        # isn't in id order, so each page would otherwise sort the whole source
+        conditions.append('t.source = ?' if since or until else '+t.source = ?')
+        params.append(source)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    # Time-filtered exports walk the timestamp index in order; full exports walk the rowid
+    # b-tree. Either way SQLite never has to sort (and buffer) the result.
+    order = 't.timestamp, t.id' if since or until else 't.id'
+    if inline:
+        columns = ', '.join(f't.{c}' for c in EXPORT_COLUMNS)
+        tables = 'transmissions t'
+    else:
+        columns = ', '.join('payload_text(p.hash, p.codec, p.body) AS data' if c == 'data' else f't.{c}'
+                            for c in EXPORT_COLUMNS)
+        tables = 'transmissions t JOIN payloads p ON p.id = t.payload_id'
+    query = f'SELECT {columns} FROM {tables} {where} ORDER BY {order}'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+
+def page_key(row, since=None, until=None):
+    # Keyset position of an export row (see export_query's after)
+    return (row[1], row[0]) if since or until else (row[0],)
+
+
+def iter_pages_csv(connect, since=None, until=None, source=None, chunk_rows=EXPORT_CHUNK_ROWS, header=True):
+    # The export of one partition as CSV, one keyset page per chunk. A connection is
+    # taken from connect() for each page and given back before the chunk is yielded, so
+    # a slow consumer (an HTTP download) never keeps a pooled connection.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    inline = None
+    after = None
+    while True:
+        with connect() as conn:
+            if inline is None:
+                inline = not payload_store.has_store(conn, 'transmissions')
+            query, params = export_query(since, until, source, inline, after, chunk_rows)
+            cursor = conn.execute(query, params)
+            if header:
+                writer.writerow([col[0] for col in cursor.description])
+                header = False
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        writer.writerows(rows)
+        yield buffer.getvalue(), len(rows)
+        buffer.seek(0)
+        buffer.truncate()
+        if len(rows) < chunk_rows:
+            break
+        after = page_key(rows[-1], since, until)
+    if buffer.tell():
+        yield buffer.getvalue(), 0
+
+
+def iter_partitions_csv(since=None, until=None, source=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    # The export across every partition the time range touches (archived months first),
+    # with a single header
+    first = True
+    for connect in partitions.iter_sources('transmissions', since, until):
+        for chunk, rows in iter_pages_csv(connect, since, until, source, chunk_rows, header=first):
+            yield chunk, rows
+        first = False
+
+
+def open_output(filename):
+    # Compression is picked from the extension: .gz (gzip) or .zst (zstandard, optional)
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'wt', compresslevel=6, newline='', encoding='utf-8')
+    if filename.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd output requires the 'zstandard' package (pip install zstandard)")
+        raw = open(filename, 'wb')
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), newline='', encoding='utf-8')
+    return open(filename, 'w', newline='', encoding='utf-8')
+
+
+class Progress:
+    # Throughput readout on stderr, redrawn at most every interval seconds
+    def __init__(self, interval=0.5, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.last = 0
+        self.rows = 0
+        self.chars = 0
+
+    def update(self, rows, chars):
+        self.rows += rows
+        self.chars += chars
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        line = f'\r{self.rows} rows, {self.rows / elapsed:,.0f} rows/s'
+        if self.chars:
+            line += f', {self.chars / 1e6:.1f} MB, {self.chars / 1e6 / elapsed:.1f} MB/s'
+        self.stream.write(line + ('\n' if final else ''))
+        self.stream.flush()
@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+import stat
+import sys
+import time
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = tty = None
+
+import ingest
+import migrations
+import storage
+
+# Serial-to-database bridge for Receiver nodes. Reads the receiver's serial output from
+# one or more ports, parses it incrementally and writes receptions in group commits
+# through an IngestQueue, without going through HTTP. Run from webserver/:
+#
+#   python3 gateway.py /dev/ttyUSB0 /dev/ttyUSB1@57600 capture.log
+#
+# Ports are serial devices or ptys (set to raw mode at --baud, or the rate after '@'),
+# FIFOs, or capture files, which are read from the start and then followed like tail -f
+# (or just read, with --once). All ports share one event loop: each is read from a
+# non-blocking descriptor only when the loop reports it readable, so idle receivers cost
+# nothing. A port that fails or disappears (USB unplugged, file rotated) is reopened
+# with exponential backoff.
+#
+# Every ACK the receiver prints ("Sent ACK: ...") carries the packet's RSSI, SNR and
+# data, so each one becomes a receptions row; "Received: ..." lines are only counted.
+
+DEFAULT_BAUD = 115200
+READ_SIZE = 65536
+MAX_LINE = 4096
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 10.0
+FILE_POLL_INTERVAL = 0.25
+
+BATCH_ROWS = int(os.getenv('GATEWAY_BATCH_ROWS', '500'))
+FLUSH_INTERVAL = float(os.getenv('GATEWAY_FLUSH_INTERVAL', '0.5'))
+QUEUE_ROWS = int(os.getenv('GATEWAY_QUEUE_ROWS', '50000'))
+
+logger = logging.getLogger('gateway')
+
+_ack_prefix = re.compile(r'(?:ENHANCED|STANDARD)_ACK:')
+_rssi = re.compile(r'"rssi":\s*(-?[\d.]+|nan|-?inf|ovf)')
+_snr = re.compile(r'"snr":\s*(-?[\d.]+|nan|-?inf|ovf)')
+_data = '"data":"'
+
+
+def _number(match):
+    # Arduino String(float) prints nan/inf/ovf for values it can't format
+    if match is None:
+        return None
+    try:
+        value = float(match.group(1))
+    except ValueError:
+        return None
+    return value if value == value and abs(value) != float('inf') else None
+
+
+def parse_ack(line):
+    # (data, rssi, snr) from the JSON-ish body of a "Sent ACK:" line. The receiver doesn't
+    # escape the echoed data, so fields are picked out rather than parsed as JSON; data
+    # runs to the closing '"}'.
+    body = _ack_prefix.sub('', line, count=1)
+    start = body.find(_data)
+    if start < 0:
+        return None
+    data = body[start + len(_data):]
+    if data.endswith('"}'):
+        data = data[:-2]
+    rssi, snr = _number(_rssi.search(body, 0, start)), _number(_snr.search(body, 0, start))
+    if rssi is None and snr is None:
+        return None
+    return data, rssi, snr
+
+
+class ReceiverParser:
+    # Incremental line parser for receiver.ino's serial output; feed() takes raw bytes as
+    # they arrive and returns the reception rows completed by them
+    def __init__(self):
+        self.buffer = b''
+        self.lines = 0
+        self.packets = 0
+        self.receptions = 0
+        self.malformed = 0
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b'\n')
+        if len(self.buffer) > MAX_LINE:
+            # No newline in sight: noise on the line or a wrong baud rate
+            self.buffer = b''
+            self.malformed += 1
+        rows = []
+        for raw in lines:
+            self.lines += 1
+            line = raw.rstrip(b'\r').decode('utf-8', 'replace')
+            if line.startswith('Received: '):
+                self.packets += 1
+            elif line.startswith('Sent ACK: '):
+                row = parse_ack(line[len('Sent ACK: '):])
+                if row is None:
+                    self.malformed += 1
+                else:
+                    rows.append(row)
+        self.receptions += len(rows)
+        return rows
+
+
+def parse_port(spec, baud):
+    # "/dev/ttyUSB0@57600" -> ("/dev/ttyUSB0", 57600)
+    path, _, rate = spec.rpartition('@')
+    if path and rate.isdigit():
+        return path, int(rate)
+    return spec, baud
+
+
+def configure_tty(fd, baud):
+    # Raw 8N1 at the given rate, no echo or line editing
+    if termios is None:
+        raise OSError('serial ports need termios (POSIX)')
+    speed = getattr(termios, f'B{baud}', None)
+    if speed is None:
+        raise ValueError(f'unsupported baud rate {baud}')
+    tty.setraw(fd)
+    attributes = termios.tcgetattr(fd)
+    attributes[4] = attributes[5] = speed
+    attributes[2] |= termios.CLOCAL | termios.CREAD
+    termios.tcsetattr(fd, termios.TCSANOW, attributes)
+
+
+class Port:
+    def __init__(self, spec, baud, submit, once=False):
+        self.path, self.baud = parse_port(spec, baud)
+        self.submit = submit
+        self.once = once
+        self.parser = ReceiverParser()
+        self.bytes = 0
+        self.reconnects = 0
+        self.connected = False
+        self.error = None
+        self._last_report = (time.monotonic(), 0, 0)
+
+    def _open(self):
+        # A FIFO is opened read-write so it never reports EOF: it keeps waiting for the next
+        # writer instead of spinning through reopens whenever none is attached
+        access = os.O_RDWR if stat.S_ISFIFO(os.stat(self.path).st_mode) else os.O_RDONLY
+        fd = os.open(self.path, access | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            mode = os.fstat(fd).st_mode
+            if os.isatty(fd):
+                configure_tty(fd, self.baud)
+            return fd, stat.S_ISREG(mode)
+        except Exception:
+            os.close(fd)
+            raise
+
+    def _consume(self, chunk):
+        self.bytes += len(chunk)
+        rows = self.parser.feed(chunk)
+        if rows:
+            self.submit(rows)
+
+    async def _read_stream(self, fd):
+        # Descriptors the event loop can poll (ttys, ptys, FIFOs): read whenever readable
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def readable():
+            try:
+                chunk = os.read(fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if not done.done():
+                    done.set_exception(e)
+                return
+            if not chunk:
+                if not done.done():
+                    done.set_result(None)
+                return
+            self._consume(chunk)
+
+        loop.add_reader(fd, readable)
+        try:
+            await done
+        finally:
+            loop.remove_reader(fd)
+
+    async def _read_file(self, fd):
+        # Regular files can't be polled: read to the end, then check again periodically,
+        # reopening if the file was replaced or truncated (log rotation)
+        inode = os.fstat(fd).st_ino
+        position = 0
+        while True:
+            chunk = os.read(fd, READ_SIZE)
+            if chunk:
+                position += len(chunk)
+                self._consume(chunk)
+                continue
+            if self.once:
+                return True
+            await asyncio.sleep(FILE_POLL_INTERVAL)
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            if current.st_ino != inode or current.st_size < position:
+                return False
+
+    async def run(self):
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                fd, regular = self._open()
+            except (OSError, ValueError) as e:
+                self.error = str(e)
+                if self.once:
+                    logger.error('%s: %s', self.path, e)
+                    return
+                logger.warning('%s: %s, retrying in %.1fs', self.path, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
+
+            self.connected = True
+            self.error = None
+            delay = RECONNECT_MIN
+            logger.info('%s: connected', self.path)
+            try:
+                if regular:
+                    if await self._read_file(fd):
+                        return
+                else:
+                    await self._read_stream(fd)
+                logger.warning('%s: closed, reopening', self.path)
+            except OSError as e:
+                self.error = str(e)
+                logger.warning('%s: %s, reopening', self.path, e)
+            finally:
+                self.connected = False
+                os.close(fd)
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+
+    def report(self):
+        # Totals plus rates since the previous report
+        now = time.monotonic()
+        since, last_bytes, last_rows = self._last_report
+        elapsed = max(now - since, 1e-9)
+        self._last_report = (now, self.bytes, self.parser.receptions)
+        return {
+            'port': self.path,
+            'connected': self.connected,
+            'bytes': self.bytes,
+            'lines': self.parser.lines,
+            'packets': self.parser.packets,
+            'receptions': self.parser.receptions,
+            'malformed': self.parser.malformed,
+            'reconnects': self.reconnects,
+            'bytes_per_s': (self.bytes - last_bytes) / elapsed,
+            'receptions_per_s': (self.parser.receptions - last_rows) / elapsed,
+            'error': self.error
+        }
+
+
+def write_rows(table, values):
+    with storage.transaction() as conn:
+        ingest.insert_rows(conn, table, values)
+
+
+class Gateway:
+    def __init__(self, specs, baud=DEFAULT_BAUD, once=False):
+        self.queue = ingest.IngestQueue(write_rows, max_rows=QUEUE_ROWS, batch_rows=BATCH_ROWS,
+                                        flush_interval=FLUSH_INTERVAL)
+        self.ports = [Port(spec, baud, self.submit, once) for spec in specs]
+        self.dropped = 0
+
+    def submit(self, rows):
+        # Called on the event loop; the queue's writer thread does the commits. If the
+        # database falls so far behind that the queue is full, rows are dropped and counted
+        # rather than blocking every port.
+        if not self.queue.submit('receptions', rows):
+            self.dropped += len(rows)
+
+    def report(self):
+        queue = self.queue.stats()
+        queue.pop('mode')
+        return {
+            'ports': [port.report() for port in self.ports],
+            'queue': queue,
+            'dropped_rows': self.dropped
+        }
+
+    async def _report_periodically(self, interval, stream):
+        while True:
+            await asyncio.sleep(interval)
+            stream.write(json.dumps(self.report()) + '\n')
+            stream.flush()
+
+    async def run(self, report_interval=10, stream=sys.stdout):
+        loop = asyncio.get_running_loop()
+        readers = asyncio.gather(*(port.run() for port in self.ports))
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, readers.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass
+        reporter = asyncio.ensure_future(self._report_periodically(report_interval, stream)) if report_interval else None
+        try:
+            await readers
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if reporter:
+                reporter.cancel()
+            # Commit whatever is still queued before exiting
+            self.queue.flush()
+            self.queue.stop()
+        stream.write(json.dumps(self.report()) + '\n')
+        stream.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bridge Receiver serial output straight into the database.')
+    parser.add_argument('ports', nargs='+', help='serial devices, ptys, FIFOs or capture files (path[@baud])')
+    parser.add_argument('--baud', type=int, default=DEFAULT_BAUD, help=f'default baud rate (default {DEFAULT_BAUD})')
+    parser.add_argument('--db', help='database file (default DB_NAME)')
+    parser.add_argument('--once', action='store_true', help='exit once every capture file has been read to its end')
+    parser.add_argument('--report-interval', type=float, default=10,
+                        help='seconds between per-port throughput reports on stdout (0 to disable)')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if args.db:
+        storage.configure(db_name=args.db)
+    with storage.connection() as conn:
+        if migrations.schema_version(conn) < migrations.SCHEMA_VERSION:
+            print(f'{storage.DB_NAME} is not up to date; run python3 setup_db.py first', file=sys.stderr)
+            sys.exit(1)
+
+    asyncio.run(Gateway(args.ports, args.baud, args.once).run(args.report_interval))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import payload_store
+
+INGEST_MODE = os.getenv('INGEST_MODE', 'async')
+INGEST_QUEUE_ROWS = int(os.getenv('INGEST_QUEUE_ROWS', '10000'))
+INGEST_BATCH_ROWS = int(os.getenv('INGEST_BATCH_ROWS', '500'))
+INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', '0.05'))
+
+logger = logging.getLogger(__name__)
+
+# Row tuples handed to the writers follow these column orders, with the payload text in
+# place of payload_id (see insert_rows)
+TRANSMISSION_INSERT = '''
+    INSERT INTO transmissions (
+        type, payload_id, sf, bw, cr, rssi, snr, delay, datarate, latency, source, compression_ratio
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+RECEPTION_INSERT = '''
+    INSERT INTO receptions (payload_id, rssi, snr) VALUES (?, ?, ?)
+'''
+
+INSERTS = {
+    'transmissions': TRANSMISSION_INSERT,
+    'receptions': RECEPTION_INSERT
+}
+
+# Position of the payload text in each table's row tuples
+PAYLOAD_POSITIONS = {
+    'transmissions': 1,
+    'receptions': 0
+}
+
+
+def insert_rows(conn, table, values):
+    # Store the payloads, then insert the rows referencing them, in the caller's transaction
+    conn.executemany(INSERTS[table], payload_store.replace_texts(conn, values, PAYLOAD_POSITIONS[table]))
+
+
+class IngestQueue:
+    # Bounded in-memory queue in front of the database. Request threads only validate and
+    # enqueue; a single writer thread drains the queue in group commits of up to
+    # batch_rows rows, or whatever arrived within flush_interval of the oldest pending
+    # row, whichever comes first.
+    def __init__(self, write, max_rows=INGEST_QUEUE_ROWS, batch_rows=INGEST_BATCH_ROWS,
+                 flush_interval=INGEST_FLUSH_INTERVAL):
+        self.write = write
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._rows = 0
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._flushing = False
+        self._stopping = False
+        self._writer = None
+        self._pid = None
+
+        self.accepted_rows = 0
+        self.rejected_rows = 0
+        self.written_rows = 0
+        self.failed_rows = 0
+        self.batches = 0
+        self.last_batch_rows = 0
+        self.max_batch_rows = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self.total_commit_ms = 0.0
+
+    def submit(self, table, values):
+        # Returns False when the queue is full so the caller can push back
+        with self._cond:
+            if self._rows + len(values) > self.max_rows:
+                self.rejected_rows += len(values)
+                return False
+            self._ensure_writer()
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((table, values))
+            self._rows += len(values)
+            self.accepted_rows += len(values)
+            self._idle.clear()
+            self._cond.notify()
+            return True
+
+    def _ensure_writer(self):
+        # Started lazily (and again after a fork) so only processes that ingest own a writer
+        if self._writer is None or self._pid != os.getpid() or not self._writer.is_alive():
+            self._pid = os.getpid()
+            self._stopping = False
+            self._writer = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+            self._writer.start()
+
+    def _take_batch(self):
+        # Called by the writer between batches, so the queue only counts as idle once the
+        # previous batch has been written, not merely taken off the queue
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._set_idle()
+                self._cond.wait()
+            if not self._pending:
+                self._set_idle()
+                return None
+            deadline = self._oldest + self.flush_interval
+            while self._rows < self.batch_rows and not self._stopping and not self._flushing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            taken = 0
+            while self._pending and (taken == 0 or taken + len(self._pending[0][1]) <= self.batch_rows):
+                table, values = self._pending.popleft()
+                batch.append((table, values))
+                taken += len(values)
+            self._rows -= taken
+            self._oldest = time.monotonic() if self._pending else None
+            return batch
+
+    def _set_idle(self):
+        self._flushing = False
+        self._idle.set()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            grouped = {}
+            for table, values in batch:
+                grouped.setdefault(table, []).extend(values)
+            for table, values in grouped.items():
+                started = time.perf_counter()
+                try:
+                    self.write(table, values)
+                except Exception:
+                    logger.exception('ingest writer failed to commit %d %s rows', len(values), table)
+                    self.failed_rows += len(values)
+                    continue
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.written_rows += len(values)
+                self.batches += 1
+                self.last_batch_rows = len(values)
+                self.max_batch_rows = max(self.max_batch_rows, len(values))
+                self.last_commit_ms = elapsed_ms
+                self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+                self.total_commit_ms += elapsed_ms
+
+    def flush(self, timeout=None):
+        # Block until everything queued so far has been committed, including a batch the
+        # writer is in the middle of; the writer commits without waiting for flush_interval
+        with self._cond:
+            if not self._idle.is_set():
+                self._flushing = True
+                self._cond.notify()
+        return self._idle.wait(timeout)
+
+    def stop(self, timeout=10):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._writer is not None and self._writer.is_alive() and self._pid == os.getpid():
+            self._writer.join(timeout)
+
+    def stats(self):
+        return {
+            'mode': INGEST_MODE,
+            'queue_rows': self._rows,
+            'queue_capacity': self.max_rows,
+            'accepted_rows': self.accepted_rows,
+            'rejected_rows': self.rejected_rows,
+            'written_rows': self.written_rows,
+            'failed_rows': self.failed_rows,
+            'batches': self.batches,
+            'last_batch_rows': self.last_batch_rows,
+            'max_batch_rows': self.max_batch_rows,
+            'avg_batch_rows': self.written_rows / self.batches if self.batches else None,
+            'last_commit_ms': self.last_commit_ms,
+            'max_commit_ms': self.max_commit_ms,
+            'avg_commit_ms': self.total_commit_ms / self.batches if self.batches else None
+        }
+
+
+def create_queue(write):
+    queue = IngestQueue(write)
+    # Drain whatever is still queued when the process exits
+    atexit.register(queue.stop)
+    return queue
@@ -0,0 +1,231 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+# Distinct label sets per metric; further ones are counted under 'other'
+MAX_SERIES = int(os.getenv('METRICS_MAX_SERIES', '500'))
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def series_key(values, label_values, max_series):
+    # Keeps a metric to max_series label sets plus one overflow set; callers hold the lock
+    if label_values in values or len(values) < max_series:
+        return label_values
+    return ('other',) * len(label_values)
+
+
+class Counter:
+    def __init__(self, name, help, labels=(), max_series=MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.max_series = max_series
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            key = series_key(self._values, label_values, self.max_series)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, max_series=MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.max_series = max_series
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            label_values = series_key(self._values, label_values, self.max_series)
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, value_sum) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ['+Inf'], counts):
+                    cumulative += count
+                    labels = format_labels(self.labels + ('le',), label_values + (bound,))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_count{labels} {total}')
+                lines.append(f'{self.name}_sum{labels} {value_sum}')
+        return lines
+
+
+class Gauge:
+    # Read at scrape time from a callback, e.g. the ingest queue depth. kind='counter'
+    # exposes totals that other components already keep (cache hits, rejected rows).
+    def __init__(self, name, help, read, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        value = self.read()
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', f'{self.name} {value or 0}']
+
+
+request_latency = Histogram('lora_http_request_duration_seconds', 'HTTP request latency by route.',
+                            ('method', 'route', 'status'))
+response_bytes = Counter('lora_http_response_bytes_total', 'Response body bytes sent by route.', ('route',))
+sql_seconds = Counter('lora_sql_seconds_total', 'Time spent executing and fetching per SQL statement.', ('statement',))
+sql_calls = Counter('lora_sql_statements_total', 'Executions per SQL statement.', ('statement',))
+sql_rows = Counter('lora_sql_rows_total', 'Rows returned per SQL statement.', ('statement',))
+ingested_rows = Counter('lora_ingested_rows_total', 'Rows committed by the ingest routes.', ('table',))
+
+registry = [request_latency, response_bytes, sql_seconds, sql_calls, sql_rows, ingested_rows]
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+_whitespace = re.compile(r'\s+')
+# IN (?, ?, ...) lists and multi-row VALUES (...), (...) of any length
+_placeholders = re.compile(r'\(\?(?:, ?\?)*\)(?:, ?\(\?(?:, ?\?)*\))*')
+_labels = {}
+
+
+def statement_label(sql):
+    # One label per statement shape, whatever the length of its placeholder lists
+    label = _labels.get(sql)
+    if label is None:
+        label = _placeholders.sub('(?+)', _whitespace.sub(' ', sql).strip())[:120]
+        if len(_labels) < 1000:
+            _labels[sql] = label
+    return label
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times execute() plus the fetch*() calls that follow it and counts the rows fetched.
+    # Plain iteration over the cursor is not timed, so hot paths should fetch explicitly.
+    _statement = None
+
+    def _record(self, started, rows=0):
+        if self._statement is not None:
+            sql_seconds.inc(self._statement, amount=time.perf_counter() - started)
+            if rows:
+                sql_rows.inc(self._statement, amount=rows)
+
+    def execute(self, sql, parameters=()):
+        self._statement = statement_label(sql)
+        sql_calls.inc(self._statement)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = statement_label(sql)
+        sql_calls.inc(self._statement)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._record(started, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._record(started, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute()/executemany() go through cursor(), so they are timed as well
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+
+connection_factory = InstrumentedConnection if METRICS_ENABLED else sqlite3.Connection
+
+
+def init_app(app):
+    from flask import g, request, Response
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if PROFILING_ENABLED and request.args.get('profile') == '1':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            out = io.StringIO()
+            out.write(f'{request.method} {request.full_path} -> {response.status}\n\n')
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+            return Response(out.getvalue(), mimetype='text/plain', headers={'X-Profile': 'cProfile'})
+
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_latency.observe(time.perf_counter() - started, request.method, route, response.status_code)
+        if not response.is_streamed:
+            response_bytes.inc(route, amount=response.calculate_content_length() or 0)
+        return response
@@ -0,0 +1,324 @@
+import calendar
+import math
+import os
+import threading
+import time
+
+# In-memory statistics behind the /api/stats summary blocks, so polling doesn't rescan
+# transmissions and receptions:
+#   - per source, a running mean/variance (Welford) of datarate, latency and compression
+#     ratio over every transmission, for source_metrics and the standard vs enhanced
+#     comparison with its confidence intervals;
+#   - a ring buffer of WINDOW_RESOLUTION-second slots holding the last hour of reception
+#     RSSI/SNR sums, for reception_stats.
+# Both are seeded from the database (the rollups and the last hour of receptions) on
+# first use and then fed by write_rows(). Each write passes the id of its last row, so
+# rows the seed already counted are not added twice. Rows written by other processes
+# (other server workers, the serial gateway, CSV imports) are read back by id when the
+# change monitor reports a foreign commit, or when a write's ids show a gap.
+
+WINDOW_SECONDS = 3600
+WINDOW_RESOLUTION = int(os.getenv('STATS_WINDOW_RESOLUTION', '10'))
+RESEED_SECONDS = float(os.getenv('STATS_RESEED_SECONDS', '3600'))
+Z_95 = 1.959964
+
+# Transmission metrics tracked per source, by position in the transmissions insert tuple
+TRANSMISSION_METRICS = {'datarate': 8, 'latency': 9, 'compression_ratio': 11}
+TRANSMISSION_SOURCE = 10
+# rssi and snr positions in the receptions insert tuple
+RECEPTION_METRICS = {'rssi': 1, 'snr': 2}
+
+# Rows above an id watermark, for catching up with writes made elsewhere
+NEW_TRANSMISSIONS = 'SELECT source, {} FROM transmissions WHERE id > ? AND id <= ? GROUP BY source'.format(
+    ', '.join(f'COUNT({m}), TOTAL({m}), TOTAL({m} * {m})' for m in TRANSMISSION_METRICS))
+NEW_RECEPTIONS = '''
+    SELECT timestamp, rssi, snr FROM receptions
+    WHERE id > ? AND id <= ? AND timestamp >= datetime('now', ?)
+'''
+
+
+class RunningStats:
+    # Welford's online mean and variance
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_sums(cls, n, total, total_sq):
+        if not n:
+            return cls()
+        mean = total / n
+        return cls(n, mean, max(total_sq - total * mean, 0.0))
+
+    def merge(self, other):
+        # Chan et al.'s pairwise update: fold another sample's statistics into this one
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else None
+
+    @property
+    def standard_error(self):
+        variance = self.variance
+        return math.sqrt(variance / self.n) if variance is not None else None
+
+    def average(self):
+        return self.mean if self.n else None
+
+    def interval(self):
+        # 95% confidence interval of the mean
+        error = self.standard_error
+        if error is None:
+            return None
+        return [self.mean - Z_95 * error, self.mean + Z_95 * error]
+
+
+def ratio_interval(numerator, denominator):
+    # Ratio of two independent means with a 95% interval by the delta method
+    if not numerator.n or not denominator.n or not denominator.mean:
+        return None, None
+    value = numerator.mean / denominator.mean
+    errors = (numerator.standard_error, denominator.standard_error)
+    if None in errors or not numerator.mean:
+        return value, None
+    relative = math.hypot(errors[0] / numerator.mean, errors[1] / denominator.mean)
+    spread = Z_95 * abs(value) * relative
+    return value, [value - spread, value + spread]
+
+
+class SlidingWindow:
+    # Sums over the last `seconds`, in `resolution`-second slots of a ring buffer. Slots
+    # are cleared lazily as the clock passes them, so adding and reading are O(1)
+    # amortised; the window's oldest edge moves in resolution steps.
+    def __init__(self, fields, seconds=WINDOW_SECONDS, resolution=WINDOW_RESOLUTION):
+        self.fields = fields
+        self.resolution = resolution
+        self.size = max(seconds // resolution, 1)
+        self.slots = [None] * self.size
+        self.sums = [[0, 0.0] for _ in fields]  # per field: count, sum
+        self.head = None
+
+    def _advance(self, now):
+        index = int(now // self.resolution)
+        if self.head is None:
+            self.head = index
+        if index <= self.head:
+            return
+        for expired in range(max(self.head + 1, index - self.size + 1), index + 1):
+            slot = self.slots[expired % self.size]
+            if slot is not None:
+                for total, (count, value) in zip(self.sums, slot[1]):
+                    total[0] -= count
+                    total[1] -= value
+                self.slots[expired % self.size] = None
+        self.head = index
+
+    def add(self, values, at):
+        self._advance(time.time())
+        index = int(at // self.resolution)
+        if self.head - index >= self.size or index > self.head:
+            return
+        slot = self.slots[index % self.size]
+        if slot is None:
+            slot = self.slots[index % self.size] = [index, [[0, 0.0] for _ in self.fields]]
+        for field, total, value in zip(slot[1], self.sums, values):
+            if value is not None:
+                field[0] += 1
+                field[1] += value
+                total[0] += 1
+                total[1] += value
+
+    def averages(self):
+        self._advance(time.time())
+        return {name: (value / count if count else None) for name, (count, value) in zip(self.fields, self.sums)}
+
+
+def parse_timestamp(timestamp):
+    # Seconds since the epoch for a SQLite CURRENT_TIMESTAMP (UTC) value
+    try:
+        return calendar.timegm(time.strptime(timestamp[:19], '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+class LiveStats:
+    def __init__(self, connection, changes=None):
+        # connection: context manager yielding a database connection (storage.connection);
+        # changes: callable returning a counter bumped by commits from other processes
+        self.connection = connection
+        self.changes = changes
+        self._lock = threading.Lock()
+        self._seeded = 0.0
+        self._last_ids = None
+        self._change_version = None
+        self._sources = {}
+        self._window = None
+
+    def seed(self):
+        with self._lock:
+            self._seed()
+
+    def _seed(self):
+        # Runs under the lock: a write committed after the snapshot must wait to be added
+        # on top of it rather than to the state being replaced
+        change_version = self.changes() if self.changes else None
+        with self.connection() as conn:
+            # One read snapshot, so the aggregates and the id watermarks agree
+            conn.execute('BEGIN')
+            try:
+                last_ids = dict(zip(('transmissions', 'receptions'), conn.execute('''
+                    SELECT COALESCE((SELECT MAX(id) FROM transmissions), 0),
+                           COALESCE((SELECT MAX(id) FROM receptions), 0)
+                ''').fetchone()))
+                sums = ', '.join(f'SUM({m}_n), SUM({m}_sum), SUM({m}_sumsq)' for m in TRANSMISSION_METRICS)
+                source_rows = conn.execute(f'SELECT source, {sums} FROM rollup_hour GROUP BY source').fetchall()
+                reception_rows = conn.execute('''
+                    SELECT timestamp, rssi, snr FROM receptions
+                    WHERE timestamp >= datetime('now', ?)
+                ''', (f'-{WINDOW_SECONDS} seconds',)).fetchall()
+            finally:
+                conn.rollback()
+
+        self._sources = {}
+        self._fold_sources(source_rows)
+        self._window = SlidingWindow(list(RECEPTION_METRICS))
+        self._fold_receptions(reception_rows)
+        self._last_ids = last_ids
+        self._change_version = change_version
+        self._seeded = time.monotonic()
+
+    def _fold_sources(self, rows):
+        # rows: (source, n, sum, sumsq for each transmission metric)
+        for source, *values in rows:
+            metrics = self._sources.setdefault(source, {m: RunningStats() for m in TRANSMISSION_METRICS})
+            for i, metric in enumerate(TRANSMISSION_METRICS):
+                metrics[metric].merge(RunningStats.from_sums(*values[i * 3:i * 3 + 3]))
+
+    def _fold_receptions(self, rows):
+        # rows: (timestamp, rssi, snr)
+        for timestamp, rssi, snr in rows:
+            at = parse_timestamp(timestamp)
+            if at is not None:
+                self._window.add((rssi, snr), at)
+
+    def _catch_up(self, tables, up_to=None):
+        # Read rows above the watermarks that were not written through add(), up to
+        # up_to[table] or the newest row; returns the tables that had any
+        found = []
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                for table in tables:
+                    last_id = (up_to or {}).get(table)
+                    if last_id is None:
+                        last_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+                    if last_id <= self._last_ids[table]:
+                        continue
+                    if table == 'transmissions':
+                        self._fold_sources(conn.execute(NEW_TRANSMISSIONS, (self._last_ids[table], last_id)))
+                    else:
+                        self._fold_receptions(conn.execute(NEW_RECEPTIONS, (
+                            self._last_ids[table], last_id, f'-{WINDOW_SECONDS} seconds')))
+                    self._last_ids[table] = last_id
+                    found.append(table)
+            finally:
+                conn.rollback()
+        return found
+
+    def _sync(self):
+        # Called under the lock: seed when due, otherwise catch up if another process
+        # committed since the last look
+        if self._last_ids is None or time.monotonic() - self._seeded >= RESEED_SECONDS:
+            self._seed()
+            return []
+        if self.changes is None:
+            return []
+        change_version = self.changes()
+        if change_version == self._change_version:
+            return []
+        self._change_version = change_version
+        return self._catch_up(('transmissions', 'receptions'))
+
+    def catch_up(self):
+        # Tables that received rows from other processes since the last call
+        with self._lock:
+            return self._sync()
+
+    def add(self, table, values, last_id):
+        # Fold in rows just written by write_rows(); last_id is the id of the last one
+        with self._lock:
+            if self._last_ids is None or last_id <= self._last_ids[table]:
+                return
+            # The batch's ids run contiguously up to last_id; anything between the
+            # watermark and its first row was committed elsewhere
+            before = last_id - len(values)
+            if before > self._last_ids[table]:
+                self._catch_up((table,), {table: before})
+            values = values[max(self._last_ids[table] - before, 0):]
+            self._last_ids[table] = last_id
+            if table == 'transmissions':
+                for row in values:
+                    metrics = self._sources.get(row[TRANSMISSION_SOURCE])
+                    if metrics is None:
+                        metrics = self._sources[row[TRANSMISSION_SOURCE]] = {m: RunningStats() for m in TRANSMISSION_METRICS}
+                    for metric, position in TRANSMISSION_METRICS.items():
+                        if row[position] is not None:
+                            metrics[metric].add(row[position])
+            else:
+                now = time.time()
+                for row in values:
+                    self._window.add([row[position] for position in RECEPTION_METRICS.values()], now)
+
+    def source_metrics(self):
+        with self._lock:
+            self._sync()
+            return [{
+                'source': source,
+                'avg_datarate': metrics['datarate'].average(),
+                'avg_latency': metrics['latency'].average(),
+                'avg_compression': metrics['compression_ratio'].average(),
+                'datarate_ci': metrics['datarate'].interval(),
+                'latency_ci': metrics['latency'].interval(),
+                'count': max(m.n for m in metrics.values())
+            } for source, metrics in sorted(self._sources.items())]
+
+    def comparison(self):
+        # Same figures as the former AVG() subqueries, plus 95% confidence intervals
+        with self._lock:
+            self._sync()
+            empty = {m: RunningStats() for m in TRANSMISSION_METRICS}
+            standard = self._sources.get('standard', empty)
+            enhanced = self._sources.get('enhanced', empty)
+            datarate, datarate_ci = ratio_interval(enhanced['datarate'], standard['datarate'])
+            latency, latency_ci = ratio_interval(standard['latency'], enhanced['latency'])
+            return {
+                'metric': 'comparison',
+                'datarate_improvement': datarate,
+                'latency_improvement': latency,
+                'compression_ratio': enhanced['compression_ratio'].average(),
+                'datarate_improvement_ci': datarate_ci,
+                'latency_improvement_ci': latency_ci,
+                'compression_ratio_ci': enhanced['compression_ratio'].interval()
+            }
+
+    def reception_stats(self):
+        with self._lock:
+            self._sync()
+            averages = self._window.averages()
+            return {'avg_rssi': averages['rssi'], 'avg_snr': averages['snr']}
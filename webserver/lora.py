@@ -0,0 +1,42 @@
+import numpy as np
+
+# LoRa airtime model (Semtech SX127x datasheet / AN1200.13). Bandwidths are in Hz and
+# coding rates are the firmware's 5..8 (4/5 .. 4/8), as stored in the database. Every
+# function takes scalars or NumPy arrays, so whole parameter grids are evaluated at once.
+
+PREAMBLE_SYMBOLS = 8
+
+# Parameter space of the enhanced sender
+SPREADING_FACTORS = (7, 8, 9, 10, 11, 12)
+BANDWIDTHS = (125000, 250000, 500000)
+CODING_RATES = (5, 6, 7, 8)
+
+# Lowest SNR (dB) each spreading factor demodulates at, SX1276 datasheet table 13
+DEMODULATION_SNR = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+
+def symbol_time(sf, bw):
+    return np.left_shift(1, sf) / bw
+
+
+def low_data_rate_optimize(sf, bw):
+    # Mandated when a symbol lasts longer than 16 ms (SF11/SF12 at 125 kHz)
+    return symbol_time(sf, bw) > 0.016
+
+
+def payload_symbols(payload_bytes, sf, bw, cr, explicit_header=True, crc=True):
+    de = np.asarray(low_data_rate_optimize(sf, bw), dtype=int)
+    numerator = 8 * np.asarray(payload_bytes) - 4 * np.asarray(sf) + 28 + 16 * crc - 20 * (not explicit_header)
+    return 8 + np.maximum(np.ceil(numerator / (4 * (sf - 2 * de))) * cr, 0)
+
+
+def time_on_air(payload_bytes, sf, bw, cr, preamble=PREAMBLE_SYMBOLS, explicit_header=True, crc=True):
+    # Seconds on air for one packet of payload_bytes
+    t_sym = symbol_time(sf, bw)
+    preamble_time = (preamble + 4.25) * t_sym
+    return preamble_time + payload_symbols(payload_bytes, sf, bw, cr, explicit_header, crc) * t_sym
+
+
+def bandwidth_penalty(bw):
+    # dB of SNR lost against 125 kHz: the receiver's noise floor rises with bandwidth
+    return 10 * np.log10(np.asarray(bw) / BANDWIDTHS[0])
@@ -0,0 +1,196 @@
+import payload_store
+import rollups
+
+# Schema changes are applied in order and recorded in PRAGMA user_version, so every
+# database (new or created by an older release) is brought to the same schema by
+# setup_db.py. Append new migrations to MIGRATIONS; never edit one that has shipped.
+
+
+def baseline(conn):
+    cursor = conn.cursor()
+
+    # Create transmission table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transmissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            sf INTEGER NOT NULL,
+            bw INTEGER NOT NULL,
+            cr INTEGER NOT NULL,
+            rssi INTEGER,
+            snr REAL,
+            delay INTEGER,
+            datarate REAL,
+            latency INTEGER,
+            source TEXT NOT NULL,
+            compression_ratio REAL
+        )
+    ''')
+
+    # Create reception table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS receptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            data TEXT NOT NULL,
+            rssi INTEGER,
+            snr REAL
+        )
+    ''')
+
+    # Create index for faster queries
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transmissions_timestamp ON transmissions(timestamp)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_receptions_timestamp ON receptions(timestamp)
+    ''')
+
+    # Create rollup tables for /api/metrics
+    rollups.create_rollups(conn)
+
+
+def covering_indexes(conn):
+    # Per-source averages and the standard/enhanced comparison in /api/stats read only
+    # this index: a range per source instead of a scan of the whole table
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transmissions_source
+        ON transmissions(source, timestamp, datarate, latency, compression_ratio)
+    ''')
+    # Full /api/timeseries loads walk this index in (timestamp, source) order, which is
+    # already the GROUP BY / ORDER BY order, so no temporary b-trees are needed. The
+    # query writes its source filter as +source so the planner doesn't prefer
+    # idx_transmissions_source. Partial: failed transmissions (datarate 0) are never plotted.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transmissions_timeseries
+        ON transmissions(timestamp, source, rssi, snr, latency, datarate, compression_ratio)
+        WHERE datarate > 0
+    ''')
+
+
+# Columns of the tables rebuilt around the payload store, in their original order with
+# payload_id where data used to be
+PAYLOAD_TABLES = {
+    'transmissions': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        type TEXT NOT NULL,
+        payload_id INTEGER NOT NULL REFERENCES payloads(id),
+        sf INTEGER NOT NULL,
+        bw INTEGER NOT NULL,
+        cr INTEGER NOT NULL,
+        rssi INTEGER,
+        snr REAL,
+        delay INTEGER,
+        datarate REAL,
+        latency INTEGER,
+        source TEXT NOT NULL,
+        compression_ratio REAL
+    ''',
+    'receptions': '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        payload_id INTEGER NOT NULL REFERENCES payloads(id),
+        rssi INTEGER,
+        snr REAL
+    '''
+}
+MIGRATION_CHUNK_ROWS = 50000
+PAYLOAD_MIGRATION = 'content-addressed payload store'
+
+
+def last_sequence(conn, table):
+    # The AUTOINCREMENT high-water mark of table, which DROP TABLE discards with it
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        return None
+    row = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    return row[0] if row else None
+
+
+def restore_sequence(conn, table, sequence):
+    # Raises the recreated table's high-water mark back to the one saved by last_sequence()
+    if sequence is None:
+        return
+    if not conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence, table)).rowcount:
+        conn.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table, sequence))
+
+
+def move_payloads(conn):
+    # Move the data column into the content-addressed payloads table. SQLite can't swap a
+    # column in place, so each table is copied chunk by chunk into a new one (same ids)
+    # and its indexes and triggers are recreated. Tables already using the store are left
+    # alone, which also covers a transmissions table recreated by a CSV overwrite.
+    conn.execute(payload_store.CREATE_TABLE)
+    for table, columns in PAYLOAD_TABLES.items():
+        if payload_store.has_store(conn, table):
+            continue
+        names = [c.split()[0] for c in columns.strip().split(',\n')]
+        position = names.index('payload_id')
+        saved = conn.execute('''
+            SELECT sql FROM sqlite_master
+            WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+        ''', (table,)).fetchall()
+        sequence = last_sequence(conn, table)
+
+        conn.execute(f'CREATE TABLE {table}_new ({columns})')
+        source = [('data' if name == 'payload_id' else name) for name in names]
+        insert = f"INSERT INTO {table}_new ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        last_id = -1
+        while True:
+            rows = conn.execute(f'''
+                SELECT {', '.join(source)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, MIGRATION_CHUNK_ROWS)).fetchall()
+            if not rows:
+                break
+            conn.executemany(insert, payload_store.replace_texts(conn, [tuple(r) for r in rows], position))
+            last_id = rows[-1][0]
+
+        conn.execute(f'DROP TABLE {table}')
+        conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        for (sql,) in saved:
+            conn.execute(sql)
+        # Keep AUTOINCREMENT from reusing ids of rows deleted before the migration
+        restore_sequence(conn, table, sequence)
+
+
+def source_page_order(conn):
+    # /api/stats?source= pages in (timestamp DESC, id DESC) order. The rowid SQLite appends
+    # to idx_transmissions_source comes after the covered columns, so ties on timestamp
+    # were sorted in a temporary b-tree; with id right after timestamp the page comes off
+    # the index in order. Still covers the per-source aggregates.
+    conn.execute('DROP INDEX IF EXISTS idx_transmissions_source')
+    conn.execute('''
+        CREATE INDEX idx_transmissions_source
+        ON transmissions(source, timestamp, id, datarate, latency, compression_ratio)
+    ''')
+
+
+MIGRATIONS = [
+    (1, 'baseline schema', baseline),
+    (2, 'covering indexes for the API queries', covering_indexes),
+    (3, PAYLOAD_MIGRATION, move_payloads),
+    (4, 'source index in stats page order', source_page_order),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    # Runs inside the caller's transaction; returns the descriptions of what was applied
+    applied = []
+    current = schema_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        apply(conn)
+        conn.execute(f'PRAGMA user_version = {version}')
+        applied.append(description)
+    if applied:
+        conn.execute('PRAGMA optimize')
+    return applied
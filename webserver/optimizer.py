@@ -0,0 +1,204 @@
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+import lora
+from cache import response_cache
+
+# Server-side LoRa parameter optimizer behind /api/recommend. Where the enhanced sender's
+# optimizeLoRaParameters() scores SF, BW and CR separately over its last 20 packets, this
+# scores every (sf, bw, cr) combination by expected goodput:
+#
+#   goodput = payload bits * P(delivery) / time on air
+#
+# P(delivery) blends the link's observed success rate for that combination (rollup_hour,
+# ok = datarate > 0) with a prior from its SNR: the chance that the SNR, normalised to
+# 125 kHz and penalised for wider bandwidths, clears the spreading factor's demodulation
+# limit. Combinations the link has rarely used lean on the prior; well-sampled ones on
+# their own record.
+#
+# Statistics are held per source as (field, sf, bw, cr) arrays, built once from the
+# hourly rollups. After that a refresh only aggregates the transmissions whose id is
+# above the last one seen, and only once new rows were written. Rows deleted since
+# (retention) stay counted until the periodic full rebuild.
+
+PRIOR_WEIGHT = float(os.getenv('OPTIMIZER_PRIOR_WEIGHT', '10'))  # pseudo-observations
+REFRESH_SECONDS = float(os.getenv('OPTIMIZER_REFRESH_SECONDS', '30'))
+REBUILD_SECONDS = float(os.getenv('OPTIMIZER_REBUILD_SECONDS', '3600'))
+DEFAULT_PAYLOAD_BYTES = int(os.getenv('OPTIMIZER_PAYLOAD_BYTES', '64'))
+MAX_PAYLOAD_BYTES = 255
+DEFAULT_SNR_STD = 3.0
+MIN_SNR_STD = 1.0
+
+FIELDS = ['count', 'ok', 'snr_n', 'snr_sum', 'snr_sumsq']
+COUNT, OK, SNR_N, SNR_SUM, SNR_SUMSQ = range(len(FIELDS))
+
+SF = np.array(lora.SPREADING_FACTORS).reshape(-1, 1, 1)
+BW = np.array(lora.BANDWIDTHS).reshape(1, -1, 1)
+CR = np.array(lora.CODING_RATES).reshape(1, 1, -1)
+GRID = (len(lora.SPREADING_FACTORS), len(lora.BANDWIDTHS), len(lora.CODING_RATES))
+DEMODULATION_SNR = np.array([lora.DEMODULATION_SNR[sf] for sf in lora.SPREADING_FACTORS]).reshape(-1, 1, 1)
+BANDWIDTH_PENALTY = lora.bandwidth_penalty(BW)
+
+# Every hour bucket summed per combination: the starting point of a rebuild
+ROLLUP_TOTALS = '''
+    SELECT source, sf, bw, cr, ok, SUM(count), SUM(snr_n), SUM(snr_sum), SUM(snr_sumsq)
+    FROM rollup_hour
+    GROUP BY source, sf, bw, cr, ok
+'''
+
+# The same figures for the rows inserted since a refresh, read by id range
+NEW_ROWS = '''
+    SELECT source, sf, bw, cr, COALESCE(datarate > 0, 0), COUNT(*), COUNT(snr), TOTAL(snr), TOTAL(snr * snr)
+    FROM transmissions
+    WHERE id > ? AND id <= ?
+    GROUP BY 1, 2, 3, 4, 5
+'''
+
+_erf = np.vectorize(math.erf, otypes=[float])
+
+
+def empty_stats():
+    return np.zeros((len(FIELDS),) + GRID)
+
+
+def accumulate(rows):
+    # {source: stats} from aggregate rows (source, sf, bw, cr, ok, count, snr_n, snr_sum,
+    # snr_sumsq); rows outside the sender's parameter space are ignored
+    if not rows:
+        return {}
+    sources, sf, bw, cr, ok, count, snr_n, snr_sum, snr_sumsq = zip(*rows)
+    names, source_index = np.unique(np.array(sources, dtype=object).astype(str), return_inverse=True)
+    sf_index = np.array(sf) - lora.SPREADING_FACTORS[0]
+    cr_index = np.array(cr) - lora.CODING_RATES[0]
+    bw = np.array(bw)
+    bw_index = np.searchsorted(lora.BANDWIDTHS, bw)
+    valid = (
+        (sf_index >= 0) & (sf_index < GRID[0]) & (cr_index >= 0) & (cr_index < GRID[2])
+        & (bw_index < GRID[1]) & (np.array(lora.BANDWIDTHS)[np.minimum(bw_index, GRID[1] - 1)] == bw)
+    )
+    count = np.array(count, dtype=float)
+    values = np.stack([count, count * np.array(ok), snr_n, snr_sum, snr_sumsq]).astype(float)[:, valid]
+    stats = np.zeros((len(names), len(FIELDS)) + GRID)
+    index = (source_index[valid], sf_index[valid], bw_index[valid], cr_index[valid])
+    for field in range(len(FIELDS)):
+        np.add.at(stats[:, field], index, values[field])
+    return dict(zip(names, stats))
+
+
+def link_snr(stats):
+    # Mean and standard deviation of the link's SNR, normalised to 125 kHz, pooled over
+    # every combination it was measured with
+    n = stats[SNR_N].sum()
+    if not n:
+        return None, None, 0
+    offset = BANDWIDTH_PENALTY
+    total = (stats[SNR_SUM] + stats[SNR_N] * offset).sum()
+    total_sq = (stats[SNR_SUMSQ] + 2 * offset * stats[SNR_SUM] + stats[SNR_N] * offset ** 2).sum()
+    mean = total / n
+    variance = max(total_sq / n - mean ** 2, 0.0)
+    return mean, max(math.sqrt(variance), MIN_SNR_STD), int(n)
+
+
+def delivery_prior(snr_mean, snr_std):
+    # P(SNR at the combination's bandwidth >= the spreading factor's demodulation limit)
+    if snr_mean is None:
+        return np.full(GRID, 0.5)
+    margin = snr_mean - BANDWIDTH_PENALTY - DEMODULATION_SNR
+    prior = 0.5 * (1 + _erf(margin / (snr_std * math.sqrt(2))))
+    return np.broadcast_to(prior, GRID)
+
+
+def score(stats, payload_bytes, snr=None):
+    # Per-combination delivery probability, airtime (s) and goodput (bit/s)
+    if snr is None:
+        snr_mean, snr_std, samples = link_snr(stats)
+    else:
+        snr_mean, snr_std, samples = snr, DEFAULT_SNR_STD, 0
+    prior = delivery_prior(snr_mean, snr_std)
+    delivery = (stats[OK] + PRIOR_WEIGHT * prior) / (stats[COUNT] + PRIOR_WEIGHT)
+    airtime = lora.time_on_air(payload_bytes, SF, BW, CR)
+    goodput = payload_bytes * 8 * delivery / airtime
+    link = {'snr_mean': snr_mean, 'snr_std': snr_std, 'snr_samples': samples}
+    return delivery, airtime, goodput, link
+
+
+class Optimizer:
+    def __init__(self, connection):
+        # connection: context manager yielding a database connection (storage.connection)
+        self.connection = connection
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_id = None
+        self._generation = None
+        self._refreshed = 0.0
+        self._rebuilt = 0.0
+        self.refreshes = 0
+        self.rebuilds = 0
+
+    def refresh(self, force=False):
+        # Fold in the rows written since the last refresh; rebuild from the rollups when
+        # the rebuild interval passed
+        now = time.monotonic()
+        generation = response_cache.generation('transmissions')
+        with self._lock:
+            rebuild = force or self._last_id is None or now - self._rebuilt >= REBUILD_SECONDS
+            if not rebuild and generation == self._generation and now - self._refreshed < REFRESH_SECONDS:
+                return
+            with self.connection() as conn:
+                # One read snapshot, so the rollup totals and the id watermark agree
+                conn.execute('BEGIN')
+                try:
+                    last_id = conn.execute('SELECT MAX(id) FROM transmissions').fetchone()[0] or 0
+                    if rebuild:
+                        rows = conn.execute(ROLLUP_TOTALS).fetchall()
+                    else:
+                        rows = conn.execute(NEW_ROWS, (self._last_id, last_id)).fetchall()
+                finally:
+                    conn.rollback()
+            stats = {} if rebuild else self._stats
+            for source, values in accumulate(rows).items():
+                stats[source] = stats[source] + values if source in stats else values
+            self._stats = stats
+            self._last_id = last_id
+            self._generation = generation
+            self._refreshed = now
+            self.refreshes += 1
+            if rebuild:
+                self._rebuilt = now
+                self.rebuilds += 1
+
+    def stats(self, source=None):
+        with self._lock:
+            if source is not None:
+                return self._stats.get(source, empty_stats())
+            return sum(self._stats.values(), empty_stats())
+
+    def recommend(self, source=None, payload_bytes=DEFAULT_PAYLOAD_BYTES, snr=None, limit=5):
+        self.refresh()
+        stats = self.stats(source)
+        delivery, airtime, goodput, link = score(stats, payload_bytes, snr)
+        ranked = np.argsort(-goodput, axis=None, kind='stable')[:limit]
+        candidates = []
+        for flat in ranked:
+            i, j, k = np.unravel_index(flat, GRID)
+            candidates.append({
+                'sf': lora.SPREADING_FACTORS[i],
+                'bw': lora.BANDWIDTHS[j],
+                'cr': lora.CODING_RATES[k],
+                'delivery_probability': float(delivery[i, j, k]),
+                'time_on_air_ms': float(airtime[i, j, k] * 1000),
+                'goodput_bps': float(goodput[i, j, k]),
+                'observed': int(stats[COUNT, i, j, k]),
+                'observed_success': int(stats[OK, i, j, k])
+            })
+        return {
+            'source': source,
+            'payload_bytes': payload_bytes,
+            'link': dict(link, transmissions=int(stats[COUNT].sum())),
+            'recommendation': candidates[0] if candidates else None,
+            'candidates': candidates
+        }
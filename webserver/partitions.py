@@ -0,0 +1,159 @@
+import os
+import re
+import sqlite3
+import stat
+from contextlib import closing, nullcontext
+from datetime import datetime, timedelta
+from urllib.request import pathname2url
+
+import payload_store
+import storage
+
+# The main database is the hot partition: it holds the recent months and is the only
+# one the dashboard endpoints read. Whole months older than the retention window are
+# moved into one read-only, vacuumed SQLite file per table and month under ARCHIVE_DIR
+# (archive/transmissions/2024-01.db, ...), where exports and the analysis can still
+# reach them.
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '90'))
+TABLES = ['transmissions', 'receptions']
+
+_month_file = re.compile(r'^(\d{4}-\d{2})\.db$')
+
+
+def month_start(month):
+    return f'{month}-01 00:00:00'
+
+
+def next_month(month):
+    year, number = map(int, month.split('-'))
+    return f'{year + number // 12:04d}-{number % 12 + 1:02d}'
+
+
+def archive_path(table, month):
+    return os.path.join(ARCHIVE_DIR, table, f'{month}.db')
+
+
+def archived_months(table, since=None, until=None):
+    # Archived months overlapping [since, until), oldest first
+    directory = os.path.join(ARCHIVE_DIR, table)
+    if not os.path.isdir(directory):
+        return []
+    months = sorted(match.group(1) for match in map(_month_file.match, os.listdir(directory)) if match)
+    return [
+        month for month in months
+        if (not since or month_start(next_month(month)) > since) and (not until or month_start(month) < until)
+    ]
+
+
+def open_archive(path):
+    conn = sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro', uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    payload_store.register(conn)
+    return conn
+
+
+def iter_connections(table, since=None, until=None):
+    # One connection per partition a [since, until) query has to read: the archived
+    # months it overlaps, oldest first, then the hot database
+    for month in archived_months(table, since, until):
+        with closing(open_archive(archive_path(table, month))) as conn:
+            yield conn
+    with storage.connection() as conn:
+        yield conn
+
+
+def iter_sources(table, since=None, until=None):
+    # Like iter_connections, but yields a function returning a connection context per
+    # partition, for readers that hold a connection only briefly at a time: an archive
+    # file stays open while its partition is read, the hot database is borrowed from
+    # the pool on each call
+    for month in archived_months(table, since, until):
+        with closing(open_archive(archive_path(table, month))) as conn:
+            yield lambda conn=conn: nullcontext(conn)
+    yield storage.connection
+
+
+def months_to_archive(conn, table, cutoff):
+    # Months with rows entirely before the cutoff month, found through the timestamp index
+    months = []
+    row = conn.execute(f'SELECT MIN(timestamp) FROM {table}').fetchone()
+    month = row[0][:7] if row and row[0] else None
+    while month and month_start(month) < cutoff:
+        end = month_start(next_month(month))
+        if conn.execute(f'SELECT 1 FROM {table} WHERE timestamp >= ? AND timestamp < ? LIMIT 1',
+                        (month_start(month), end)).fetchone():
+            months.append(month)
+        row = conn.execute(f'SELECT MIN(timestamp) FROM {table} WHERE timestamp >= ?', (end,)).fetchone()
+        month = row[0][:7] if row and row[0] else None
+    return months
+
+
+def archive_month(table, month, delete_days=1):
+    # Copy the month into its archive file, then delete it from the hot database one day
+    # at a time so ingest is never locked out for long. Copying uses INSERT OR IGNORE on
+    # the original ids, so a run interrupted between the two steps can simply be repeated.
+    path = archive_path(table, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+    start, end = month_start(month), month_start(next_month(month))
+
+    with closing(storage.connect()) as conn:
+        conn.execute('ATTACH DATABASE ? AS archive', (path,))
+        ddl = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+        existing = conn.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if existing and payload_store.has_store(conn, table, 'archive') != payload_store.has_store(conn, table):
+            raise RuntimeError(f'{path} was archived before the payload store migration; move it aside and retry')
+        with conn:
+            if payload_store.has_store(conn, table):
+                # Archives are self-contained: the payloads their rows reference go with them
+                conn.execute(payload_store.CREATE_TABLE.replace('payloads', 'archive.payloads', 1))
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.payloads SELECT * FROM main.payloads
+                    WHERE id IN (SELECT payload_id FROM main.{table} WHERE timestamp >= ? AND timestamp < ?)
+                ''', (start, end))
+            conn.execute(re.sub(r'^CREATE TABLE\s+"?\w+"?', f'CREATE TABLE IF NOT EXISTS archive.{table}', ddl))
+            copied = conn.execute(f'''
+                INSERT OR IGNORE INTO archive.{table} SELECT * FROM main.{table}
+                WHERE timestamp >= ? AND timestamp < ? ORDER BY id
+            ''', (start, end)).rowcount
+        conn.execute('DETACH DATABASE archive')
+
+        day = datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
+        deleted = 0
+        while day.strftime('%Y-%m-%d %H:%M:%S') < end:
+            upper = min((day + timedelta(days=delete_days)).strftime('%Y-%m-%d %H:%M:%S'), end)
+            with conn:
+                deleted += conn.execute(f'DELETE FROM {table} WHERE timestamp >= ? AND timestamp < ?',
+                                        (day.strftime('%Y-%m-%d %H:%M:%S'), upper)).rowcount
+            day += timedelta(days=delete_days)
+
+    # Compact the archive and make it read-only
+    with closing(sqlite3.connect(path)) as archive:
+        archive.execute('VACUUM')
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return copied, deleted
+
+
+def apply_retention(days=RETENTION_DAYS, now=None):
+    # Archive every whole month that ended before the retention window; returns
+    # {table: [(month, rows archived), ...]}
+    cutoff = month_start(((now or datetime.now()) - timedelta(days=days)).strftime('%Y-%m'))
+    archived = {}
+    with storage.connection() as conn:
+        pending = {table: months_to_archive(conn, table, cutoff) for table in TABLES}
+    for table, months in pending.items():
+        archived[table] = []
+        for month in months:
+            _, deleted = archive_month(table, month)
+            archived[table].append((month, deleted))
+    if any(archived.values()):
+        # Minute rollups are only read for the latest buckets; hourly rollups are kept so
+        # the all-time /api/metrics figures still include archived months
+        with storage.transaction() as conn:
+            conn.execute('DELETE FROM rollup_minute WHERE bucket < ?', (cutoff[:16],))
+        # Payloads only the archived rows used now live in the archives alone
+        with storage.connection() as conn:
+            payload_store.sweep(conn)
+    return archived
@@ -0,0 +1,235 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content-addressed storage for the data column of transmissions and receptions. Test
+# runs resend the same payloads across SF/BW/CR sweeps, so each distinct payload is stored
+# once in `payloads`, keyed by a hash of its text and compressed when that makes it
+# smaller, and rows hold its id in payload_id. Writers swap texts for ids with intern();
+# readers that need the text resolve ids with load(), or join payloads and call the
+# payload_text() SQL function, both going through an LRU of decoded texts.
+#
+# LoRa payloads are at most a few hundred bytes, so most of the saving comes from the
+# deduplication; zlib (or zstd with PAYLOAD_CODEC=zstd and the zstandard package) only
+# pays off on the longer, repetitive ones and is skipped for the rest.
+
+PAYLOAD_CODEC = os.getenv('PAYLOAD_CODEC', 'zlib')
+PAYLOAD_CACHE_ENTRIES = int(os.getenv('PAYLOAD_CACHE_ENTRIES', '4096'))
+ZLIB_LEVEL = 9
+# Bound on the ids/hashes bound into one IN (...) list
+LOOKUP_CHUNK = 500
+
+# Tables whose data column lives in the store
+TABLES = ['transmissions', 'receptions']
+
+CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS payloads (
+        id INTEGER PRIMARY KEY,
+        hash BLOB NOT NULL UNIQUE,
+        codec TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        body BLOB NOT NULL
+    )
+'''
+
+_zstd_compressor = zstandard.ZstdCompressor(level=19) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def encode(text):
+    # (codec, body): compressed if that is smaller than the utf-8 text, raw otherwise
+    raw = text.encode('utf-8')
+    if PAYLOAD_CODEC == 'zstd' and _zstd_compressor is not None:
+        codec, body = 'zstd', _zstd_compressor.compress(raw)
+    else:
+        codec, body = 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+    return (codec, body) if len(body) < len(raw) else ('raw', raw)
+
+
+def decode(codec, body):
+    if codec == 'raw':
+        raw = body
+    elif codec == 'zlib':
+        raw = zlib.decompress(body)
+    elif codec == 'zstd':
+        if _zstd_decompressor is None:
+            raise RuntimeError("payload stored with zstd; install the 'zstandard' package to read it")
+        raw = _zstd_decompressor.decompress(body)
+    else:
+        raise ValueError(f'unknown payload codec {codec!r}')
+    return bytes(raw).decode('utf-8')
+
+
+class DecodedCache:
+    # Decoded texts by content hash, so the same entry is valid in every database and
+    # archive file that holds the payload
+    def __init__(self, max_entries=PAYLOAD_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def text(self, digest, codec, body):
+        with self._lock:
+            text = self._entries.get(digest)
+            if text is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return text
+        text = decode(codec, body)
+        with self._lock:
+            self.misses += 1
+            self._entries[digest] = text
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+
+decoded = DecodedCache()
+
+
+def payload_text(digest, codec, body):
+    # SQL function: payload_text(p.hash, p.codec, p.body)
+    if body is None:
+        return None
+    return decoded.text(bytes(digest), codec, body)
+
+
+def register(conn):
+    conn.create_function('payload_text', 3, payload_text, deterministic=True)
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def intern(conn, texts):
+    # Payload ids for texts (in order), inserting the ones not stored yet. Runs in the
+    # caller's transaction, so rows and their payloads are committed together. The write
+    # lock is taken before the lookup, so sweep() can't delete a payload between it being
+    # found here and the caller's rows referencing it.
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    hashes = {}
+    for text in texts:
+        if text not in hashes:
+            hashes[text] = content_hash(text)
+    ids = {}
+    digests = list(hashes.values())
+    for chunk in _chunks(digests):
+        ids.update((bytes(digest), payload_id) for payload_id, digest in conn.execute(
+            f"SELECT id, hash FROM payloads WHERE hash IN ({', '.join('?' * len(chunk))})", chunk))
+    for text, digest in hashes.items():
+        if digest not in ids:
+            codec, body = encode(text)
+            ids[digest] = conn.execute('INSERT INTO payloads (hash, codec, size, body) VALUES (?, ?, ?, ?)',
+                                       (digest, codec, len(text.encode('utf-8')), body)).lastrowid
+    return [ids[hashes[text]] for text in texts]
+
+
+def replace_texts(conn, rows, position):
+    # Copies of the row tuples with the text at `position` swapped for its payload id
+    ids = intern(conn, [row[position] for row in rows])
+    return [row[:position] + (payload_id,) + row[position + 1:] for row, payload_id in zip(rows, ids)]
+
+
+def sweep(conn):
+    # Deletes the payloads no row references any more, e.g. after their rows were archived
+    # or overwritten, and returns how many went. The scan of every row runs in a read
+    # snapshot, without the write lock; the delete then only has to re-check the rows
+    # added since, as rows are only ever appended (AUTOINCREMENT ids) and never repointed.
+    # Foreign keys are off for the delete, which the re-check makes safe: without an index
+    # on payload_id SQLite would otherwise scan each table once per deleted payload.
+    if conn.in_transaction:
+        raise RuntimeError('sweep() must run outside a transaction')
+    tables = [table for table in TABLES if has_store(conn, table)]
+    if not tables:
+        return 0
+    conn.execute('BEGIN')
+    try:
+        last_ids = [conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0] for table in tables]
+        referenced = ' UNION '.join(f'SELECT payload_id FROM {table}' for table in tables)
+        unused = [row[0] for row in conn.execute(f'SELECT id FROM payloads WHERE id NOT IN ({referenced})')]
+    finally:
+        conn.commit()
+    if not unused:
+        return 0
+
+    newer = ' UNION '.join(f'SELECT payload_id FROM {table} WHERE id > ?' for table in tables)
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys=OFF')
+    deleted = 0
+    try:
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for chunk in _chunks(unused):
+                deleted += conn.execute(f'''
+                    DELETE FROM payloads WHERE id IN ({', '.join('?' * len(chunk))}) AND id NOT IN ({newer})
+                ''', chunk + last_ids).rowcount
+    finally:
+        conn.execute(f'PRAGMA foreign_keys={foreign_keys}')
+    return deleted
+
+
+def load(conn, payload_ids):
+    # {payload id: text} for the given ids
+    wanted = list({payload_id for payload_id in payload_ids if payload_id is not None})
+    texts = {}
+    for chunk in _chunks(wanted):
+        for payload_id, digest, codec, body in conn.execute(
+                f"SELECT id, hash, codec, body FROM payloads WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+            texts[payload_id] = decoded.text(bytes(digest), codec, body)
+    return texts
+
+
+def has_store(conn, table, schema='main'):
+    # False for tables (e.g. archives written before the store existed) that still keep
+    # the text inline in data
+    return any(row[1] == 'payload_id' for row in conn.execute(f'PRAGMA {schema}.table_info({table})'))
+
+
+def report(conn):
+    # How much space the store saves compared with keeping every row's text inline
+    tables = {}
+    logical = 0
+    for table in TABLES:
+        if not has_store(conn, table):
+            continue
+        rows, size = conn.execute(f'''
+            SELECT COUNT(*), TOTAL(p.size) FROM {table} t JOIN payloads p ON p.id = t.payload_id
+        ''').fetchone()
+        tables[table] = {'rows': rows, 'payload_bytes': int(size)}
+        logical += int(size)
+    codecs = {
+        codec: {'payloads': count, 'bytes': int(size), 'stored_bytes': int(stored)}
+        for codec, count, size, stored in conn.execute('''
+            SELECT codec, COUNT(*), TOTAL(size), TOTAL(length(body)) FROM payloads GROUP BY codec
+        ''')
+    }
+    distinct = sum(c['payloads'] for c in codecs.values())
+    distinct_bytes = sum(c['bytes'] for c in codecs.values())
+    stored = sum(c['stored_bytes'] for c in codecs.values())
+    return {
+        'tables': tables,
+        'codecs': codecs,
+        'distinct_payloads': distinct,
+        'inline_bytes': logical,
+        'distinct_bytes': distinct_bytes,
+        'stored_bytes': stored,
+        'saved_bytes': logical - stored,
+        'dedup_ratio': logical / distinct_bytes if distinct_bytes else None,
+        'compression_ratio': distinct_bytes / stored if stored else None
+    }
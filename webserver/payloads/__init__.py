@@ -0,0 +1 @@
+from payloads.codec import compress, decompress, compression_ratio
@@ -0,0 +1,205 @@
+import argparse
+import json
+import sys
+import time
+import zlib
+
+import lora
+from payloads import codec
+from payloads.corpus import DATA_TYPES, corpus
+
+# Compares the sender-e payload compression against general-purpose codecs on a synthetic
+# corpus of each data type. Ratios, speeds and airtime are per packet, since every packet
+# is compressed on its own. Run from webserver/: python -m payloads.benchmark
+
+PACKET_PREFIX = b'ENHANCED:'
+DICTIONARY_SIZE = 2048
+
+
+def meta_suffix(sf, bw, cr):
+    return f'<META:SF{sf},BW{bw // 1000},CR{cr}>'.encode()
+
+
+class SenderCodec:
+    name = 'sender-e'
+
+    def train(self, data_type, samples):
+        self.data_type = data_type
+
+    def compress(self, payload):
+        return codec.compress(self.data_type, payload.decode('latin-1')).encode('latin-1')
+
+    def decompress(self, packed, original_length):
+        ratio = round(original_length / len(packed), 2) if packed else None
+        return codec.decompress(self.data_type, packed.decode('latin-1'), ratio).encode('latin-1')
+
+
+class DeflateCodec:
+    # Raw deflate: no zlib header or checksum, which would cost 6 bytes per packet
+    name = 'zlib'
+    zdict = None
+
+    def train(self, data_type, samples):
+        pass
+
+    def compress(self, payload):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=self.zdict) if self.zdict else \
+            zlib.compressobj(9, zlib.DEFLATED, -15)
+        return compressor.compress(payload) + compressor.flush()
+
+    def decompress(self, packed, original_length):
+        decompressor = zlib.decompressobj(-15, zdict=self.zdict) if self.zdict else zlib.decompressobj(-15)
+        return decompressor.decompress(packed) + decompressor.flush()
+
+
+class DeflateDictCodec(DeflateCodec):
+    # Preset dictionary from the training samples: deflate references the most recent
+    # bytes best, so the most common samples go last
+    name = 'zlib-dict'
+
+    def train(self, data_type, samples):
+        counts = {}
+        for sample in samples:
+            counts[sample] = counts.get(sample, 0) + 1
+        ordered = sorted(counts, key=counts.get)
+        self.zdict = b''.join(ordered)[-DICTIONARY_SIZE:]
+
+
+class LZ4Codec:
+    name = 'lz4'
+
+    def __init__(self):
+        import lz4.block
+        self.block = lz4.block
+
+    def train(self, data_type, samples):
+        pass
+
+    def compress(self, payload):
+        return self.block.compress(payload, mode='high_compression', store_size=False)
+
+    def decompress(self, packed, original_length):
+        return self.block.decompress(packed, uncompressed_size=original_length)
+
+
+class ZstdDictCodec:
+    name = 'zstd-dict'
+
+    def __init__(self):
+        import zstandard
+        self.zstandard = zstandard
+
+    def train(self, data_type, samples):
+        dictionary = self.zstandard.train_dictionary(DICTIONARY_SIZE, samples)
+        self.compressor = self.zstandard.ZstdCompressor(
+            level=19, dict_data=dictionary, write_checksum=False, write_content_size=False, write_dict_id=False
+        )
+        self.decompressor = self.zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def compress(self, payload):
+        return self.compressor.compress(payload)
+
+    def decompress(self, packed, original_length):
+        return self.decompressor.decompress(packed, max_output_size=original_length)
+
+
+def available_codecs():
+    # lz4 and zstandard are optional; codecs whose package is missing are skipped
+    codecs = [SenderCodec(), DeflateCodec(), DeflateDictCodec()]
+    skipped = []
+    for codec_class, package in ((LZ4Codec, 'lz4'), (ZstdDictCodec, 'zstandard')):
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            skipped.append(f'{codec_class.name} (pip install {package})')
+    return codecs, skipped
+
+
+def measure(codec_impl, data_type, train, test, sf, bw, cr):
+    codec_impl.train(data_type, train)
+    suffix = meta_suffix(sf, bw, cr)
+    original_bytes = packed_bytes = exact = 0
+    airtime_original = airtime_packed = 0.0
+    compress_s = decompress_s = 0.0
+    for payload in test:
+        started = time.perf_counter()
+        packed = codec_impl.compress(payload)
+        compress_s += time.perf_counter() - started
+        started = time.perf_counter()
+        restored = codec_impl.decompress(packed, len(payload))
+        decompress_s += time.perf_counter() - started
+
+        exact += restored == payload
+        original_bytes += len(payload)
+        packed_bytes += len(packed)
+        overhead = len(PACKET_PREFIX) + len(suffix)
+        airtime_original += lora.time_on_air(overhead + len(payload), sf, bw, cr)
+        airtime_packed += lora.time_on_air(overhead + len(packed), sf, bw, cr)
+    return {
+        'ratio': original_bytes / packed_bytes if packed_bytes else None,
+        'mean_bytes': packed_bytes / len(test),
+        'compress_us': compress_s / len(test) * 1e6,
+        'decompress_us': decompress_s / len(test) * 1e6,
+        'airtime_saving': 1 - airtime_packed / airtime_original,
+        'exact_roundtrip': exact / len(test)
+    }
+
+
+def run(samples, seed, sf, bw, cr, data_types=DATA_TYPES):
+    # Half of each type's corpus trains the dictionary codecs, the other half is measured
+    codecs, skipped = available_codecs()
+    payloads = corpus(samples * 2, seed, data_types)
+    results = {}
+    for data_type, items in payloads.items():
+        encoded = [item.encode('latin-1') for item in items]
+        train, test = encoded[:samples], encoded[samples:]
+        results[data_type] = {
+            'mean_original_bytes': sum(map(len, test)) / len(test),
+            'codecs': {c.name: measure(c, data_type, train, test, sf, bw, cr) for c in codecs}
+        }
+        # Only codecs that give the payload back exactly qualify as the best choice
+        lossless = {name: r for name, r in results[data_type]['codecs'].items() if r['exact_roundtrip'] == 1.0}
+        results[data_type]['best'] = max(lossless, key=lambda name: lossless[name]['airtime_saving']) if lossless else None
+    return results, skipped
+
+
+def print_table(results, skipped, sf, bw, cr, stream=sys.stdout):
+    stream.write(f'Airtime at SF{sf}, BW{bw // 1000} kHz, CR4/{cr}, per packet incl. ENHANCED: prefix and META suffix\n\n')
+    stream.write(f"{'type':<8} {'codec':<10} {'bytes':>7} {'ratio':>6} {'airtime':>8} {'exact':>6} {'comp us':>8} {'dec us':>8}\n")
+    for data_type, result in results.items():
+        stream.write(f"{data_type:<8} {'original':<10} {result['mean_original_bytes']:>7.1f}\n")
+        for name, r in result['codecs'].items():
+            marker = ' *' if name == result['best'] else ''
+            stream.write(
+                f"{'':<8} {name:<10} {r['mean_bytes']:>7.1f} {r['ratio']:>6.2f} {-r['airtime_saving']:>+8.1%} "
+                f"{r['exact_roundtrip']:>6.0%} {r['compress_us']:>8.1f} {r['decompress_us']:>8.1f}{marker}\n"
+            )
+    stream.write('\n* best airtime saving among codecs that round-trip exactly\n')
+    if skipped:
+        stream.write(f"Skipped: {', '.join(skipped)}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark payload compression codecs per data type.')
+    parser.add_argument('--samples', type=int, default=500, help='payloads measured per data type')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sf', type=int, default=7)
+    parser.add_argument('--bw', type=int, default=125000, help='bandwidth in Hz')
+    parser.add_argument('--cr', type=int, default=5, help='coding rate denominator (5-8)')
+    parser.add_argument('--types', default=','.join(DATA_TYPES), help='comma-separated data types')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    data_types = [t.strip() for t in args.types.split(',') if t.strip()]
+    unknown = [t for t in data_types if t not in DATA_TYPES]
+    if unknown:
+        parser.error(f"unknown data types: {', '.join(unknown)}")
+    results, skipped = run(args.samples, args.seed, args.sf, args.bw, args.cr, data_types)
+    if args.json:
+        print(json.dumps({'sf': args.sf, 'bw': args.bw, 'cr': args.cr, 'results': results, 'skipped': skipped}, indent=2))
+    else:
+        print_table(results, skipped, args.sf, args.bw, args.cr)
+
+
+if __name__ == '__main__':
+    main()
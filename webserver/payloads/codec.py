@@ -0,0 +1,188 @@
+import re
+
+# Python port of compressData() in Sender-Enhanced/sender-e/sender-e.ino, plus the
+# matching decoder. Strings stand in for the firmware's byte strings: the dictionary keys
+# of RAND:DICT: payloads are single bytes >= 0x80, represented here as chr(0x80..0xff)
+# (latin-1), so len() matches the length the sender computed its ratios from.
+#
+# The firmware format is not uniquely decodable in general: RLE counts are bare digits,
+# the word codes (~1..~0) are ordinary text and the fallback RLE carries no marker.
+# decompress() therefore keeps only the readings that compress back to the stored
+# payload and, when the sender's compression ratio is known, picks the one whose length
+# matches it.
+
+COMMON_WORDS = ['the', 'and', 'that', 'have', 'for', 'not', 'with', 'you', 'this', 'but']
+WORD_CODES = ['~1', '~2', '~3', '~4', '~5', '~6', '~7', '~8', '~9', '~0']
+
+URL_SUBSTITUTIONS = [
+    ('www.', 'W.'), ('.com', '.C'), ('.org', '.O'), ('.net', '.N'), ('.io', '.I'), ('.edu', '.E'),
+    ('.gov', '.G'), ('.co.uk', '.UK'), ('.co.in', '.IN'),
+    ('/images/', '/I/'), ('/audio/', '/A/'), ('/video/', '/V/'), ('/download/', '/D/'), ('/content/', '/C/'),
+    ('?id=', '?i='), ('&size=', '&s='), ('&format=', '&f='), ('&quality=', '&q='), ('&version=', '&v='),
+]
+
+DICT_PREFIX = 'RAND:DICT:'
+# Longest run unrle() expands; longer digit strings are literal digits, not counts
+MAX_RUN = 4096
+DICT_MAX_ENTRIES = 20
+
+_run = re.compile(r'(\d+)(.)', re.DOTALL)
+
+
+def rle(text):
+    # Runs of three or more characters become <count><char>
+    out = []
+    i = 0
+    n = len(text)
+    while i < n:
+        j = i + 1
+        while j < n and text[j] == text[i]:
+            j += 1
+        count = j - i
+        out.append(f'{count}{text[i]}' if count > 2 else text[i] * count)
+        i = j
+    return ''.join(out)
+
+
+def unrle(text):
+    # Inverse of rle() for text without literal digits; counts below 3 are never emitted,
+    # so such digit runs are kept as they are
+    def expand(match):
+        digits = match.group(1)
+        count = int(digits) if len(digits) <= 4 else 0
+        return match.group(2) * count if 2 < count <= MAX_RUN else match.group(0)
+    return _run.sub(expand, text)
+
+
+def _replace_words(text, pairs):
+    processed = f' {text} '
+    for old, new in pairs:
+        processed = processed.replace(f' {old} ', f' {new} ')
+    return processed[1:-1]
+
+
+def _dictionary(data):
+    compressed = DICT_PREFIX
+    remaining = data[5:]
+    for length in range(6, 2, -1):
+        i = 0
+        # The firmware compares against an unsigned length; stopping once the remainder
+        # is shorter than the pattern is what it intends
+        while i < len(remaining) - length:
+            pattern = remaining[i:i + length]
+            occurrences = 0
+            pos = remaining.find(pattern)
+            while pos >= 0:
+                occurrences += 1
+                pos = remaining.find(pattern, pos + 1)
+            if occurrences > 2:
+                key = chr(128 + len(compressed) % 128)
+                compressed += key + pattern
+                pos = remaining.find(pattern)
+                while pos >= 0:
+                    remaining = remaining[:pos] + key + remaining[pos + length:]
+                    pos = remaining.find(pattern, pos + 1)
+            if (len(compressed) - 10) // 7 >= DICT_MAX_ENTRIES:
+                break
+            i += 1
+    packed = rle(remaining)
+    if len(packed) < len(remaining):
+        remaining = 'RLE:' + packed
+    return compressed + '::' + remaining
+
+
+def _url(data):
+    prefix, url = data[:4], data[4:]
+    if url.startswith('http://'):
+        url = 'H:' + url[7:]
+    elif url.startswith('https://'):
+        url = 'HS:' + url[8:]
+    for old, new in URL_SUBSTITUTIONS:
+        url = url.replace(old, new)
+    return prefix + url
+
+
+def compress(data_type, data):
+    if data_type in ('text', 'repeat'):
+        return 'C1:' + rle(_replace_words(data, zip(COMMON_WORDS, WORD_CODES)))
+    if data_type in ('ones', 'zeros'):
+        if data.startswith('ONES:'):
+            return f'ONES:{len(data) - 5}'
+        if data.startswith('ZEROS:'):
+            return f'ZEROS:{len(data) - 6}'
+    elif data_type == 'random':
+        if len(data) > 20:
+            return _dictionary(data)
+    elif data_type in ('image', 'audio'):
+        if data.startswith(('IMG:', 'AUD:')):
+            return _url(data)
+    packed = rle(data)
+    return packed if len(packed) < len(data) else data
+
+
+def compression_ratio(original, compressed):
+    return len(original) / len(compressed) if compressed else 1.0
+
+
+def _parse_dictionary(payload, end):
+    # Entry keys are derived from their offset, so the only freedom is each pattern's
+    # length (3..6, never longer than the previous one); search for the split that lands
+    # every key where the firmware would have put it
+    def parse(position, max_length):
+        if position == end:
+            return []
+        if payload[position] != chr(128 + position % 128):
+            return None
+        for length in range(min(max_length, 6), 2, -1):
+            following = position + 1 + length
+            if following > end:
+                continue
+            rest = parse(following, length)
+            if rest is not None:
+                return [(payload[position], payload[position + 1:following])] + rest
+        return None
+    return parse(len(DICT_PREFIX), 6)
+
+
+def _candidates(data_type, payload):
+    # Every plausible original for a stored payload, most likely first
+    if payload.startswith('C1:'):
+        body = payload[3:]
+        for unpacked in dict.fromkeys([unrle(body), body]):
+            yield _replace_words(unpacked, zip(WORD_CODES, COMMON_WORDS))
+    elif payload.startswith(DICT_PREFIX) and '::' in payload[len(DICT_PREFIX):]:
+        end = payload.index('::', len(DICT_PREFIX))
+        entries = _parse_dictionary(payload, end)
+        if entries is None:
+            return
+        remaining = payload[end + 2:]
+        bodies = [unrle(remaining[4:]), remaining[4:]] if remaining.startswith('RLE:') else [remaining]
+        for body in dict.fromkeys(bodies):
+            for key, pattern in reversed(entries):
+                body = body.replace(key, pattern)
+            yield 'RAND:' + body
+    elif re.fullmatch(r'(ONES|ZEROS):\d+', payload):
+        prefix, count = payload.split(':')
+        yield f"{prefix}:{('1' if prefix == 'ONES' else '0') * int(count)}"
+    elif payload.startswith(('IMG:', 'AUD:')) and data_type in ('image', 'audio'):
+        prefix, url = payload[:4], payload[4:]
+        if url.startswith('HS:'):
+            url = 'https://' + url[3:]
+        elif url.startswith('H:'):
+            url = 'http://' + url[2:]
+        for old, new in reversed(URL_SUBSTITUTIONS):
+            url = url.replace(new, old)
+        yield prefix + url
+    else:
+        yield from dict.fromkeys([unrle(payload), payload])
+
+
+def decompress(data_type, payload, ratio=None):
+    # Best reconstruction of the sender's original payload. ratio is the compression
+    # ratio the sender reported alongside the payload (transmissions.compression_ratio).
+    consistent = [c for c in _candidates(data_type, payload) if compress(data_type, c) == payload]
+    if not consistent:
+        return payload
+    if ratio is None or len(consistent) == 1:
+        return consistent[0]
+    return min(consistent, key=lambda c: abs(compression_ratio(c, payload) - ratio))
@@ -0,0 +1,50 @@
+import random
+
+# Synthetic payloads built the way handleSend() in sender-e.ino builds them for each data
+# type of the web UI, sized to fit a LoRa packet
+
+SENTENCES = [
+    'the temperature in the greenhouse is {n} degrees and the humidity is {m} percent',
+    'node {n} reports that the battery is low and the solar input is not enough',
+    'alert: water level at gauge {n} is above the threshold for this hour',
+    'have you seen the new readings from the north field? they are {n} higher than last week',
+    'this is a test message with the default settings and no payload',
+    'door {n} opened for {m} seconds but the alarm was not armed',
+    'soil moisture {n} and leaf wetness {m} with light rain expected',
+    'hello from the enhanced sender, all good and nothing to report',
+]
+REPEAT_UNITS = ['ab', 'hello ', 'x', 'LoRa', '0123456789', '-=']
+URL_TEMPLATES = [
+    'https://www.example.com/images/{name}.jpg',
+    'https://cdn.sensor-net.io/images/{name}.png?id={n}&size=small',
+    'http://media.farm.org/audio/{name}.mp3?id={n}&format=mp3&quality=low',
+    'https://www.univ.edu/content/{name}/download/report.pdf',
+    'https://data.city.gov/video/{name}.mp4?id={n}&version=2',
+    'https://shop.example.co.uk/images/{name}.jpg?id={n}',
+]
+NAMES = ['cat', 'field-north', 'gate', 'sensor_17', 'weather', 'camera2', 'barn', 'river']
+
+DATA_TYPES = ['text', 'repeat', 'random', 'ones', 'zeros', 'image', 'audio']
+
+
+def payload(data_type, rng):
+    if data_type == 'text':
+        text = rng.choice(SENTENCES).format(n=rng.randint(1, 99), m=rng.randint(1, 99))
+        return 'TXT:' + text
+    if data_type == 'repeat':
+        return rng.choice(REPEAT_UNITS) * rng.randint(3, 30)
+    if data_type == 'random':
+        # String(random(256), HEX): one or two lowercase hex digits per byte
+        return 'RAND:' + ''.join(format(rng.randrange(256), 'x') for _ in range(rng.randint(4, 80)))
+    if data_type == 'ones':
+        return 'ONES:' + '1' * rng.randint(1, 200)
+    if data_type == 'zeros':
+        return 'ZEROS:' + '0' * rng.randint(1, 200)
+    url = rng.choice(URL_TEMPLATES).format(name=rng.choice(NAMES), n=rng.randint(1, 9999))
+    return ('IMG:' if data_type == 'image' else 'AUD:') + url
+
+
+def corpus(samples_per_type=500, seed=0, data_types=DATA_TYPES):
+    # {data_type: [payload, ...]}, reproducible for a given seed
+    rng = random.Random(seed)
+    return {data_type: [payload(data_type, rng) for _ in range(samples_per_type)] for data_type in data_types}
@@ -0,0 +1,108 @@
+import re
+
+import storage
+
+# Tables that grow with every packet. A plain scan of one of these is a regression;
+# rollup_hour (one row per hour and parameter combination) is the table the all-time
+# aggregates are meant to scan.
+LARGE_TABLES = ('transmissions', 'receptions', 'rollup_minute')
+
+_full_scan = re.compile(r'^SCAN (\w+)(?: USING INDEX \w+)?$')
+_access = re.compile(r'^(?:SCAN|SEARCH) (\w+)\b')
+_limit = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+_where = re.compile(r'\bWHERE\b', re.IGNORECASE)
+# FROM/JOIN table [AS] alias; the alias is optional, so keywords that can follow the
+# table name are not taken for one
+_table = re.compile(
+    r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|USING|NOT|INDEXED|LEFT|INNER|CROSS|GROUP|'
+    r'ORDER|LIMIT|UNION|HAVING|WINDOW)\b)(\w+))?',
+    re.IGNORECASE
+)
+
+
+def api_requests(conn):
+    # Representative calls for every read route, parameterised from the data at hand
+    from application import encode_cursor
+    last_id = conn.execute('SELECT MAX(id) FROM transmissions').fetchone()[0] or 0
+    since_id = max(last_id - 100, 0)
+    newest = conn.execute('SELECT timestamp, id FROM transmissions ORDER BY timestamp DESC, id DESC LIMIT 1').fetchone()
+    cursor = encode_cursor(newest) if newest else encode_cursor({'timestamp': '2100-01-01', 'id': 0})
+    return [
+        '/api/stats',
+        '/api/stats?source=enhanced',
+        f'/api/stats?source=enhanced&cursor={cursor}',
+        '/api/stats?source=enhanced&since=2000-01-01&until=2100-01-01',
+        '/api/stats?since=2000-01-01&until=2100-01-01',
+        f'/api/stats?since_id={since_id}',
+        f'/api/stats?since_id={since_id}&source=enhanced',
+        f'/api/stats?cursor={cursor}',
+        '/api/metrics',
+        '/api/recommend?source=enhanced',
+        '/api/timeseries',
+        f'/api/timeseries?since_id={since_id}&max_points=500',
+        '/api/export.csv?since=2100-01-01',
+        '/api/export.csv?since=2100-01-01&source=enhanced',
+    ]
+
+
+def large_tables(sql):
+    # Names the plan may use for the large tables a statement reads: table or alias
+    names = set()
+    for table, alias in _table.findall(sql):
+        if table.lower() in LARGE_TABLES:
+            names.update(filter(None, (table.lower(), alias.lower())))
+    return names
+
+
+def full_scans(conn, sql):
+    # Plan lines that read a whole large table (or a non-covering index over all of it),
+    # or sort rows of one in a temporary b-tree. An ordered scan is only fine when it
+    # ends at a LIMIT and has no WHERE: then every row it reads is returned, so it stops
+    # after LIMIT rows. With a filter it reads the whole table whenever fewer rows match.
+    details = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+    large = large_tables(sql)
+    reads_large = any((match := _access.match(d)) and match.group(1).lower() in large for d in details)
+    sorts = [d for d in details if 'TEMP B-TREE' in d]
+    early_exit = _limit.search(sql) and not _where.search(sql) and not sorts
+    problems = []
+    for detail in details:
+        match = _full_scan.match(detail)
+        if match and match.group(1).lower() in large and not early_exit:
+            problems.append(detail)
+    if reads_large:
+        problems.extend(sorts)
+    return problems
+
+
+def capture_statements(client, path, conn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        client.get(path).get_data()
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+
+def check_plans(paths=None):
+    # Runs each API request against the configured database with a one-connection pool,
+    # records the SQL it issues and returns (path, statement, plan line) for every full scan
+    from application import app
+    from cache import response_cache
+
+    storage.configure(size=1)
+    client = app.test_client()
+    failures = []
+    checked = set()
+    # The pool's only connection is the one every request below will use
+    with storage.connection() as conn:
+        paths = paths or api_requests(conn)
+    for path in paths:
+        response_cache.clear()
+        for sql in capture_statements(client, path, conn):
+            if sql in checked:
+                continue
+            checked.add(sql)
+            for detail in full_scans(conn, sql):
+                failures.append((path, ' '.join(sql.split()), detail))
+    return failures
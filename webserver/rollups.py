@@ -0,0 +1,128 @@
+# Pre-aggregated per-minute and per-hour transmission statistics.
+#
+# Every insert into transmissions is folded into rollup_minute and rollup_hour by an
+# AFTER INSERT trigger, so the aggregates stay exact whichever path wrote the row
+# (single POST, batch, CSV import). Each rollup row holds, per
+# (bucket, source, sf, bw, cr, ok), the row count and n/sum/sum-of-squares/min/max of
+# every metric; ok marks rows with datarate > 0, which /api/metrics filters on.
+from contextlib import closing
+
+import partitions
+
+METRICS = ['rssi', 'snr', 'datarate', 'latency', 'compression_ratio']
+
+KEY = ['bucket', 'source', 'sf', 'bw', 'cr', 'ok']
+
+GRANULARITIES = {
+    'rollup_minute': '%Y-%m-%d %H:%M',
+    'rollup_hour': '%Y-%m-%d %H:00'
+}
+
+
+def bucket_expr(fmt, column):
+    # Timestamps SQLite can't parse all land in one '' bucket rather than one bucket per row
+    return f"COALESCE(strftime('{fmt}', {column}), '')"
+
+
+def metric_columns():
+    return [f'{m}_{agg}' for m in METRICS for agg in ('n', 'sum', 'sumsq', 'min', 'max')]
+
+
+def merge_updates():
+    # ON CONFLICT assignments folding the excluded rollup row into the existing one
+    updates = ['count = count + excluded.count']
+    for m in METRICS:
+        updates += [
+            f'{m}_n = {m}_n + excluded.{m}_n',
+            f'{m}_sum = {m}_sum + excluded.{m}_sum',
+            f'{m}_sumsq = {m}_sumsq + excluded.{m}_sumsq',
+            f'{m}_min = COALESCE(MIN({m}_min, excluded.{m}_min), {m}_min, excluded.{m}_min)',
+            f'{m}_max = COALESCE(MAX({m}_max, excluded.{m}_max), {m}_max, excluded.{m}_max)'
+        ]
+    return updates
+
+
+def aggregate_query(fmt):
+    # Rollup rows of the transmissions table of whichever database runs the query
+    aggregates = []
+    for m in METRICS:
+        aggregates += [f'COUNT({m})', f'TOTAL({m})', f'TOTAL({m} * {m})', f'MIN({m})', f'MAX({m})']
+    return f'''
+        SELECT {bucket_expr(fmt, 'timestamp')}, source, sf, bw, cr, COALESCE(datarate > 0, 0),
+               COUNT(*), {', '.join(aggregates)}
+        FROM transmissions
+        GROUP BY 1, 2, 3, 4, 5, 6
+    '''
+
+
+def create_rollups(conn):
+    cursor = conn.cursor()
+    for table, fmt in GRANULARITIES.items():
+        metric_ddl = ',\n'.join(
+            f'{m}_n INTEGER NOT NULL DEFAULT 0, {m}_sum REAL NOT NULL DEFAULT 0, '
+            f'{m}_sumsq REAL NOT NULL DEFAULT 0, {m}_min REAL, {m}_max REAL'
+            for m in METRICS
+        )
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                source TEXT NOT NULL,
+                sf INTEGER NOT NULL,
+                bw INTEGER NOT NULL,
+                cr INTEGER NOT NULL,
+                ok INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                {metric_ddl},
+                PRIMARY KEY ({', '.join(KEY)})
+            ) WITHOUT ROWID
+        ''')
+
+        values = [
+            bucket_expr(fmt, 'NEW.timestamp'), 'NEW.source', 'NEW.sf', 'NEW.bw', 'NEW.cr',
+            'COALESCE(NEW.datarate > 0, 0)', '1'
+        ]
+        for m in METRICS:
+            values += [
+                f'NEW.{m} IS NOT NULL', f'COALESCE(NEW.{m}, 0)', f'COALESCE(NEW.{m} * NEW.{m}, 0)',
+                f'NEW.{m}', f'NEW.{m}'
+            ]
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table} AFTER INSERT ON transmissions
+            BEGIN
+                INSERT INTO {table} ({', '.join(KEY + ['count'] + metric_columns())})
+                VALUES ({', '.join(values)})
+                ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET {', '.join(merge_updates())};
+            END
+        ''')
+
+
+def rebuild_rollups(conn):
+    # Recompute every rollup from the raw rows, e.g. for databases created before rollups
+    # existed or after rows were deleted (deletes are not folded in incrementally).
+    # Archived months are no longer in transmissions, so their hourly rollups are
+    # recomputed from the archive files (see partitions.py); like apply_retention(), the
+    # minute rollups only cover the hot database.
+    cursor = conn.cursor()
+    columns = KEY + ['count'] + metric_columns()
+    for table, fmt in GRANULARITIES.items():
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} ({", ".join(columns)}) {aggregate_query(fmt)}')
+    merge = f'''
+        INSERT INTO rollup_hour ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET {', '.join(merge_updates())}
+    '''
+    for month in partitions.archived_months('transmissions'):
+        with closing(partitions.open_archive(partitions.archive_path('transmissions', month))) as archive:
+            cursor.executemany(merge, archive.execute(aggregate_query(GRANULARITIES['rollup_hour'])))
+    return cursor.execute('SELECT COUNT(*) FROM rollup_minute').fetchone()[0]
+
+
+def needs_backfill(conn):
+    has_rows = (conn.execute('SELECT 1 FROM transmissions LIMIT 1').fetchone()
+                or partitions.archived_months('transmissions'))
+    has_rollups = conn.execute('SELECT 1 FROM rollup_hour LIMIT 1').fetchone()
+    return bool(has_rows) and not has_rollups
+
+
+def avg(metric):
+    return f'SUM({metric}_sum) * 1.0 / NULLIF(SUM({metric}_n), 0)'
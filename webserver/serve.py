@@ -0,0 +1,129 @@
+import argparse
+import os
+
+from gunicorn.app.base import BaseApplication
+from gunicorn.workers.gthread import ThreadWorker
+
+import storage
+from events import broker
+
+# Multi-worker server for the API, run through gunicorn. From webserver/:
+#
+#   python3 serve.py --workers 4                       gunicorn gthread workers
+#   python3 serve.py --workers 4 --worker-class asgi   uvicorn workers running asgi.app
+#
+# This is `gunicorn application:app` with the settings this app needs wired in, so the
+# command line stays the same whichever worker class is picked. gunicorn imports the app
+# once before forking (preload_app), binds the listening socket and forks the workers,
+# which inherit both; a worker that dies is replaced. Each worker opens its own database
+# connections and ingest writer after the fork. SQLite in WAL mode lets every worker read
+# concurrently; writes are serialized by the database.
+#
+# SIGTERM or SIGINT stops gracefully: workers stop accepting, finish in-flight requests
+# for up to --graceful-timeout seconds, commit their queued ingest rows and exit. Caches,
+# live stats and dashboard streams are per worker; each catches up with the other
+# workers' writes through storage.changes.
+
+WORKER_CLASSES = ('threaded', 'asgi')
+GRACEFUL_TIMEOUT = 30
+# Extra time gunicorn gives a stopping worker after --graceful-timeout, for
+# application.shutdown() to commit the ingest queue (it waits up to 10 s)
+SHUTDOWN_MARGIN = 15
+
+
+class ThreadedWorker(ThreadWorker):
+    # gthread worker: requests run on a pool of --threads threads
+    def init_process(self):
+        # The arbiter's graceful_timeout includes SHUTDOWN_MARGIN; requests get the rest
+        self.cfg.set('graceful_timeout', self.cfg.graceful_timeout - SHUTDOWN_MARGIN)
+        super().init_process()
+
+    def handle_exit(self, sig, frame):
+        # Open dashboard streams would otherwise hold their connections for the whole
+        # graceful timeout
+        broker.close()
+        super().handle_exit(sig, frame)
+
+
+def threaded_worker_exit(server, worker):
+    # Runs in the worker once it stops serving
+    import application
+    application.shutdown()
+
+
+def asgi_worker():
+    from uvicorn_worker import UvicornWorker
+
+    class AsgiWorker(UvicornWorker):
+        # uvicorn worker; the ASGI lifespan shutdown commits the ingest queue
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.config.timeout_graceful_shutdown = self.cfg.graceful_timeout - SHUTDOWN_MARGIN
+
+    return AsgiWorker
+
+
+class Server(BaseApplication):
+    def __init__(self, args):
+        self.args = args
+        super().__init__()
+
+    def load_config(self):
+        args = self.args
+        asgi = args.worker_class == 'asgi'
+        settings = {
+            'bind': f'[{args.host}]:{args.port}' if ':' in args.host else f'{args.host}:{args.port}',
+            'workers': args.workers,
+            'worker_class': asgi_worker() if asgi else ThreadedWorker,
+            'threads': args.threads,
+            'backlog': args.backlog,
+            'graceful_timeout': args.graceful_timeout + SHUTDOWN_MARGIN,
+            'preload_app': True,
+            'accesslog': '-' if args.access_log else None,
+        }
+        if not asgi:
+            settings['worker_exit'] = threaded_worker_exit
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Preload: import the app (and the ASGI bridge) before forking
+        import application
+        app = application.app
+        if self.args.worker_class == 'asgi':
+            import asgi
+            app = asgi.app
+        # Nothing database-related may cross the fork
+        storage.close()
+        return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the API with several worker processes.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--worker-class', choices=WORKER_CLASSES, default='threaded',
+                        help='gunicorn gthread workers, or uvicorn workers running asgi.app')
+    parser.add_argument('--threads', type=int, default=32,
+                        help='request threads per threaded worker (asgi workers use ASGI_THREADS)')
+    parser.add_argument('--db', help='database file (default DB_NAME)')
+    parser.add_argument('--access-log', action='store_true', help='log every request to stdout')
+    parser.add_argument('--backlog', type=int, default=2048, help='listen queue length')
+    parser.add_argument('--graceful-timeout', type=int, default=GRACEFUL_TIMEOUT,
+                        help='seconds a stopping worker waits for in-flight requests')
+    args = parser.parse_args(argv)
+
+    if args.worker_class == 'asgi':
+        try:
+            import uvicorn_worker  # noqa: F401
+        except ImportError:
+            parser.error('--worker-class asgi needs uvicorn-worker and uvicorn (see requirements.txt)')
+    if args.db:
+        storage.configure(db_name=args.db)
+    Server(args).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,52 @@
 import sqlite3
 import os
 import sys
+import csv
+import gzip
+import hashlib
 from datetime import datetime
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from io import StringIO
+import storage
+import rollups
+import migrations
+import partitions
+import export
+import payload_store
 
 def create_tables():
-    conn = sqlite3.connect('data.db')
-    cursor = conn.cursor()
-
-    # Create transmission table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transmissions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            type TEXT NOT NULL,
-            data TEXT NOT NULL,
-            sf INTEGER NOT NULL,
-            bw INTEGER NOT NULL,
-            cr INTEGER NOT NULL,
-            rssi INTEGER,
-            snr REAL,
-            delay INTEGER,
-            datarate REAL,
-            latency INTEGER,
-            source TEXT NOT NULL,
-            compression_ratio REAL
-        )
-    ''')
-
-    # Create reception table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS receptions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            data TEXT NOT NULL,
-            rssi INTEGER,
-            snr REAL
-        )
-    ''')
-
-    # Create index for faster queries
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_transmissions_timestamp ON transmissions(timestamp)
-    ''')
-    cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_receptions_timestamp ON receptions(timestamp)
-    ''')
-
-    conn.commit()
-    conn.close()
+    with storage.transaction() as conn:
+        applied = create_schema(conn)
+    for description in applied:
+        print(f"Applied migration: {description}")
+    if migrations.PAYLOAD_MIGRATION in applied:
+        payload_report(skip_empty=True)
     print("Database tables created successfully!")
 
+def create_schema(conn):
+    # Bring the schema up to date (see migrations.py), backfilling the rollup tables
+    # for databases created before they existed; returns the migrations applied
+    applied = migrations.migrate(conn)
+    if rollups.needs_backfill(conn):
+        rollups.rebuild_rollups(conn)
+    return applied
+
 def clear_database():
     # Check if database file exists
-    if os.path.exists('data.db'):
-        conn = sqlite3.connect('data.db')
-        cursor = conn.cursor()
+    if os.path.exists(storage.DB_NAME):
+        with storage.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Drop existing tables
+            cursor.execute('DROP TABLE IF EXISTS transmissions')
+            cursor.execute('DROP TABLE IF EXISTS receptions')
+            for table in rollups.GRANULARITIES:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            cursor.execute('DROP TABLE IF EXISTS payloads')
+            cursor.execute('PRAGMA user_version = 0')
         
-        # Drop existing tables
-        cursor.execute('DROP TABLE IF EXISTS transmissions')
-        cursor.execute('DROP TABLE IF EXISTS receptions')
-        
-        conn.commit()
-        conn.close()
         print("Existing tables dropped.")
     else:
         print("Database file does not exist. Creating new database.")
@@ -72,99 +54,154 @@ def clear_database():
     # Create tables with the latest schema
     create_tables()
 
-def export_to_csv(filename):
-    if not os.path.exists('data.db'):
-        print("Database file does not exist. Nothing to export.")
+def rebuild_rollups():
+    if not os.path.exists(storage.DB_NAME):
+        print("Database file does not exist. Nothing to roll up.")
         return
     
-    conn = sqlite3.connect('data.db')
-    cursor = conn.cursor()
+    with storage.transaction() as conn:
+        rollups.create_rollups(conn)
+        buckets = rollups.rebuild_rollups(conn)
+    print(f"Rollup tables rebuilt ({buckets} per-minute buckets).")
+
+def check_query_plans():
+    # EXPLAIN QUERY PLAN regression check for every API query; returns False on a full scan
+    import query_plans
+    with storage.transaction() as conn:
+        create_schema(conn)
+    failures = query_plans.check_plans()
+    for path, sql, detail in failures:
+        print(f"FULL SCAN in {path}: {detail}\n    {sql}")
+    if failures:
+        print(f"{len(failures)} query plan regressions found.")
+        return False
+    print("All API queries use an index.")
+    return True
+
+def archive_old_data(days):
+    if not os.path.exists(storage.DB_NAME):
+        print("Database file does not exist. Nothing to archive.")
+        return
     
-    # Get all data from transmissions table
-    cursor.execute('SELECT * FROM transmissions')
-    transmissions = cursor.fetchall()
+    archived = partitions.apply_retention(days)
+    for table, months in archived.items():
+        for month, rows in months:
+            print(f"Archived {rows} {table} rows from {month} to {partitions.archive_path(table, month)}")
+    if not any(archived.values()):
+        print(f"Nothing older than {days} days to archive.")
+
+def export_to_csv(filename, since=None, until=None, source=None):
+    if not os.path.exists(storage.DB_NAME):
+        print("Database file does not exist. Nothing to export.")
+        return
     
-    # Get column names
-    cursor.execute('PRAGMA table_info(transmissions)')
-    columns = [col[1] for col in cursor.fetchall()]
+    progress = export.Progress()
     
-    # Use pandas to properly handle CSV export with potential commas in data
+    # Stream rows straight from the cursors to the (optionally compressed) file in
+    # fixed-size chunks, so memory use does not grow with the table. Archived months in
+    # the requested range are read from their partition files.
     try:
-        import pandas as pd
-        # Convert to DataFrame
-        df = pd.DataFrame(transmissions, columns=columns)
-        # Export to CSV with proper escaping
-        df.to_csv(filename, index=False, quoting=1)  # QUOTE_ALL mode
-        print(f"Data exported to {filename} successfully!")
-        return columns, df
-    except ImportError:
-        # Fallback if pandas is not available
-        import csv
-        with open(filename, 'w', newline='') as f:
-            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
-            # Write header
-            writer.writerow(columns)
-            # Write data rows
-            for row in transmissions:
-                writer.writerow([str(item) for item in row])
-        print(f"Data exported to {filename} successfully!")
-        return columns, transmissions
+        with export.open_output(filename) as f:
+            for chunk, rows in export.iter_partitions_csv(since, until, source):
+                f.write(chunk)
+                progress.update(rows, len(chunk))
+    except RuntimeError as e:
+        print(str(e))
+        return
     
-    finally:
-        conn.close()
+    progress.report(final=True)
+    print(f"Data exported to {filename} successfully!")
+    return export.EXPORT_COLUMNS, progress.rows
+
+# Columns read for analysis and the compact dtypes they are loaded as
+ANALYSIS_COLUMNS = {
+    'rssi': 'float32',
+    'snr': 'float32',
+    'latency': 'float32',
+    'datarate': 'float32',
+    'compression_ratio': 'float32'
+}
+ANALYSIS_CHUNK_ROWS = 100000
+# Series longer than this are bucketed before plotting; markers are only drawn on short series
+MAX_PLOT_POINTS = 2000
+MARKER_PLOT_POINTS = 200
+
+def load_analysis_frame():
+    # Read only the columns the analysis needs, chunk by chunk, converting each chunk to
+    # typed columns before the next one is fetched. Archived months are included.
+    query = f"SELECT timestamp, source, {', '.join(ANALYSIS_COLUMNS)} FROM transmissions ORDER BY id"
+    chunks = []
+    for conn in partitions.iter_connections('transmissions'):
+        for chunk in pd.read_sql_query(query, conn, chunksize=ANALYSIS_CHUNK_ROWS):
+            chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], format='ISO8601', errors='coerce')
+            chunk['source'] = chunk['source'].astype('category')
+            chunks.append(chunk.astype(ANALYSIS_COLUMNS))
+    if not chunks:
+        return pd.DataFrame(columns=['timestamp', 'source'] + list(ANALYSIS_COLUMNS))
+    df = pd.concat(chunks, ignore_index=True)
+    df['source'] = df['source'].astype(str).astype('category')
+    return df.sort_values('timestamp', kind='stable', ignore_index=True)
+
+def downsample_for_plot(frame, column):
+    # Average consecutive points into at most MAX_PLOT_POINTS buckets
+    series = frame[['timestamp', column]]
+    if len(series) <= MAX_PLOT_POINTS:
+        return series
+    bucket = np.arange(len(series)) // -(-len(series) // MAX_PLOT_POINTS)
+    return series.groupby(bucket).agg({'timestamp': 'first', column: 'mean'})
+
+def plot_series(ax, frame, column, color, label):
+    if frame.empty:
+        return
+    points = downsample_for_plot(frame, column)
+    fmt = f'{color}o-' if len(points) <= MARKER_PLOT_POINTS else f'{color}-'
+    ax.plot(points["timestamp"], points[column], fmt, label=label)
 
 def analyse_data(output_file=None):
-    if not os.path.exists('data.db'):
+    if not os.path.exists(storage.DB_NAME):
         print("Database file does not exist. Nothing to analyze.")
         return
     
-    # Export data to a DataFrame directly
-    columns, df = export_to_csv('temp_analysis.csv')
-    
-    # If we got a DataFrame directly, use it; otherwise read from the CSV
-    if not isinstance(df, pd.DataFrame):
-        # Read the CSV file with pandas
-        df = pd.read_csv('temp_analysis.csv', parse_dates=["timestamp"])
-    else:
-        # Ensure timestamp is parsed as datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Clean up temporary file
-    if os.path.exists('temp_analysis.csv'):
-        os.remove('temp_analysis.csv')
+    df = load_analysis_frame()
     
     # Check if we have data from both sources
-    if 'source' not in df.columns or len(df['source'].unique()) < 2:
+    sources = df['source'].unique()
+    if len(sources) < 2:
         print("Warning: Need data from both standard and enhanced sources for comparison.")
-        if 'source' not in df.columns:
-            print("'source' column not found in data.")
-            return
-        elif len(df['source'].unique()) < 2:
-            print(f"Only found data from {df['source'].unique()[0]} source.")
-            return
+        if len(sources) == 0:
+            print("No transmissions found in data.")
+        else:
+            print(f"Only found data from {sources[0]} source.")
+        return
     
-    # Separate standard and enhanced
-    df['source'] = df['source'].astype(str)
-    df_standard = df[df['source'] == 'standard']
-    df_enhanced = df[df['source'] == 'enhanced']
+    # Summary statistics for every source in one grouped pass
+    summary = df.groupby('source', observed=True).agg(
+        count=('source', 'size'),
+        datarate=('datarate', 'mean'),
+        latency=('latency', 'mean'),
+        compression_ratio=('compression_ratio', 'mean')
+    )
+    counts = summary['count'].reindex(['standard', 'enhanced'], fill_value=0)
     
     # Print summary statistics
     print("\n===== ANALYSIS SUMMARY =====\n")
     print(f"Total transmissions: {len(df)}")
-    print(f"Standard transmissions: {len(df_standard)}")
-    print(f"Enhanced transmissions: {len(df_enhanced)}\n")
+    print(f"Standard transmissions: {counts['standard']}")
+    print(f"Enhanced transmissions: {counts['enhanced']}\n")
     
     # Calculate performance metrics
-    if not df_standard.empty and not df_enhanced.empty:
-        avg_standard_datarate = df_standard['datarate'].mean()
-        avg_enhanced_datarate = df_enhanced['datarate'].mean()
+    if counts['standard'] and counts['enhanced']:
+        standard = summary.loc['standard']
+        enhanced = summary.loc['enhanced']
+        avg_standard_datarate = standard['datarate']
+        avg_enhanced_datarate = enhanced['datarate']
         datarate_improvement = avg_enhanced_datarate / avg_standard_datarate if avg_standard_datarate > 0 else 0
         
-        avg_standard_latency = df_standard['latency'].mean()
-        avg_enhanced_latency = df_enhanced['latency'].mean()
+        avg_standard_latency = standard['latency']
+        avg_enhanced_latency = enhanced['latency']
         latency_improvement = avg_standard_latency / avg_enhanced_latency if avg_enhanced_latency > 0 else 0
         
-        avg_compression = df_enhanced['compression_ratio'].mean()
+        avg_compression = enhanced['compression_ratio']
         
         print("Performance Comparison:")
         print(f"Data Rate: Standard = {avg_standard_datarate:.2f} bps, Enhanced = {avg_enhanced_datarate:.2f} bps")
@@ -173,34 +210,32 @@ def analyse_data(output_file=None):
         print(f"Latency Improvement: {latency_improvement:.2f}x faster with Enhanced")
         print(f"Average Compression Ratio: {avg_compression:.2f}x\n")
     
+    # Separate standard and enhanced
+    df_standard = df[df['source'] == 'standard']
+    df_enhanced = df[df['source'] == 'enhanced']
+    
     # Set up the plots
     fig, axs = plt.subplots(3, 1, figsize=(12, 12), sharex=True)
     
     # RSSI
-    if not df_standard.empty:
-        axs[0].plot(df_standard["timestamp"], df_standard["rssi"], 'ro-', label="Standard")
-    if not df_enhanced.empty:
-        axs[0].plot(df_enhanced["timestamp"], df_enhanced["rssi"], 'go-', label="Enhanced")
+    plot_series(axs[0], df_standard, "rssi", 'r', "Standard")
+    plot_series(axs[0], df_enhanced, "rssi", 'g', "Enhanced")
     axs[0].set_ylabel("RSSI (dBm)")
     axs[0].set_title("RSSI over Time")
     axs[0].legend()
     axs[0].grid(True)
     
     # SNR
-    if not df_standard.empty:
-        axs[1].plot(df_standard["timestamp"], df_standard["snr"], 'ro-', label="Standard")
-    if not df_enhanced.empty:
-        axs[1].plot(df_enhanced["timestamp"], df_enhanced["snr"], 'go-', label="Enhanced")
+    plot_series(axs[1], df_standard, "snr", 'r', "Standard")
+    plot_series(axs[1], df_enhanced, "snr", 'g', "Enhanced")
     axs[1].set_ylabel("SNR (dB)")
     axs[1].set_title("SNR over Time")
     axs[1].legend()
     axs[1].grid(True)
     
     # Latency
-    if not df_standard.empty:
-        axs[2].plot(df_standard["timestamp"], df_standard["latency"], 'ro-', label="Standard")
-    if not df_enhanced.empty:
-        axs[2].plot(df_enhanced["timestamp"], df_enhanced["latency"], 'go-', label="Enhanced")
+    plot_series(axs[2], df_standard, "latency", 'r', "Standard")
+    plot_series(axs[2], df_enhanced, "latency", 'g', "Enhanced")
     axs[2].set_ylabel("Latency (ms)")
     axs[2].set_title("Latency over Time")
     axs[2].legend()
@@ -221,10 +256,8 @@ def analyse_data(output_file=None):
     fig2, axs2 = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
     
     # Data Rate
-    if not df_standard.empty:
-        axs2[0].plot(df_standard["timestamp"], df_standard["datarate"], 'ro-', label="Standard")
-    if not df_enhanced.empty:
-        axs2[0].plot(df_enhanced["timestamp"], df_enhanced["datarate"], 'go-', label="Enhanced")
+    plot_series(axs2[0], df_standard, "datarate", 'r', "Standard")
+    plot_series(axs2[0], df_enhanced, "datarate", 'g', "Enhanced")
     axs2[0].set_ylabel("Data Rate (bps)")
     axs2[0].set_title("Data Rate over Time")
     axs2[0].legend()
@@ -232,9 +265,9 @@ def analyse_data(output_file=None):
     
     # Compression Ratio (only for enhanced)
     if not df_enhanced.empty:
-        axs2[1].plot(df_enhanced["timestamp"], df_enhanced["compression_ratio"], 'bo-', label="Compression Ratio")
+        plot_series(axs2[1], df_enhanced, "compression_ratio", 'b', "Compression Ratio")
         axs2[1].set_ylabel("Compression Ratio")
-        axs[1].set_title("Compression Ratio over Time (Enhanced Only)")
+        axs2[1].set_title("Compression Ratio over Time (Enhanced Only)")
         axs2[1].legend()
         axs2[1].grid(True)
     
@@ -251,103 +284,225 @@ def analyse_data(output_file=None):
     else:
         plt.show()
 
-def import_from_csv(filename):
+# Transmission columns loaded from CSV; required ones fall back to these defaults
+IMPORT_COLUMNS = ['timestamp', 'type', 'data', 'sf', 'bw', 'cr', 'rssi', 'snr',
+                  'delay', 'datarate', 'latency', 'source', 'compression_ratio']
+IMPORT_DEFAULTS = {
+    'type': 'unknown',
+    'data': '',
+    'sf': 7,
+    'bw': 125,
+    'cr': 4,
+    'source': 'standard'
+}
+IMPORT_CHUNK_ROWS = 50000
+# Cell values treated as missing (older exports wrote Python/pandas nulls as text)
+MISSING_VALUES = {'', 'None', 'nan', 'NaN', 'NULL'}
+
+def suspend_indexes(conn):
+    # Drop the indexes and triggers on transmissions for the duration of a bulk load;
+    # restore_indexes() rebuilds them once at the end instead of row by row
+    saved = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'transmissions' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''').fetchall()
+    for kind, name, _ in saved:
+        conn.execute(f'DROP {kind.upper()} {name}')
+    return saved
+
+def restore_indexes(conn, saved):
+    for _, _, sql in saved:
+        conn.execute(sql)
+    rollups.rebuild_rollups(conn)
+
+def row_hash(timestamp, source, payload_hash):
+    # payload_hash: the payload's content hash, so stored rows are keyed without decoding
+    key = f'{timestamp}\x1f{source}\x1f'.encode() + bytes(payload_hash)
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+class RowHashes:
+    # The set of row_hash() keys seen by an import with --dedupe, kept as sorted int64
+    # arrays: 8 bytes per row, where a Python set of ints costs about 70. New keys go into
+    # a smaller sorted run that is merged into the main one once it outgrows an eighth of
+    # it, so each chunk costs a merge of the small run rather than of everything seen.
+    MIN_RUN = 1 << 18
+
+    def __init__(self):
+        self._main = np.empty(0, dtype=np.int64)
+        self._recent = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._main) + len(self._recent)
+
+    def _contains(self, keys):
+        found = np.zeros(len(keys), dtype=bool)
+        for run in (self._main, self._recent):
+            if len(run):
+                positions = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+                found |= run[positions] == keys
+        return found
+
+    def add_new(self, keys):
+        # Adds keys and returns a mask of the ones not seen before (only the first of
+        # repeats within keys counts as new)
+        keys = np.asarray(keys, dtype=np.int64)
+        new = np.zeros(len(keys), dtype=bool)
+        new[np.unique(keys, return_index=True)[1]] = True
+        new &= ~self._contains(keys)
+        self._recent = np.union1d(self._recent, keys[new])
+        if len(self._recent) > max(len(self._main) // 8, self.MIN_RUN):
+            self._main = np.union1d(self._main, self._recent)
+            self._recent = np.empty(0, dtype=np.int64)
+        return new
+
+def read_import_chunks(reader, header):
+    # Map CSV columns onto IMPORT_COLUMNS by name and yield lists of insert tuples
+    positions = [(header.index(col) if col in header else None, IMPORT_DEFAULTS.get(col))
+                 for col in IMPORT_COLUMNS]
+    chunk = []
+    for record in reader:
+        values = []
+        for position, default in positions:
+            value = record[position] if position is not None and position < len(record) else ''
+            values.append(default if value in MISSING_VALUES else value)
+        chunk.append(tuple(values))
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_from_csv(filename, mode=None, dedupe=False):
     if not os.path.exists(filename):
         print(f"CSV file '{filename}' does not exist.")
         return
     
-    # Ask user for action
-    action = ''
-    while action.lower() not in ['o', 'a']:
-        action = input("Do you want to (O)verwrite or (A)ppend to the transmissions table? [O/A]: ").strip().lower()
-    
-    conn = sqlite3.connect('data.db')
-    cursor = conn.cursor()
-    
-    if action == 'o':
-        # Drop and recreate the transmissions table only
-        cursor.execute('DROP TABLE IF EXISTS transmissions')
-        conn.commit()
-        # Recreate only the transmissions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transmissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                type TEXT NOT NULL,
-                data TEXT NOT NULL,
-                sf INTEGER NOT NULL,
-                bw INTEGER NOT NULL,
-                cr INTEGER NOT NULL,
-                rssi INTEGER,
-                snr REAL,
-                delay INTEGER,
-                datarate REAL,
-                latency INTEGER,
-                source TEXT NOT NULL,
-                compression_ratio REAL
-            )
-        ''')
-        conn.commit()
-        print("Transmissions table overwritten.")
-    else:
-        print("Appending to existing transmissions table.")
-    
-    # Read CSV
-    df = pd.read_csv(filename)
-    
-    # Remove id column if present (let SQLite autoincrement)
-    if 'id' in df.columns:
-        df = df.drop(columns=['id'])
-    
-    # Define required columns and their default values
-    required_columns = {
-        'type': 'unknown',
-        'data': '',
-        'sf': 7,
-        'bw': 125,
-        'cr': 4,
-        'source': 'standard'
-    }
+    # Ask user for action unless --mode was given
+    if mode is None:
+        action = ''
+        while action.lower() not in ['o', 'a']:
+            action = input("Do you want to (O)verwrite or (A)ppend to the transmissions table? [O/A]: ").strip().lower()
+        mode = 'overwrite' if action == 'o' else 'append'
     
-    # Fill missing required columns with default values
-    for col, default_value in required_columns.items():
-        if col not in df.columns:
-            df[col] = default_value
-        else:
-            # Fill NULL values with default values
-            df[col] = df[col].fillna(default_value)
-    
-    # Convert timestamp to string if needed
-    if 'timestamp' in df.columns:
-        df['timestamp'] = df['timestamp'].astype(str)
-    
-    # Fill missing optional columns with None
-    optional_columns = ['rssi', 'snr', 'delay', 'datarate', 'latency', 'compression_ratio']
-    for col in optional_columns:
-        if col not in df.columns:
-            df[col] = None
+    opener = gzip.open if filename.endswith('.gz') else open
+    progress = export.Progress()
+    inserted = 0
+    skipped = 0
     
-    # Reorder columns to match database schema
-    expected_cols = ['timestamp', 'type', 'data', 'sf', 'bw', 'cr', 'rssi', 'snr', 
-                    'delay', 'datarate', 'latency', 'source', 'compression_ratio']
-    df = df[expected_cols]
-    
-    # Insert into DB
     try:
-        df.to_sql('transmissions', conn, if_exists='append', index=False)
-        print(f"Imported {len(df)} rows from {filename} into transmissions table.")
+        with opener(filename, 'rt', newline='', encoding='utf-8') as f, storage.transaction() as conn:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            cursor = conn.cursor()
+            # Explicit BEGIN so the schema changes below are part of the same transaction
+            cursor.execute('BEGIN IMMEDIATE')
+        
+            if mode == 'overwrite':
+                # Drop and recreate the transmissions table only. New ids continue after the
+                # old ones: ETags, live stats and the optimizer track the highest id seen.
+                sequence = migrations.last_sequence(conn, 'transmissions')
+                cursor.execute('DROP TABLE IF EXISTS transmissions')
+                # Replay the migrations so the table comes back with all its indexes
+                cursor.execute('PRAGMA user_version = 0')
+                create_schema(conn)
+                migrations.restore_sequence(conn, 'transmissions', sequence)
+                print("Transmissions table overwritten.")
+            else:
+                print("Appending to existing transmissions table.")
+        
+            saved = suspend_indexes(conn)
+        
+            seen = RowHashes()
+            if dedupe and mode == 'append':
+                existing = conn.execute('''
+                    SELECT t.timestamp, t.source, p.hash FROM transmissions t JOIN payloads p ON p.id = t.payload_id
+                ''')
+                while True:
+                    rows = existing.fetchmany(IMPORT_CHUNK_ROWS)
+                    if not rows:
+                        break
+                    seen.add_new(np.fromiter((row_hash(*row) for row in rows), np.int64, len(rows)))
+        
+            columns = ['payload_id' if c == 'data' else c for c in IMPORT_COLUMNS]
+            insert = f'''
+                INSERT INTO transmissions ({', '.join(columns)})
+                VALUES (COALESCE(?, CURRENT_TIMESTAMP), {', '.join('?' * (len(IMPORT_COLUMNS) - 1))})
+            '''
+            ts_index, source_index, data_index = (IMPORT_COLUMNS.index(c) for c in ('timestamp', 'source', 'data'))
+            for chunk in read_import_chunks(reader, header):
+                total = len(chunk)
+                if dedupe:
+                    keys = np.fromiter((row_hash(values[ts_index], values[source_index],
+                                                 payload_store.content_hash(values[data_index]))
+                                        for values in chunk), np.int64, total)
+                    chunk = [values for values, new in zip(chunk, seen.add_new(keys)) if new]
+                cursor.executemany(insert, payload_store.replace_texts(conn, chunk, data_index))
+                inserted += len(chunk)
+                skipped += total - len(chunk)
+                progress.update(total, 0)
+        
+            restore_indexes(conn, saved)
+    
     except sqlite3.IntegrityError as e:
-        print(f"Error importing data: {str(e)}")
+        # The transaction was rolled back, so the table is left as it was
+        print(f"\nError importing data: {str(e)}")
         print("Please check that all required columns have valid values.")
-    finally:
-        conn.close()
+        return
+    
+    progress.report(final=True)
+    message = f"Imported {inserted} rows from {filename} into transmissions table."
+    if dedupe:
+        message += f" Skipped {skipped} duplicate rows."
+    print(message)
+    if mode == 'overwrite':
+        # Payloads only the replaced rows used are no longer referenced
+        with storage.connection() as conn:
+            removed = payload_store.sweep(conn)
+        if removed:
+            print(f"Removed {removed} payloads no longer referenced.")
+
+def payload_report(skip_empty=False):
+    if not os.path.exists(storage.DB_NAME):
+        print("Database file does not exist. Nothing to report.")
+        return
+    with storage.transaction() as conn:
+        create_schema(conn)
+    with storage.connection() as conn:
+        report = payload_store.report(conn)
+    if skip_empty and not report['distinct_payloads']:
+        return
+    for table, figures in report['tables'].items():
+        print(f"{table}: {figures['rows']} rows, {format_bytes(figures['payload_bytes'])} of payload text")
+    print(f"Distinct payloads: {report['distinct_payloads']} ({format_bytes(report['distinct_bytes'])})")
+    for codec, figures in sorted(report['codecs'].items()):
+        print(f"  {codec}: {figures['payloads']} payloads, {format_bytes(figures['bytes'])} stored as "
+              f"{format_bytes(figures['stored_bytes'])}")
+    if report['dedup_ratio']:
+        print(f"Deduplication {report['dedup_ratio']:.1f}x, compression {report['compression_ratio']:.2f}x: "
+              f"{format_bytes(report['stored_bytes'])} stored instead of {format_bytes(report['inline_bytes'])} "
+              f"inline ({format_bytes(report['saved_bytes'])} saved)")
+
+def format_bytes(count):
+    for unit in ('bytes', 'KB', 'MB'):
+        if abs(count) < 1024 or unit == 'MB':
+            return f"{count:.0f} {unit}" if unit == 'bytes' else f"{count:.1f} {unit}"
+        count /= 1024
+
+def get_option(name, default=None):
+    # Value following a named flag anywhere on the command line, e.g. --since 2024-01-01
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
 
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         if sys.argv[1] == '--clear':
             clear_database()
         elif sys.argv[1] == '--extract' and len(sys.argv) > 2:
-            export_to_csv(sys.argv[2])
+            export_to_csv(sys.argv[2], get_option('--since'), get_option('--until'), get_option('--source'))
         elif sys.argv[1] == '--analyse' or sys.argv[1] == '--analyze':
             # Check if output file is provided
             output_file = None
@@ -355,8 +510,21 @@ if __name__ == '__main__':
                 output_file = sys.argv[2]
             analyse_data(output_file)
         elif sys.argv[1] == '--import' and len(sys.argv) > 2:
-            import_from_csv(sys.argv[2])
+            mode = get_option('--mode')
+            if mode not in (None, 'overwrite', 'append'):
+                print("--mode must be 'overwrite' or 'append'")
+            else:
+                import_from_csv(sys.argv[2], mode, '--dedupe' in sys.argv)
+        elif sys.argv[1] == '--rollup':
+            rebuild_rollups()
+        elif sys.argv[1] == '--archive':
+            days = get_option('--older-than')
+            archive_old_data(int(days) if days else partitions.RETENTION_DAYS)
+        elif sys.argv[1] == '--check-plans':
+            sys.exit(0 if check_query_plans() else 1)
+        elif sys.argv[1] == '--payloads':
+            payload_report()
         else:
-            print("Usage: python setup_db.py [--clear | --extract filename.csv | --analyse [output_file.png] | --import transmissions.csv]")
+            print("Usage: python setup_db.py [--clear | --extract filename.csv[.gz|.zst] [--since T] [--until T] [--source S] | --analyse [output_file.png] | --import transmissions.csv [--mode overwrite|append] [--dedupe] | --rollup | --archive [--older-than DAYS] | --check-plans | --payloads]")
     else:
         create_tables()
\ No newline at end of file
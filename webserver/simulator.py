@@ -0,0 +1,502 @@
+import argparse
+import csv
+import functools
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import lora
+import payloads
+import storage
+import wire
+from benchmark import HTTPDriver, TestClientDriver, git_commit, peak_rss_mb, percentile
+from payloads.corpus import DATA_TYPES, corpus
+
+# Offline LoRa link simulator: thousands of virtual standard and enhanced senders, one
+# receiver, and the resulting rows streamed into the API (or written as an import CSV).
+#
+# Each tick, every sender that is due sends one packet and waits for its ACK, as in
+# handleSend(). The link model is vectorized over all packets of the tick:
+#   - log-distance path loss with per-sender shadowing and per-packet fading gives RSSI
+#     and SNR against the thermal noise floor of the bandwidth;
+#   - a packet is demodulated with a probability that rises steeply once its SNR clears
+#     the spreading factor's limit (lora.DEMODULATION_SNR);
+#   - packets overlapping on the same SF and bandwidth collide unless one is
+#     CAPTURE_DB stronger;
+#   - the ACK travels back over the same link with fresh fading.
+# The receiver side ports extractLoRaParameters() and optimizeParameters() from
+# receiver.ino. The enhanced receiver answers at the SF/BW/CR named in the packet's META
+# tag and suggests new parameters, which the sender adopts; without an ACK the sender
+# reverts to SF7/BW500/CR5. Senders transmit at their current parameters: the firmware's
+# fixed SF7/BW500 first packet never reaches a receiver listening at BW125, so modelling
+# it literally would lose every enhanced packet.
+
+FREQUENCY_HZ = 868e6
+TX_POWER_DBM = 20
+NOISE_FIGURE_DB = 6
+REFERENCE_LOSS_DB = 31.2  # free-space loss at 1 m, 868 MHz
+PATH_LOSS_EXPONENT = 2.7
+SHADOWING_DB = 6.0        # per sender, fixed
+FADING_DB = 3.0           # per packet and direction
+WATERFALL_DB = 0.7        # width of the packet error rate curve around the SNR limit
+CODING_GAIN_DB = 0.5      # per coding rate step above 4/5
+CAPTURE_DB = 6.0
+MIN_DISTANCE_M = 50
+
+STANDARD_PARAMETERS = (7, 125000, 5)
+ENHANCED_DEFAULTS = (7, 500000, 5)
+RECEIVER_DEFAULTS = (7, 125000, 5)
+
+# Sender timing from handleSend(): delay(50) after the packet, 10 ms ACK polling
+POST_TX_DELAY_S = 0.05
+POLL_INTERVAL_S = 0.01
+RECEIVER_PROCESSING_S = 0.02
+
+# ACK messages carry fixed-width metrics plus the echoed data
+ACK_OVERHEAD = {
+    'standard': len('STANDARD_ACK:{"rssi":-100.00,"snr":-10.00,"timestamp":1234567,"data":""}'),
+    'enhanced': len('ENHANCED_ACK:{"rssi":-100.00,"snr":-10.00,"opt_sf":7,"opt_bw":125000,'
+                    '"opt_cr":5,"timestamp":1234567,"data":""}')
+}
+
+INGEST_MODES = ['single', 'batch', 'binary']
+BATCH_ROWS = 100
+POOL_SIZE = 256
+CSV_COLUMNS = ['timestamp', 'type', 'data', 'sf', 'bw', 'cr', 'rssi', 'snr',
+               'delay', 'datarate', 'latency', 'source', 'compression_ratio']
+
+SF_VALUES = np.array(lora.SPREADING_FACTORS)
+BW_VALUES = np.array(lora.BANDWIDTHS)
+CR_VALUES = np.array(lora.CODING_RATES)
+
+
+def meta_tag(sf, bw, cr):
+    return f'<META:SF{sf},BW{bw // 1000},CR{cr}>'
+
+
+def _substring(text, left, right=None):
+    # Arduino String::substring(): unsigned bounds (so -1 means the end), swapped when
+    # reversed, clamped to the length
+    if right is None or right < 0:
+        right = len(text)
+    if left > right:
+        left, right = right, left
+    return text[left:right]
+
+
+def _to_int(text):
+    # Arduino String::toInt(): the leading integer, 0 when there is none
+    match = re.match(r'\s*([+-]?\d+)', text)
+    return int(match.group(1)) if match else 0
+
+
+def extract_lora_parameters(data, sf, bw, cr):
+    # Port of extractLoRaParameters() in receiver.ino. Returns (found, data without the
+    # META tag, sf, bw, cr); the parameters are left as given when there is no tag.
+    meta_start = data.find('<META:')
+    if meta_start < 0:
+        return False, data, sf, bw, cr
+    meta_end = data.find('>', meta_start)
+    if meta_end <= meta_start:
+        return False, data, sf, bw, cr
+    meta = data[meta_start + 6:meta_end]
+    sf_pos, bw_pos, cr_pos = meta.find('SF'), meta.find('BW'), meta.find('CR')
+    if sf_pos >= 0:
+        sf = _to_int(_substring(meta, sf_pos + 2, meta.find(',', sf_pos) if bw_pos > 0 else len(meta)))
+    if bw_pos >= 0:
+        bw = _to_int(_substring(meta, bw_pos + 2, meta.find(',', bw_pos) if cr_pos > 0 else len(meta))) * 1000
+    if cr_pos >= 0:
+        cr = _to_int(_substring(meta, cr_pos + 2))
+    return True, data[:meta_start] + data[meta_end + 1:], sf, bw, cr
+
+
+@functools.lru_cache(maxsize=None)
+def ack_parameters(sf, bw, cr):
+    # Parameters the receiver answers an enhanced packet with: the META tag's when they
+    # pass its validation, otherwise the ones it was listening with
+    found, _, packet_sf, packet_bw, packet_cr = extract_lora_parameters(meta_tag(sf, bw, cr), *RECEIVER_DEFAULTS)
+    if found and 7 <= packet_sf <= 12 and packet_bw in lora.BANDWIDTHS and 5 <= packet_cr <= 8:
+        return packet_sf, packet_bw, packet_cr
+    return RECEIVER_DEFAULTS
+
+
+def receiver_optimize(rssi, snr, payload_size):
+    # Vectorized port of optimizeParameters() in receiver.ino, one row per packet, formulas
+    # as written there (its airtime term is in microseconds, so it dominates the score).
+    # The grid is laid out in the firmware's loop order (sf, cr, bw) so that argmax keeps
+    # its first-best tie-break.
+    sf = SF_VALUES.reshape(1, -1, 1, 1)
+    cr = CR_VALUES.reshape(1, 1, -1, 1)
+    bw = BW_VALUES.reshape(1, 1, 1, -1)
+    rssi = np.asarray(rssi, dtype=float).reshape(-1, 1, 1, 1)
+    snr = np.asarray(snr, dtype=float).reshape(-1, 1, 1, 1)
+    size = np.asarray(payload_size, dtype=float).reshape(-1, 1, 1, 1)
+
+    threshold = -7.5 - (sf - 7) * 2.5
+    link_margin = rssi - (-123.0 - (sf - 7) * 2.5 + 10 * np.log10(bw / 125000.0))
+    reliability = np.clip((snr - threshold) / 10.0 + (cr - 4.0) / 4.0, 0.0, 1.0)
+    datarate = sf * (bw / 2.0 ** sf) * (4.0 / cr)
+    t_sym = (2.0 ** sf / (bw / 1000.0)) * 1000
+    n_payload = 8 + np.maximum(np.ceil((8.0 * size - 4.0 * sf + 28) / (4.0 * (sf - 2))) * (cr + 4), 0.0)
+    time_on_air = (8 + 4.25) * t_sym + n_payload * t_sym
+    weight = np.where((rssi < -100) | (snr < 5), 0.8, 0.5)
+    score = reliability * weight + datarate / 10000.0 * (1 - weight) - time_on_air / 10000.0
+    score = np.where((snr >= threshold) & (link_margin >= 0) & (reliability >= 0.7), score, -np.inf)
+
+    flat = score.reshape(len(score), -1)
+    best = np.unravel_index(flat.argmax(axis=1), score.shape[1:])
+    found = np.isfinite(flat.max(axis=1))
+    return (
+        np.where(found, SF_VALUES[best[0]], RECEIVER_DEFAULTS[0]),
+        np.where(found, BW_VALUES[best[2]], RECEIVER_DEFAULTS[1]),
+        np.where(found, CR_VALUES[best[1]], RECEIVER_DEFAULTS[2])
+    )
+
+
+def noise_floor(bw):
+    return -174 + 10 * np.log10(bw) + NOISE_FIGURE_DB
+
+
+def demodulated(rng, snr, sf, cr):
+    # Bernoulli draw on a logistic packet error curve centred on the SNR limit
+    limit = np.array([lora.DEMODULATION_SNR[s] for s in lora.SPREADING_FACTORS])[sf - 7]
+    margin = snr - limit + CODING_GAIN_DB * (cr - 5)
+    return rng.random(len(snr)) < 1 / (1 + np.exp(-margin / WATERFALL_DB))
+
+
+def collided(start, end, sf, bw, power):
+    # Packets overlapping another on the same SF and bandwidth, unless CAPTURE_DB stronger
+    # than the overlapping neighbour. Channels are separated by offsetting their times.
+    n = len(start)
+    lost = np.zeros(n, dtype=bool)
+    if n < 2:
+        return lost
+    offset = (sf * 10 + np.searchsorted(BW_VALUES, bw)) * 1e7
+    order = np.lexsort((start, offset))
+    s, e, p = (start + offset)[order], (end + offset)[order], power[order]
+    earlier_end = np.concatenate(([-np.inf], np.maximum.accumulate(e)[:-1]))
+    later_start = np.concatenate((s[1:], [np.inf]))
+    overlaps_earlier = s < earlier_end
+    overlaps_later = e > later_start
+    neighbour = np.concatenate(([-np.inf], p[:-1]))
+    captured_earlier = p >= neighbour + CAPTURE_DB
+    neighbour = np.concatenate((p[1:], [-np.inf]))
+    captured_later = p >= neighbour + CAPTURE_DB
+    lost[order] = (overlaps_earlier & ~captured_earlier) | (overlaps_later & ~captured_later)
+    return lost
+
+
+class PayloadPool:
+    # Payloads per data type built like handleSend(), with their sender-e compression,
+    # prepared once and sampled by index
+    def __init__(self, size, seed):
+        samples = corpus(size, seed)
+        self.original = [samples[t] for t in DATA_TYPES]
+        self.compressed = [[payloads.compress(t, p) for p in samples[t]] for t in DATA_TYPES]
+        self.original_length = np.array([[len(p) for p in items] for items in self.original])
+        self.compressed_length = np.array([[len(p) for p in items] for items in self.compressed])
+
+
+class Simulator:
+    def __init__(self, senders, enhanced_share, interval, max_distance, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.pool = PayloadPool(POOL_SIZE, seed)
+        self.interval = interval
+        n = senders
+        self.enhanced = self.rng.random(n) < enhanced_share
+        self.distance = np.exp(self.rng.uniform(np.log(MIN_DISTANCE_M), np.log(max(max_distance, MIN_DISTANCE_M + 1)), n))
+        self.shadowing = self.rng.normal(0, SHADOWING_DB, n)
+        self.sf = np.where(self.enhanced, ENHANCED_DEFAULTS[0], STANDARD_PARAMETERS[0])
+        self.bw = np.where(self.enhanced, ENHANCED_DEFAULTS[1], STANDARD_PARAMETERS[1])
+        self.cr = np.where(self.enhanced, ENHANCED_DEFAULTS[2], STANDARD_PARAMETERS[2])
+        self.next_send = self.rng.uniform(0, interval, n)
+        self.totals = {'packets': 0, 'acked': 0, 'uplink_lost': 0, 'collisions': 0, 'ack_lost': 0, 'airtime_s': 0.0}
+        self.per_sf = {sf: [0, 0] for sf in lora.SPREADING_FACTORS}
+
+    def path_loss(self, senders):
+        return REFERENCE_LOSS_DB + 10 * PATH_LOSS_EXPONENT * np.log10(self.distance[senders]) + self.shadowing[senders]
+
+    def link(self, senders, bw):
+        # Received power, reported RSSI and SNR (quarter-dB steps, as the SX127x reports it)
+        power = TX_POWER_DBM - self.path_loss(senders) + self.rng.normal(0, FADING_DB, len(senders))
+        noise = noise_floor(bw)
+        snr = np.round((power - noise) * 4) / 4
+        rssi = np.round(10 * np.log10(10 ** (power / 10) + 10 ** (noise / 10)))
+        return power, rssi, snr
+
+    def step(self, now, dt):
+        # Advance the simulation by dt seconds; returns the rows the senders would post,
+        # as (send time, API row dict)
+        senders = np.flatnonzero(self.next_send < now + dt)
+        n = len(senders)
+        if not n:
+            return []
+        rng = self.rng
+        start = np.maximum(self.next_send[senders], now)
+        enhanced = self.enhanced[senders]
+        sf, bw, cr = self.sf[senders], self.bw[senders], self.cr[senders]
+
+        type_index = rng.integers(0, len(DATA_TYPES), n)
+        pool_index = rng.integers(0, POOL_SIZE, n)
+        original_length = self.pool.original_length[type_index, pool_index]
+        compressed_length = self.pool.compressed_length[type_index, pool_index]
+        data_length = np.where(enhanced, compressed_length, original_length)
+        meta_length = np.array([len(meta_tag(*p)) for p in zip(sf, bw, cr)])
+        packet_bytes = np.where(enhanced, len('ENHANCED:') + compressed_length + meta_length,
+                                len('STANDARD:') + original_length)
+
+        # Uplink
+        airtime = lora.time_on_air(packet_bytes, sf, bw, cr)
+        power, rssi, snr = self.link(senders, bw)
+        lost_to_collision = collided(start, start + airtime, sf, bw, power)
+        received = demodulated(rng, snr, sf, cr) & ~lost_to_collision
+
+        # Handshake: the receiver answers at the parameters it extracted from the META tag
+        # (standard packets: the ones it listens with); the sender only hears the ACK if
+        # those match its own
+        ack = np.array([ack_parameters(*p) if e else RECEIVER_DEFAULTS for p, e in zip(zip(sf, bw, cr), enhanced)])
+        ack_matches = (ack[:, 0] == sf) & (ack[:, 1] == bw) & (ack[:, 2] == cr)
+        opt_sf, opt_bw, opt_cr = receiver_optimize(rssi, snr, data_length)
+        ack_bytes = np.where(enhanced, ACK_OVERHEAD['enhanced'], ACK_OVERHEAD['standard']) + data_length
+        ack_airtime = lora.time_on_air(ack_bytes, sf, bw, cr)
+        _, _, ack_snr = self.link(senders, bw)
+        acked = received & ack_matches & demodulated(rng, ack_snr, sf, cr)
+
+        timeout = np.where(enhanced, np.minimum(2.0 + (sf - 7) * 0.5, 5.0), 2.0)
+        delay = np.where(
+            acked,
+            airtime + POST_TX_DELAY_S + RECEIVER_PROCESSING_S + ack_airtime + rng.uniform(0, POLL_INTERVAL_S, n),
+            timeout
+        )
+        delay_ms = np.round(delay * 1000).astype(int)
+        datarate = np.where(acked, original_length * 8 / (delay_ms / 1000.0), 0.0)
+
+        # Enhanced senders adopt the receiver's suggestion on an ACK and revert otherwise
+        adopt = enhanced & acked
+        revert = enhanced & ~acked
+        self.sf[senders] = np.where(adopt, opt_sf, np.where(revert, ENHANCED_DEFAULTS[0], sf))
+        self.bw[senders] = np.where(adopt, opt_bw, np.where(revert, ENHANCED_DEFAULTS[1], bw))
+        self.cr[senders] = np.where(adopt, opt_cr, np.where(revert, ENHANCED_DEFAULTS[2], cr))
+        self.next_send[senders] = start + delay + rng.exponential(self.interval, n)
+
+        self.totals['packets'] += n
+        self.totals['acked'] += int(acked.sum())
+        self.totals['uplink_lost'] += int((~received).sum())
+        self.totals['collisions'] += int(lost_to_collision.sum())
+        self.totals['ack_lost'] += int((received & ~acked).sum())
+        self.totals['airtime_s'] += float(airtime.sum() + ack_airtime[received & ack_matches].sum())
+        for value in lora.SPREADING_FACTORS:
+            mask = sf == value
+            self.per_sf[value][0] += int(mask.sum())
+            self.per_sf[value][1] += int((mask & acked).sum())
+
+        rows = []
+        for i in range(n):
+            t, p = type_index[i], pool_index[i]
+            is_enhanced = bool(enhanced[i])
+            ok = bool(acked[i])
+            rows.append((float(start[i]), {
+                'type': DATA_TYPES[t],
+                'data': self.pool.compressed[t][p] if is_enhanced else self.pool.original[t][p],
+                'sf': int(sf[i]), 'bw': int(bw[i]), 'cr': int(cr[i]),
+                'rssi': float(rssi[i]) if ok else -120.0,
+                'snr': float(snr[i]) if ok else 0.0,
+                'delay': int(delay_ms[i]),
+                'datarate': round(float(datarate[i]), 2),
+                'latency': float(delay_ms[i]),
+                'source': 'enhanced' if is_enhanced else 'standard',
+                'compressionRatio': round(float(original_length[i] / compressed_length[i]), 2) if is_enhanced else 1.0
+            }))
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def summary(self):
+        totals = dict(self.totals)
+        packets = totals['packets']
+        totals['delivery_ratio'] = totals['acked'] / packets if packets else None
+        totals['delivery_by_sf'] = {
+            f'SF{sf}': (acked / sent if sent else None) for sf, (sent, acked) in self.per_sf.items()
+        }
+        totals['enhanced_parameters'] = {
+            f'SF{sf}/BW{bw // 1000}/CR{cr}': int(count) for (sf, bw, cr), count in zip(*np.unique(
+                np.stack([self.sf, self.bw, self.cr], axis=1)[self.enhanced], axis=0, return_counts=True
+            ))
+        } if self.enhanced.any() else {}
+        return totals
+
+
+class Uploader:
+    # Posts row chunks from a bounded queue with a pool of client threads. A full queue
+    # blocks the simulator, so a server that can't keep up lowers the achieved rate.
+    def __init__(self, driver, mode, clients):
+        self.mode = mode
+        self.queue = queue.Queue(maxsize=clients * 4)
+        self.latencies = []
+        self.statuses = {}
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._client, args=(driver,), daemon=True) for _ in range(clients)]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, rows):
+        if self.mode == 'single':
+            return 'POST', '/api/transmission', json.dumps(rows[0]), 'application/json'
+        if self.mode == 'binary':
+            return 'POST', '/api/transmissions/batch', wire.encode('transmissions', rows), wire.MIMETYPE
+        return 'POST', '/api/transmissions/batch', json.dumps(rows), 'application/json'
+
+    def submit(self, rows):
+        size = 1 if self.mode == 'single' else BATCH_ROWS
+        for offset in range(0, len(rows), size):
+            self.queue.put(rows[offset:offset + size])
+
+    def _client(self, driver):
+        request = driver.session()
+        while True:
+            rows = self.queue.get()
+            if rows is None:
+                return
+            method, path, body, content_type = self.request(rows)
+            started = time.perf_counter()
+            try:
+                status = request(method, path, body, content_type)
+            except Exception:
+                status = None
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.latencies.append(elapsed)
+                self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+                if status is not None and status < 300:
+                    self.rows += len(rows)
+
+    def close(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'rows_accepted': self.rows,
+            'statuses': self.statuses,
+            'latency_ms': {
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None
+            }
+        }
+
+
+def run(simulator, duration, tick, speed, sink):
+    # Steps simulated time in ticks. With speed > 0 each tick is released when the wall
+    # clock reaches it (speed simulated seconds per second); speed 0 runs flat out.
+    started = time.perf_counter()
+    rows = 0
+    now = 0.0
+    while now < duration:
+        dt = min(tick, duration - now)
+        produced = simulator.step(now, dt)
+        now += dt
+        if speed > 0:
+            wait = now / speed - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+        if produced:
+            sink(produced)
+            rows += len(produced)
+    return rows, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate LoRa senders and stream their rows into the API.')
+    parser.add_argument('--senders', type=int, default=1000, help='virtual senders')
+    parser.add_argument('--enhanced-share', type=float, default=0.5, help='share of enhanced senders')
+    parser.add_argument('--interval', type=float, default=600, help='mean seconds between packets per sender')
+    parser.add_argument('--max-distance', type=float, default=5000, help='farthest sender from the receiver (m)')
+    parser.add_argument('--duration', type=float, default=600, help='simulated seconds')
+    parser.add_argument('--tick', type=float, default=1.0, help='simulated seconds per step')
+    parser.add_argument('--speed', type=float, default=1.0, help='simulated seconds per wall second (0: as fast as possible)')
+    parser.add_argument('--rate', type=float, help='target rows per wall second; overrides --speed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ingest', choices=INGEST_MODES, default='batch', help='how rows are posted (default batch)')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent upload clients')
+    parser.add_argument('--db', default='sim.db', help='database for the in-process test client (default sim.db)')
+    parser.add_argument('--url', help='post to a running server (e.g. http://localhost:8000) instead of the test client')
+    parser.add_argument('--csv', help='write the rows to this CSV (setup_db.py --import format) instead of posting')
+    parser.add_argument('--start', help='simulated start time for --csv (default: now minus the duration)')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    simulator = Simulator(args.senders, args.enhanced_share, args.interval, args.max_distance, args.seed)
+    speed = args.speed
+    if args.rate:
+        # Each sender sends about once per interval
+        speed = args.rate * args.interval / max(args.senders, 1)
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'senders': args.senders,
+        'enhanced_share': args.enhanced_share,
+        'interval_s': args.interval,
+        'duration_s': args.duration,
+        'speed': speed
+    }
+
+    if args.csv:
+        start = datetime.fromisoformat(args.start) if args.start else datetime.now() - timedelta(seconds=args.duration)
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+
+            def sink(rows):
+                writer.writerows([
+                    [(start + timedelta(seconds=t)).strftime('%Y-%m-%d %H:%M:%S')]
+                    + [row['compressionRatio'] if c == 'compression_ratio' else row[c] for c in CSV_COLUMNS[1:]]
+                    for t, row in rows
+                ])
+            rows, elapsed = run(simulator, args.duration, args.tick, 0, sink)
+        report['csv'] = args.csv
+    else:
+        if args.url:
+            driver = HTTPDriver(args.url)
+        else:
+            import setup_db
+            storage.configure(db_name=args.db)
+            with storage.transaction() as conn:
+                setup_db.create_schema(conn)
+            driver = TestClientDriver()
+        uploader = Uploader(driver, args.ingest, args.clients)
+        print(f'Simulating {args.senders} senders for {args.duration:g}s at {speed:g}x, posting {args.ingest}...',
+              file=sys.stderr)
+        rows, elapsed = run(simulator, args.duration, args.tick, speed,
+                            lambda produced: uploader.submit([row for _, row in produced]))
+        report['ingest'] = dict(uploader.close(), mode=args.ingest, clients=args.clients,
+                                driver='http' if args.url else 'test_client')
+        elapsed = max(elapsed, 1e-9)
+        report['ingest']['offered_rows_per_s'] = rows / (args.duration / speed) if speed > 0 else None
+        report['ingest']['achieved_rows_per_s'] = report['ingest']['rows_accepted'] / elapsed
+
+    report['rows'] = rows
+    report['wall_seconds'] = elapsed
+    report['link'] = simulator.summary()
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,95 @@ let latencyChart;
 let dataRateChart;
 let compressionChart;
 
+// Only the newest page of transmissions is shown in the table, without the payload column
+const STATS_PAGE_SIZE = 50;
+const STATS_FIELDS = 'sf,bw,type,source,avg_rssi,avg_snr,avg_datarate,avg_latency,avg_compression';
+
+// Last ETag seen per endpoint, so unchanged data comes back as an empty 304
+const etags = {};
+let transmissionRows = [];
+let timeseriesData = null;
+
+// Time-series charts are downsampled on the server to at most this many points
+const TIMESERIES_MAX_POINTS = 500;
+
+async function fetchIfChanged(url) {
+    const path = url.split('?')[0];
+    const headers = etags[path] ? { 'If-None-Match': etags[path] } : {};
+    const response = await fetch(url, { headers: headers, cache: 'no-store' });
+    if (response.status === 304) {
+        return null;
+    }
+    if (response.headers.get('ETag')) {
+        etags[path] = response.headers.get('ETag');
+    }
+    return response.json();
+}
+
+function renderComparison(comparison) {
+    if (comparison.datarate_improvement) {
+        document.getElementById('datarate-improvement').textContent = 
+            comparison.datarate_improvement.toFixed(2);
+    }
+    if (comparison.latency_improvement) {
+        document.getElementById('latency-improvement').textContent = 
+            comparison.latency_improvement.toFixed(2);
+    }
+    if (comparison.compression_ratio) {
+        document.getElementById('avg-compression').textContent = 
+            comparison.compression_ratio.toFixed(2) + 'x';
+    }
+}
+
+function renderTransmissionTable() {
+    const tbody = document.getElementById('transmissions-table-body');
+    tbody.innerHTML = '';
+    transmissionRows.forEach(row => {
+        const timestamp = row.timestamp ? new Date(row.timestamp).toLocaleString() : 'N/A';
+        const type = row.type || 'N/A';
+        const source = row.source || 'standard';
+        const sourceClass = source === 'enhanced' ? 'text-success' : '';
+        const compression = row.avg_compression ? row.avg_compression.toFixed(2) + 'x' : '1.00x';
+        
+        // Check if this was a failed transmission (no ACK received)
+        const isFailedTransmission = row.avg_rssi <= -120 && row.avg_snr <= 0 && row.avg_datarate <= 0;
+        const rowClass = isFailedTransmission ? 'bg-danger bg-opacity-25' : sourceClass;
+        
+        tbody.innerHTML += `
+            <tr class="${rowClass}">
+                <td>${timestamp}</td>
+                <td>${type}</td>
+                <td>SF${row.sf}</td>
+                <td>${row.bw/1000} kHz</td>
+                <td>${row.avg_rssi.toFixed(1)} dBm</td>
+                <td>${row.avg_snr.toFixed(1)} dB</td>
+                <td>${row.avg_datarate.toFixed(1)} bps</td>
+                <td>${row.avg_latency.toFixed(1)} ms</td>
+                <td><span class="badge ${source === 'enhanced' ? 'bg-success' : 'bg-primary'}">${source}</span></td>
+                <td>${compression}</td>
+                <td>${isFailedTransmission ? '<span class="badge bg-danger">Failed</span>' : '<span class="badge bg-success">Success</span>'}</td>
+            </tr>
+        `;
+    });
+}
+
 async function updateStats() {
     try {
-        const response = await fetch('/api/stats');
-        const data = await response.json();
+        // After the first load only ask for rows newer than the newest one we have
+        let url = `/api/stats?limit=${STATS_PAGE_SIZE}&fields=${STATS_FIELDS}`;
+        const incremental = transmissionRows.length > 0;
+        if (incremental) {
+            url += `&since_id=${transmissionRows[0].id}`;
+        }
+        const data = await fetchIfChanged(url);
+        if (!data) {
+            return;
+        }
+        if (incremental) {
+            transmissionRows = data.transmission_stats.concat(transmissionRows).slice(0, STATS_PAGE_SIZE);
+        } else {
+            transmissionRows = data.transmission_stats;
+        }
 
         // Update stats cards
         if (data.reception_stats && data.reception_stats.avg_rssi !== null) {
@@ -59,50 +144,11 @@ async function updateStats() {
         
         // Update comparison metrics
         if (data.comparison) {
-            if (data.comparison.datarate_improvement) {
-                document.getElementById('datarate-improvement').textContent = 
-                    data.comparison.datarate_improvement.toFixed(2);
-            }
-            if (data.comparison.latency_improvement) {
-                document.getElementById('latency-improvement').textContent = 
-                    data.comparison.latency_improvement.toFixed(2);
-            }
-            if (data.comparison.compression_ratio) {
-                document.getElementById('avg-compression').textContent = 
-                    data.comparison.compression_ratio.toFixed(2) + 'x';
-            }
+            renderComparison(data.comparison);
         }
 
         // Update transmission stats table
-        const tbody = document.getElementById('transmissions-table-body');
-        tbody.innerHTML = '';
-        data.transmission_stats.forEach(row => {
-            const timestamp = row.timestamp ? new Date(row.timestamp).toLocaleString() : 'N/A';
-            const type = row.type || 'N/A';
-            const source = row.source || 'standard';
-            const sourceClass = source === 'enhanced' ? 'text-success' : '';
-            const compression = row.avg_compression ? row.avg_compression.toFixed(2) + 'x' : '1.00x';
-            
-            // Check if this was a failed transmission (no ACK received)
-            const isFailedTransmission = row.avg_rssi <= -120 && row.avg_snr <= 0 && row.avg_datarate <= 0;
-            const rowClass = isFailedTransmission ? 'bg-danger bg-opacity-25' : sourceClass;
-            
-            tbody.innerHTML += `
-                <tr class="${rowClass}">
-                    <td>${timestamp}</td>
-                    <td>${type}</td>
-                    <td>SF${row.sf}</td>
-                    <td>${row.bw/1000} kHz</td>
-                    <td>${row.avg_rssi.toFixed(1)} dBm</td>
-                    <td>${row.avg_snr.toFixed(1)} dB</td>
-                    <td>${row.avg_datarate.toFixed(1)} bps</td>
-                    <td>${row.avg_latency.toFixed(1)} ms</td>
-                    <td><span class="badge ${source === 'enhanced' ? 'bg-success' : 'bg-primary'}">${source}</span></td>
-                    <td>${compression}</td>
-                    <td>${isFailedTransmission ? '<span class="badge bg-danger">Failed</span>' : '<span class="badge bg-success">Success</span>'}</td>
-                </tr>
-            `;
-        });
+        renderTransmissionTable();
 
         // Update charts if they exist
         if (sfChart) {
@@ -119,8 +165,10 @@ async function updateStats() {
 
 async function updateCharts() {
     try {
-        const response = await fetch('/api/metrics');
-        const data = await response.json();
+        const data = await fetchIfChanged('/api/metrics');
+        if (!data) {
+            return;
+        }
 
         // Prepare data for SF chart
         const sfValues = [...new Set(data.sf_metrics.map(m => m.sf))].sort((a, b) => a - b);
@@ -359,267 +407,357 @@ function updateChart(chart, metrics, type) {
     chart.update();
 }
 
+function mergeTimeSeries(current, delta) {
+    if (!current) {
+        return delta;
+    }
+    // Both responses share one aligned time axis, so appending keeps the series in step
+    current.timestamps = current.timestamps.concat(delta.timestamps);
+    ['standard', 'enhanced'].forEach(source => {
+        Object.keys(delta[source]).forEach(metric => {
+            current[source][metric] = current[source][metric].concat(delta[source][metric]);
+        });
+    });
+    current.last_id = delta.last_id;
+    return current;
+}
+
 // Function to create and update time-series charts
 async function updateTimeSeriesCharts() {
     try {
-        const response = await fetch('/api/timeseries');
-        const data = await response.json();
-        
-        // Format timestamps for display
-        const formattedTimestamps = data.timestamps.map(ts => {
-            const date = new Date(ts);
-            return date.toLocaleTimeString();
-        });
-        
-        // Create or update RSSI chart
-        if (!rssiChart) {
-            const ctx = document.getElementById('rssiChart').getContext('2d');
-            rssiChart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: formattedTimestamps,
-                    datasets: [
-                        {
-                            label: 'Standard RSSI (dBm)',
-                            data: data.standard.rssi,
-                            borderColor: 'rgb(255, 99, 132)',
-                            backgroundColor: 'rgba(255, 99, 132, 0.1)',
-                            tension: 0.1
-                        },
-                        {
-                            label: 'Enhanced RSSI (dBm)',
-                            data: data.enhanced.rssi,
-                            borderColor: 'rgb(75, 192, 192)',
-                            backgroundColor: 'rgba(75, 192, 192, 0.1)',
-                            tension: 0.1
-                        }
-                    ]
+        // Fetch only the points appended since the last poll and merge them in
+        // Once enough new points have piled up, reload a freshly downsampled history
+        if (timeseriesData && timeseriesData.timestamps.length > 2 * TIMESERIES_MAX_POINTS) {
+            timeseriesData = null;
+            delete etags['/api/timeseries'];
+        }
+        let url = `/api/timeseries?max_points=${TIMESERIES_MAX_POINTS}`;
+        if (timeseriesData) {
+            url += `&since_id=${timeseriesData.last_id}`;
+        }
+        const delta = await fetchIfChanged(url);
+        if (!delta) {
+            return;
+        }
+        timeseriesData = mergeTimeSeries(timeseriesData, delta);
+        renderTimeSeriesCharts(timeseriesData);
+    } catch (error) {
+        console.error('Error updating time-series charts:', error);
+    }
+}
+
+function renderTimeSeriesCharts(data) {
+    
+    // Format timestamps for display
+    const formattedTimestamps = data.timestamps.map(ts => {
+        const date = new Date(ts);
+        return date.toLocaleTimeString();
+    });
+    
+    // Create or update RSSI chart
+    if (!rssiChart) {
+        const ctx = document.getElementById('rssiChart').getContext('2d');
+        rssiChart = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: formattedTimestamps,
+                datasets: [
+                    {
+                        label: 'Standard RSSI (dBm)',
+                        data: data.standard.rssi,
+                        borderColor: 'rgb(255, 99, 132)',
+                        backgroundColor: 'rgba(255, 99, 132, 0.1)',
+                        tension: 0.1
+                    },
+                    {
+                        label: 'Enhanced RSSI (dBm)',
+                        data: data.enhanced.rssi,
+                        borderColor: 'rgb(75, 192, 192)',
+                        backgroundColor: 'rgba(75, 192, 192, 0.1)',
+                        tension: 0.1
+                    }
+                ]
+            },
+            options: {
+                responsive: true,
+                spanGaps: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: 'RSSI over Time'
+                    }
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
+                scales: {
+                    y: {
                         title: {
                             display: true,
-                            text: 'RSSI over Time'
-                        }
-                    },
-                    scales: {
-                        y: {
-                            title: {
-                                display: true,
-                                text: 'RSSI (dBm)'
-                            }
+                            text: 'RSSI (dBm)'
                         }
                     }
                 }
-            });
-        } else {
-            rssiChart.data.labels = formattedTimestamps;
-            rssiChart.data.datasets[0].data = data.standard.rssi;
-            rssiChart.data.datasets[1].data = data.enhanced.rssi;
-            rssiChart.update();
-        }
-        
-        // Create or update SNR chart
-        if (!snrChart) {
-            const ctx = document.getElementById('snrChart').getContext('2d');
-            snrChart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: formattedTimestamps,
-                    datasets: [
-                        {
-                            label: 'Standard SNR (dB)',
-                            data: data.standard.snr,
-                            borderColor: 'rgb(255, 99, 132)',
-                            backgroundColor: 'rgba(255, 99, 132, 0.1)',
-                            tension: 0.1
-                        },
-                        {
-                            label: 'Enhanced SNR (dB)',
-                            data: data.enhanced.snr,
-                            borderColor: 'rgb(75, 192, 192)',
-                            backgroundColor: 'rgba(75, 192, 192, 0.1)',
-                            tension: 0.1
-                        }
-                    ]
+            }
+        });
+    } else {
+        rssiChart.data.labels = formattedTimestamps;
+        rssiChart.data.datasets[0].data = data.standard.rssi;
+        rssiChart.data.datasets[1].data = data.enhanced.rssi;
+        rssiChart.update();
+    }
+    
+    // Create or update SNR chart
+    if (!snrChart) {
+        const ctx = document.getElementById('snrChart').getContext('2d');
+        snrChart = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: formattedTimestamps,
+                datasets: [
+                    {
+                        label: 'Standard SNR (dB)',
+                        data: data.standard.snr,
+                        borderColor: 'rgb(255, 99, 132)',
+                        backgroundColor: 'rgba(255, 99, 132, 0.1)',
+                        tension: 0.1
+                    },
+                    {
+                        label: 'Enhanced SNR (dB)',
+                        data: data.enhanced.snr,
+                        borderColor: 'rgb(75, 192, 192)',
+                        backgroundColor: 'rgba(75, 192, 192, 0.1)',
+                        tension: 0.1
+                    }
+                ]
+            },
+            options: {
+                responsive: true,
+                spanGaps: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: 'SNR over Time'
+                    }
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
+                scales: {
+                    y: {
                         title: {
                             display: true,
-                            text: 'SNR over Time'
-                        }
-                    },
-                    scales: {
-                        y: {
-                            title: {
-                                display: true,
-                                text: 'SNR (dB)'
-                            }
+                            text: 'SNR (dB)'
                         }
                     }
                 }
-            });
-        } else {
-            snrChart.data.labels = formattedTimestamps;
-            snrChart.data.datasets[0].data = data.standard.snr;
-            snrChart.data.datasets[1].data = data.enhanced.snr;
-            snrChart.update();
-        }
-        
-        // Create or update Latency chart
-        if (!latencyChart) {
-            const ctx = document.getElementById('latencyChart').getContext('2d');
-            latencyChart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: formattedTimestamps,
-                    datasets: [
-                        {
-                            label: 'Standard Latency (ms)',
-                            data: data.standard.latency,
-                            borderColor: 'rgb(255, 99, 132)',
-                            backgroundColor: 'rgba(255, 99, 132, 0.1)',
-                            tension: 0.1
-                        },
-                        {
-                            label: 'Enhanced Latency (ms)',
-                            data: data.enhanced.latency,
-                            borderColor: 'rgb(75, 192, 192)',
-                            backgroundColor: 'rgba(75, 192, 192, 0.1)',
-                            tension: 0.1
-                        }
-                    ]
+            }
+        });
+    } else {
+        snrChart.data.labels = formattedTimestamps;
+        snrChart.data.datasets[0].data = data.standard.snr;
+        snrChart.data.datasets[1].data = data.enhanced.snr;
+        snrChart.update();
+    }
+    
+    // Create or update Latency chart
+    if (!latencyChart) {
+        const ctx = document.getElementById('latencyChart').getContext('2d');
+        latencyChart = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: formattedTimestamps,
+                datasets: [
+                    {
+                        label: 'Standard Latency (ms)',
+                        data: data.standard.latency,
+                        borderColor: 'rgb(255, 99, 132)',
+                        backgroundColor: 'rgba(255, 99, 132, 0.1)',
+                        tension: 0.1
+                    },
+                    {
+                        label: 'Enhanced Latency (ms)',
+                        data: data.enhanced.latency,
+                        borderColor: 'rgb(75, 192, 192)',
+                        backgroundColor: 'rgba(75, 192, 192, 0.1)',
+                        tension: 0.1
+                    }
+                ]
+            },
+            options: {
+                responsive: true,
+                spanGaps: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: 'Latency over Time'
+                    }
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
+                scales: {
+                    y: {
                         title: {
                             display: true,
-                            text: 'Latency over Time'
-                        }
-                    },
-                    scales: {
-                        y: {
-                            title: {
-                                display: true,
-                                text: 'Latency (ms)'
-                            }
+                            text: 'Latency (ms)'
                         }
                     }
                 }
-            });
-        } else {
-            latencyChart.data.labels = formattedTimestamps;
-            latencyChart.data.datasets[0].data = data.standard.latency;
-            latencyChart.data.datasets[1].data = data.enhanced.latency;
-            latencyChart.update();
-        }
-        
-        // Create or update Data Rate chart
-        if (!dataRateChart) {
-            const ctx = document.getElementById('dataRateChart').getContext('2d');
-            dataRateChart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: formattedTimestamps,
-                    datasets: [
-                        {
-                            label: 'Standard Data Rate (bps)',
-                            data: data.standard.datarate,
-                            borderColor: 'rgb(255, 99, 132)',
-                            backgroundColor: 'rgba(255, 99, 132, 0.1)',
-                            tension: 0.1
-                        },
-                        {
-                            label: 'Enhanced Data Rate (bps)',
-                            data: data.enhanced.datarate,
-                            borderColor: 'rgb(75, 192, 192)',
-                            backgroundColor: 'rgba(75, 192, 192, 0.1)',
-                            tension: 0.1
-                        }
-                    ]
+            }
+        });
+    } else {
+        latencyChart.data.labels = formattedTimestamps;
+        latencyChart.data.datasets[0].data = data.standard.latency;
+        latencyChart.data.datasets[1].data = data.enhanced.latency;
+        latencyChart.update();
+    }
+    
+    // Create or update Data Rate chart
+    if (!dataRateChart) {
+        const ctx = document.getElementById('dataRateChart').getContext('2d');
+        dataRateChart = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: formattedTimestamps,
+                datasets: [
+                    {
+                        label: 'Standard Data Rate (bps)',
+                        data: data.standard.datarate,
+                        borderColor: 'rgb(255, 99, 132)',
+                        backgroundColor: 'rgba(255, 99, 132, 0.1)',
+                        tension: 0.1
+                    },
+                    {
+                        label: 'Enhanced Data Rate (bps)',
+                        data: data.enhanced.datarate,
+                        borderColor: 'rgb(75, 192, 192)',
+                        backgroundColor: 'rgba(75, 192, 192, 0.1)',
+                        tension: 0.1
+                    }
+                ]
+            },
+            options: {
+                responsive: true,
+                spanGaps: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: 'Data Rate over Time'
+                    }
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
+                scales: {
+                    y: {
                         title: {
                             display: true,
-                            text: 'Data Rate over Time'
-                        }
-                    },
-                    scales: {
-                        y: {
-                            title: {
-                                display: true,
-                                text: 'Data Rate (bps)'
-                            }
+                            text: 'Data Rate (bps)'
                         }
                     }
                 }
-            });
-        } else {
-            dataRateChart.data.labels = formattedTimestamps;
-            dataRateChart.data.datasets[0].data = data.standard.datarate;
-            dataRateChart.data.datasets[1].data = data.enhanced.datarate;
-            dataRateChart.update();
-        }
-        
-        // Create or update Compression Ratio chart (enhanced only)
-        if (!compressionChart) {
-            const ctx = document.getElementById('compressionChart').getContext('2d');
-            compressionChart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: formattedTimestamps,
-                    datasets: [
-                        {
-                            label: 'Compression Ratio',
-                            data: data.enhanced.compression_ratio,
-                            borderColor: 'rgb(153, 102, 255)',
-                            backgroundColor: 'rgba(153, 102, 255, 0.1)',
-                            tension: 0.1
-                        }
-                    ]
+            }
+        });
+    } else {
+        dataRateChart.data.labels = formattedTimestamps;
+        dataRateChart.data.datasets[0].data = data.standard.datarate;
+        dataRateChart.data.datasets[1].data = data.enhanced.datarate;
+        dataRateChart.update();
+    }
+    
+    // Create or update Compression Ratio chart (enhanced only)
+    if (!compressionChart) {
+        const ctx = document.getElementById('compressionChart').getContext('2d');
+        compressionChart = new Chart(ctx, {
+            type: 'line',
+            data: {
+                labels: formattedTimestamps,
+                datasets: [
+                    {
+                        label: 'Compression Ratio',
+                        data: data.enhanced.compression_ratio,
+                        borderColor: 'rgb(153, 102, 255)',
+                        backgroundColor: 'rgba(153, 102, 255, 0.1)',
+                        tension: 0.1
+                    }
+                ]
+            },
+            options: {
+                responsive: true,
+                spanGaps: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: 'Compression Ratio over Time (Enhanced Only)'
+                    }
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
+                scales: {
+                    y: {
                         title: {
                             display: true,
-                            text: 'Compression Ratio over Time (Enhanced Only)'
-                        }
-                    },
-                    scales: {
-                        y: {
-                            title: {
-                                display: true,
-                                text: 'Compression Ratio'
-                            },
-                            beginAtZero: true
-                        }
+                            text: 'Compression Ratio'
+                        },
+                        beginAtZero: true
                     }
                 }
-            });
-        } else {
-            compressionChart.data.labels = formattedTimestamps;
-            compressionChart.data.datasets[0].data = data.enhanced.compression_ratio;
-            compressionChart.update();
-        }
-        
-    } catch (error) {
-        console.error('Error updating time-series charts:', error);
+            }
+        });
+    } else {
+        compressionChart.data.labels = formattedTimestamps;
+        compressionChart.data.datasets[0].data = data.enhanced.compression_ratio;
+        compressionChart.update();
     }
 }
 
-// Initial data load
-updateStats();
-updateCharts();
-updateTimeSeriesCharts();
+function refreshAll() {
+    updateStats();
+    updateCharts();
+    updateTimeSeriesCharts();
+}
+
+// Aggregates (source averages, SF/BW charts) are refetched at most once per interval
+// after live rows arrive; both endpoints are cached and answer 304 when unchanged
+let refreshTimer = null;
+function scheduleRefresh() {
+    if (refreshTimer === null) {
+        refreshTimer = setTimeout(() => {
+            refreshTimer = null;
+            updateStats();
+            updateCharts();
+        }, 2000);
+    }
+}
 
-// Update data every 10 seconds for more real-time experience
-setInterval(updateStats, 10000);
-setInterval(updateCharts, 10000);
-setInterval(updateTimeSeriesCharts, 10000);
+function applyTransmissions(rows) {
+    transmissionRows = rows.slice().reverse().concat(transmissionRows).slice(0, STATS_PAGE_SIZE);
+    renderTransmissionTable();
+
+    if (timeseriesData) {
+        const delta = { last_id: rows[rows.length - 1].id, timestamps: [], standard: {}, enhanced: {} };
+        const metrics = { rssi: 'avg_rssi', snr: 'avg_snr', latency: 'avg_latency', datarate: 'avg_datarate', compression_ratio: 'avg_compression' };
+        ['standard', 'enhanced'].forEach(source => {
+            Object.keys(metrics).forEach(metric => { delta[source][metric] = []; });
+        });
+        rows.forEach(row => {
+            if (!(row.avg_datarate > 0) || (row.source !== 'standard' && row.source !== 'enhanced')) {
+                return;
+            }
+            delta.timestamps.push(row.timestamp);
+            ['standard', 'enhanced'].forEach(source => {
+                Object.entries(metrics).forEach(([metric, field]) => {
+                    delta[source][metric].push(source === row.source ? row[field] : null);
+                });
+            });
+        });
+        timeseriesData = mergeTimeSeries(timeseriesData, delta);
+        renderTimeSeriesCharts(timeseriesData);
+    }
+    scheduleRefresh();
+}
+
+// Live updates are pushed over Server-Sent Events; every (re)connect first catches up
+// through the since_id deltas. Browsers without EventSource fall back to polling.
+if (window.EventSource) {
+    const events = new EventSource('/api/stream');
+    events.addEventListener('open', refreshAll);
+    events.addEventListener('resync', refreshAll);
+    events.addEventListener('transmission', event => {
+        applyTransmissions(JSON.parse(event.data).rows);
+    });
+    events.addEventListener('reception', scheduleRefresh);
+    events.addEventListener('comparison', event => {
+        renderComparison(JSON.parse(event.data));
+    });
+} else {
+    refreshAll();
+    setInterval(refreshAll, 10000);
+}
@@ -0,0 +1,198 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import instrumentation
+import payload_store
+
+load_dotenv()
+
+DB_NAME = os.getenv('DB_NAME', 'data.db')
+
+# Pool and connection tuning, all overridable from the environment / .env file
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '5'))
+JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', '-16000'))  # negative values are KiB
+MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+STATEMENT_CACHE = int(os.getenv('DB_STATEMENT_CACHE', '256'))
+CHANGE_POLL_INTERVAL = float(os.getenv('DB_CHANGE_POLL_INTERVAL', '1'))
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+def connect(db_name=None):
+    # Connections are handed between request threads by the pool, never shared concurrently
+    conn = sqlite3.connect(
+        db_name or DB_NAME,
+        timeout=BUSY_TIMEOUT,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE,
+        factory=instrumentation.connection_factory
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA journal_mode={JOURNAL_MODE}')
+    conn.execute(f'PRAGMA synchronous={SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size={CACHE_SIZE}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA foreign_keys=ON')
+    payload_store.register(conn)
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, db_name=None, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_name = db_name or DB_NAME
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError('connection pool is closed')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Open connections lazily up to the bound, then wait for one to be released
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return connect(self.db_name)
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f'no database connection available after {self.timeout}s')
+
+    def release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection, drop it so a fresh one is opened next time
+            with self._lock:
+                self._created -= 1
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class ChangeMonitor:
+    # Notices commits made by other processes (other server workers, the serial gateway,
+    # CSV imports) so in-process caches can catch up. PRAGMA data_version on a dedicated
+    # connection changes whenever any other connection commits; it is checked at most
+    # every `interval` seconds and read from memory, so polling it is cheap.
+    def __init__(self, interval=CHANGE_POLL_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._owner = None
+        self._data_version = None
+        self._checked = 0.0
+        self.version = 0
+
+    def poll(self):
+        # Returns a counter that increases after commits by other connections
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked < self.interval:
+                return self.version
+            self._checked = now
+            owner = (os.getpid(), DB_NAME)
+            if self._owner != owner:
+                # Not inherited across fork() nor kept after configure() switches databases
+                self._conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT, check_same_thread=False)
+                self._owner = owner
+                self._data_version = None
+            try:
+                data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+            except sqlite3.Error:
+                self._owner = None
+                return self.version
+            if data_version != self._data_version:
+                if self._data_version is not None:
+                    self.version += 1
+                self._data_version = data_version
+            return self.version
+
+
+_pool = None
+_pool_lock = threading.Lock()
+changes = ChangeMonitor()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_NAME)
+    return _pool
+
+
+def configure(db_name=None, size=None):
+    # Point the shared pool at another database file (used by tools and benchmarks)
+    global _pool, DB_NAME
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if db_name:
+            DB_NAME = db_name
+        if size:
+            _pool = ConnectionPool(DB_NAME, size=size)
+
+
+def connection():
+    return get_pool().connection()
+
+
+@contextmanager
+def transaction():
+    # Commits on success, rolls back on error
+    with connection() as conn:
+        with conn:
+            yield conn
+
+
+def close():
+    configure()
+
+
+atexit.register(close)
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+
+import benchmark
+import storage
+
+# Run from webserver/:  python3 -m unittest test_benchmark   (or python3 -m pytest)
+
+
+class SeedTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        previous = storage.DB_NAME
+        storage.configure(db_name=os.path.join(directory.name, 'bench.db'))
+        self.addCleanup(storage.configure, db_name=previous)
+
+    def test_seed_spans_several_chunks(self):
+        benchmark.seed(2500, 30, chunk_rows=1000)
+        with storage.connection() as conn:
+            count, first, last = conn.execute(
+                'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM transmissions'
+            ).fetchone()
+        self.assertEqual(count, 2500)
+        self.assertLess(first, last)
+
+
+if __name__ == '__main__':
+    unittest.main()
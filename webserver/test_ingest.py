@@ -0,0 +1,61 @@
+import threading
+import time
+import unittest
+
+import ingest
+
+# Run from webserver/:  python3 -m unittest test_ingest   (or python3 -m pytest)
+
+
+class SlowWriter:
+    def __init__(self, delay):
+        self.delay = delay
+        self.started = threading.Event()
+        self.committed = []
+
+    def __call__(self, table, values):
+        self.started.set()
+        time.sleep(self.delay)
+        self.committed.extend(values)
+
+
+class IngestQueueFlushTest(unittest.TestCase):
+    def make_queue(self, writer, **kwargs):
+        queue = ingest.IngestQueue(writer, **kwargs)
+        self.addCleanup(queue.stop)
+        return queue
+
+    def test_flush_waits_for_batch_being_written(self):
+        writer = SlowWriter(0.5)
+        queue = self.make_queue(writer, flush_interval=0)
+        queue.submit('receptions', [('a', -80.0, 5.0), ('b', -81.0, 4.0)])
+        # The batch is off the queue and in write() before flush is called
+        self.assertTrue(writer.started.wait(1))
+        self.assertTrue(queue.flush(timeout=5))
+        self.assertEqual(len(writer.committed), 2)
+        self.assertEqual(queue.stats()['written_rows'], 2)
+
+    def test_flush_does_not_wait_for_flush_interval(self):
+        writer = SlowWriter(0)
+        queue = self.make_queue(writer, flush_interval=30)
+        queue.submit('receptions', [('a', -80.0, 5.0)])
+        started = time.monotonic()
+        self.assertTrue(queue.flush(timeout=5))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(len(writer.committed), 1)
+
+    def test_flush_times_out_while_writer_is_busy(self):
+        writer = SlowWriter(1)
+        queue = self.make_queue(writer, flush_interval=0)
+        queue.submit('receptions', [('a', -80.0, 5.0)])
+        self.assertTrue(writer.started.wait(1))
+        self.assertFalse(queue.flush(timeout=0.1))
+        self.assertTrue(queue.flush(timeout=5))
+
+    def test_flush_on_empty_queue(self):
+        queue = self.make_queue(SlowWriter(0))
+        self.assertTrue(queue.flush(timeout=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+import instrumentation
+
+# Run from webserver/:  python3 -m unittest test_instrumentation   (or python3 -m pytest)
+
+
+class StatementLabelTest(unittest.TestCase):
+    def test_placeholder_lists_share_a_label(self):
+        labels = {
+            instrumentation.statement_label(f'SELECT id FROM payloads WHERE hash IN ({", ".join("?" * n)})')
+            for n in range(1, 50)
+        }
+        self.assertEqual(labels, {'SELECT id FROM payloads WHERE hash IN (?+)'})
+
+    def test_multi_row_values_share_a_label(self):
+        self.assertEqual(
+            instrumentation.statement_label('INSERT INTO t (a, b) VALUES (?, ?),\n  (?, ?), (?, ?)'),
+            instrumentation.statement_label('INSERT INTO t (a, b) VALUES (?, ?)')
+        )
+
+
+class SeriesCapTest(unittest.TestCase):
+    def test_counter_overflows_into_other(self):
+        counter = instrumentation.Counter('test_total', 'Test.', ('statement',), max_series=3)
+        for index in range(10):
+            counter.inc(f'statement {index}')
+        counter.inc('statement 0')
+        lines = counter.render()[2:]
+        self.assertEqual(len(lines), 4)
+        self.assertIn('test_total{statement="statement 0"} 2', lines)
+        self.assertIn('test_total{statement="other"} 7', lines)
+
+    def test_histogram_overflows_into_other(self):
+        histogram = instrumentation.Histogram('test_seconds', 'Test.', ('route',), max_series=2)
+        for index in range(5):
+            histogram.observe(0.01, f'/route/{index}')
+        counts = [line for line in histogram.render() if line.startswith('test_seconds_count')]
+        self.assertEqual(counts[-1], 'test_seconds_count{route="other"} 3')
+        self.assertEqual(len(counts), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+
+import benchmark
+import query_plans
+import storage
+
+# Run from webserver/:  python3 -m unittest test_query_plans   (or python3 -m pytest)
+#
+# The database is seeded without ANALYZE statistics, as a new deployment's would be.
+
+
+class SeededDatabaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.previous = storage.DB_NAME
+        storage.configure(db_name=os.path.join(cls.directory.name, 'plans.db'))
+        benchmark.seed(20000, 30, chunk_rows=10000)
+        # One pooled connection, so the statements traced on it are every request's
+        storage.configure(size=1)
+        from application import app
+        cls.client = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        storage.configure(db_name=cls.previous)
+        cls.directory.cleanup()
+
+    def setUp(self):
+        from cache import response_cache
+        response_cache.clear()
+
+    def plans(self, path):
+        # {statement: [plan line, ...]} of the transmissions queries the request issues
+        with storage.connection() as conn:
+            pass
+        # Traced while the request borrows the pool's only connection
+        statements = query_plans.capture_statements(self.client, path, conn)
+        return {
+            ' '.join(sql.split()): [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+            for sql in statements if 'FROM transmissions' in sql and 'MAX(id)' not in sql
+        }
+
+    def get(self, path):
+        from cache import response_cache
+        response_cache.clear()
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def last_id(self):
+        with storage.connection() as conn:
+            return conn.execute('SELECT MAX(id) FROM transmissions').fetchone()[0]
+
+
+class SinceIdTest(SeededDatabaseTest):
+    def test_polls_seek_the_rowid_range(self):
+        since_id = self.last_id() - 10
+        for path in (f'/api/stats?since_id={since_id}',
+                     f'/api/stats?since_id={since_id}&source=enhanced&since=2000-01-01',
+                     f'/api/timeseries?since_id={since_id}'):
+            plans = self.plans(path)
+            self.assertEqual(len(plans), 1, path)
+            for sql, plan in plans.items():
+                self.assertEqual(len(plan), 1, f'{path}: {plan}')
+                self.assertRegex(plan[0], r'^SEARCH transmissions USING INTEGER PRIMARY KEY \(rowid>\?', path)
+
+    def test_stats_poll_returns_newest_new_rows_first(self):
+        since_id = self.last_id() - 30
+        page = self.get(f'/api/stats?since_id={since_id}&limit=20')
+        with storage.connection() as conn:
+            expected = [row[0] for row in conn.execute('''
+                SELECT id FROM transmissions WHERE id > ? ORDER BY timestamp DESC, id DESC LIMIT 20
+            ''', (since_id,))]
+        self.assertEqual([row['id'] for row in page['transmission_stats']], expected)
+        self.assertIsNotNone(page['next_cursor'])
+        rest = self.get(f"/api/stats?since_id={since_id}&limit=20&cursor={page['next_cursor']}")
+        self.assertEqual(len(rest['transmission_stats']), 10)
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_timeseries_poll_matches_full_load(self):
+        last_id = self.last_id()
+        full = self.get('/api/timeseries')
+        increment = self.get(f'/api/timeseries?since_id={last_id - 500}')
+        self.assertEqual(increment['last_id'], last_id)
+        count = len(increment['timestamps'])
+        self.assertGreater(count, 0)
+        self.assertEqual(increment['timestamps'], full['timestamps'][-count:])
+        for source in ('standard', 'enhanced'):
+            for metric, values in increment[source].items():
+                for value, expected in zip(values, full[source][metric][-count:]):
+                    if expected is None:
+                        self.assertIsNone(value)
+                    else:
+                        self.assertAlmostEqual(value, expected)
+
+
+class PlanCheckTest(SeededDatabaseTest):
+    def test_api_queries_use_an_index(self):
+        self.assertEqual(query_plans.check_plans(), [])
+
+    def full_scans(self, sql):
+        with storage.connection() as conn:
+            return query_plans.full_scans(conn, sql)
+
+    def test_unfiltered_ordered_scan_with_limit_passes(self):
+        self.assertEqual(self.full_scans('SELECT id FROM transmissions ORDER BY timestamp DESC, id DESC LIMIT 10'), [])
+
+    def test_filtered_ordered_scan_with_limit_fails(self):
+        self.assertTrue(self.full_scans('''
+            SELECT id FROM transmissions WHERE +sf = 7 ORDER BY timestamp DESC, id DESC LIMIT 10
+        '''))
+
+    def test_sort_of_a_large_table_fails(self):
+        problems = self.full_scans('''
+            SELECT t.id FROM transmissions t WHERE t.source = 'enhanced' ORDER BY t.sf LIMIT 10
+        ''')
+        self.assertTrue(any('TEMP B-TREE' in problem for problem in problems))
+
+    def test_sort_of_a_small_table_passes(self):
+        self.assertEqual(self.full_scans('SELECT source, SUM(count) FROM rollup_hour GROUP BY source'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import partitions
+import setup_db
+import storage
+
+# Run from webserver/:  python3 -m unittest test_setup_db   (or python3 -m pytest)
+
+
+def transmission(timestamp, data='hello', source='standard'):
+    return [timestamp, 'text', data, 7, 125, 5, -80, 7.5, 0, 5.47, 60, source, 1.0]
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        previous = storage.DB_NAME
+        storage.configure(db_name=os.path.join(self.directory, 'test.db'))
+        self.addCleanup(storage.configure, db_name=previous)
+        patcher = mock.patch.object(partitions, 'ARCHIVE_DIR', os.path.join(self.directory, 'archive'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with contextlib.redirect_stdout(io.StringIO()):
+            setup_db.create_tables()
+
+    def import_rows(self, rows, mode):
+        path = os.path.join(self.directory, 'import.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(setup_db.IMPORT_COLUMNS)
+            writer.writerows(rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            setup_db.import_from_csv(path, mode=mode)
+
+    def ids(self):
+        with storage.connection() as conn:
+            return [row[0] for row in conn.execute('SELECT id FROM transmissions ORDER BY id')]
+
+    def test_overwrite_does_not_reuse_ids(self):
+        self.import_rows([transmission(f'2024-01-01 00:0{i}:00') for i in range(3)], 'overwrite')
+        self.assertEqual(self.ids(), [1, 2, 3])
+        self.import_rows([transmission('2024-02-01 00:00:00', 'other')], 'overwrite')
+        self.assertEqual(self.ids(), [4])
+
+    def hourly_counts(self):
+        with storage.connection() as conn:
+            return dict(conn.execute('SELECT bucket, SUM(count) FROM rollup_hour GROUP BY bucket').fetchall())
+
+    def test_rollups_keep_archived_months(self):
+        self.import_rows([
+            transmission('2024-01-05 10:15:00'), transmission('2024-01-05 10:45:00', 'other'),
+            transmission('2024-03-02 08:00:00')
+        ], 'overwrite')
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitions.apply_retention(days=30, now=datetime(2024, 3, 10))
+        expected = {'2024-01-05 10:00': 2, '2024-03-02 08:00': 1}
+        self.assertEqual(self.hourly_counts(), expected)
+
+        self.import_rows([transmission('2024-03-02 08:30:00', 'new')], 'append')
+        expected['2024-03-02 08:00'] = 2
+        self.assertEqual(self.hourly_counts(), expected)
+        with contextlib.redirect_stdout(io.StringIO()):
+            setup_db.rebuild_rollups()
+        self.assertEqual(self.hourly_counts(), expected)
+
+        self.import_rows([transmission('2024-01-05 10:50:00', 'again')], 'overwrite')
+        self.assertEqual(self.hourly_counts(), {'2024-01-05 10:00': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
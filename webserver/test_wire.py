@@ -0,0 +1,62 @@
+import unittest
+
+import wire
+
+# Run from webserver/:  python3 -m unittest test_wire   (or python3 -m pytest)
+
+ROW = {
+    'type': 'text', 'data': 'hello', 'sf': 7, 'bw': 125, 'cr': 5, 'rssi': -80, 'snr': 7.25,
+    'delay': 0, 'datarate': 5.47, 'latency': 61, 'source': 'enhanced', 'compressionRatio': 1.8
+}
+
+
+def encode_with(table, rows, field, storage):
+    # Encodes like wire.encode() but forces one column into the given number storage
+    parts = [wire.HEADER.pack(wire.MAGIC, wire.VERSION, wire.TABLE_IDS[table], len(rows))]
+    for name, kind, default in wire.COLUMNS[table]:
+        if name == field:
+            parts.append(bytes([wire.PLAIN]))
+            wire._write_numbers(parts, [row[name] for row in rows], storage, 0)
+        else:
+            wire._write_column(parts, wire._column(rows, name, kind, default), kind)
+    return b''.join(parts)
+
+
+class DecodeTest(unittest.TestCase):
+    def test_round_trip(self):
+        rows = [ROW, dict(ROW, data='world', sf=12, rssi=None, snr=None)]
+        decoded = wire.decode(wire.encode('transmissions', rows), 'transmissions')
+        self.assertEqual(decoded[0], ('text', 'hello', 7, 125, 5, -80, 7.25, 0, 5.47, 61, 'enhanced', 1.8))
+        self.assertEqual(decoded[1][2], 12)
+        self.assertIsNone(decoded[1][5])
+        self.assertIsNone(decoded[1][6])
+
+    def test_missing_required_value_is_rejected(self):
+        for field in ('sf', 'bw', 'cr'):
+            body = wire.encode('transmissions', [ROW, dict(ROW, **{field: None})])
+            with self.assertRaisesRegex(ValueError, f'{field} is missing in row 1'):
+                wire.decode(body, 'transmissions')
+
+    def test_missing_optional_value_is_accepted(self):
+        body = wire.encode('receptions', [{'data': 'x', 'rssi': None, 'snr': None}])
+        self.assertEqual(wire.decode(body, 'receptions'), [('x', None, None)])
+
+    def test_fractional_integer_is_rejected(self):
+        body = encode_with('transmissions', [ROW, dict(ROW, sf=7.5)], 'sf', b'd')
+        with self.assertRaisesRegex(ValueError, 'not a whole number'):
+            wire.decode(body, 'transmissions')
+
+    def test_whole_doubles_in_integer_column_decode_as_integers(self):
+        body = encode_with('transmissions', [ROW], 'bw', b'd')
+        bw = wire.decode(body, 'transmissions')[0][3]
+        self.assertEqual(bw, 125)
+        self.assertIsInstance(bw, int)
+
+    def test_integer_outside_sqlite_range_is_rejected(self):
+        body = encode_with('transmissions', [dict(ROW, delay=2 ** 70)], 'delay', b'd')
+        with self.assertRaises(ValueError):
+            wire.decode(body, 'transmissions')
+
+
+if __name__ == '__main__':
+    unittest.main()
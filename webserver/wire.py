@@ -0,0 +1,349 @@
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+# Compact binary batch format for gateway uploads to the batch ingest routes, sent as
+# Content-Type: application/vnd.loraid.batch. All integers are little-endian.
+#
+#   header    magic b'LR', version u8, table u8 (1 transmissions, 2 receptions), count u32
+#
+# Version 2 (written by encode()) stores the batch column by column, in the order of
+# the insert tuples (TRANSMISSION_COLUMNS / RECEPTION_COLUMNS). Gateway batches repeat
+# themselves: a handful of payloads, one or two SF/BW/CR settings, data rates and
+# compression ratios taken from short lists. Each column is therefore written in
+# whichever of these is smallest:
+#
+#   column    u8 layout, then
+#               0 constant     one value                 (no per-row bytes)
+#               1 dictionary   u16 n, n values, count u8 codes
+#               2 dictionary   u16 n, n values, count u16 codes
+#               3 plain        count values
+#   values    strings: u16 length per value, then the utf-8 bytes back to back
+#             numbers: u8 storage, u8 scale, then the values as storage items, where
+#             storage is b'b', b'h', b'i' or b'q' (signed integers of 1/2/4/8 bytes, the
+#             value times 10**scale) or b'd' (doubles)
+#
+# Numbers are only stored as scaled integers when that gives back exactly the same
+# double, so values round-trip exactly as they do through JSON. Missing values are the
+# smallest integer of the storage type, or NaN for doubles. Columns without a default
+# (type, data, sf, bw, cr) must not have missing values, and integer columns stored as
+# doubles must hold whole numbers; decode() rejects the batch otherwise.
+#
+# Version 1 (still accepted) was row oriented: a type/source string table, fixed 48-byte
+# struct records (TRANSMISSION / RECEPTION below), then the data fields back to back.
+MIMETYPE = 'application/vnd.loraid.batch'
+MAGIC = b'LR'
+VERSION = 2
+
+HEADER = struct.Struct('<2sBBI')
+# type, source, sf, cr, bw, rssi, snr, delay, datarate, latency, compression ratio, data length
+TRANSMISSION = struct.Struct('<BBBBIhdidddH')
+# rssi, snr, data length
+RECEPTION = struct.Struct('<hdH')
+
+TABLES = {1: 'transmissions', 2: 'receptions'}
+TABLE_IDS = {name: table_id for table_id, name in TABLES.items()}
+
+MISSING_RSSI = -32768
+MISSING_DELAY = -2 ** 31
+NAN = float('nan')
+
+REQUIRED = object()
+
+# (API field, kind, default) per insert tuple position; kind is 'str', 'int' or 'float'
+TRANSMISSION_COLUMNS = [
+    ('type', 'str', REQUIRED), ('data', 'str', REQUIRED), ('sf', 'int', REQUIRED), ('bw', 'int', REQUIRED),
+    ('cr', 'int', REQUIRED), ('rssi', 'float', None), ('snr', 'float', None), ('delay', 'int', None),
+    ('datarate', 'float', None), ('latency', 'float', None), ('source', 'str', 'standard'),
+    ('compressionRatio', 'float', 1.0)
+]
+RECEPTION_COLUMNS = [('data', 'str', REQUIRED), ('rssi', 'float', None), ('snr', 'float', None)]
+COLUMNS = {'transmissions': TRANSMISSION_COLUMNS, 'receptions': RECEPTION_COLUMNS}
+
+CONSTANT, DICT8, DICT16, PLAIN = range(4)
+INTEGER_STORAGE = [b'b', b'h', b'i', b'q']
+MAX_SCALE = 4
+# Constant columns take no bytes per row, so the row count of a version 2 batch is capped
+# rather than trusted
+MAX_ROWS = 1 << 20
+
+_u16 = struct.Struct('<H')
+_number_header = struct.Struct('<cB')
+_swap = sys.byteorder != 'little'
+
+
+def _strings(view, offset):
+    if offset >= len(view):
+        raise ValueError('truncated string table')
+    strings = []
+    count = view[offset]
+    offset += 1
+    for _ in range(count):
+        if offset >= len(view):
+            raise ValueError('truncated string table')
+        length = view[offset]
+        end = offset + 1 + length
+        if end > len(view):
+            raise ValueError('truncated string table')
+        strings.append(str(view[offset + 1:end], 'utf-8'))
+        offset = end
+    return strings, offset
+
+
+def _payloads(view, offset, lengths, end=None):
+    # Slices the section starting at offset by the given lengths. Pure ASCII (the common
+    # case) is decoded once and sliced as text.
+    end = len(view) if end is None else end
+    ends = list(accumulate(lengths, initial=offset))
+    if ends[-1] != end:
+        raise ValueError(f'payload section is {end - offset} bytes, records declare {ends[-1] - offset}')
+    blob = view[offset:end]
+    try:
+        text = str(blob, 'ascii')
+    except UnicodeDecodeError:
+        return [str(view[start:stop], 'utf-8') for start, stop in zip(ends, ends[1:])]
+    return [text[start - offset:stop - offset] for start, stop in zip(ends, ends[1:])]
+
+
+def _array(typecode, view, offset, count):
+    items = array(typecode)
+    end = offset + count * items.itemsize
+    if end > len(view):
+        raise ValueError('batch is truncated')
+    items.frombytes(view[offset:end])
+    if _swap:
+        items.byteswap()
+    return items, end
+
+
+def _whole_numbers(values):
+    # Doubles in an integer column must be whole and fit SQLite's 64-bit integers
+    if not all(value is None or (value.is_integer() and -2 ** 63 <= value < 2 ** 63) for value in values):
+        raise ValueError('integer column holds a value that is not a whole number')
+    return [None if value is None else int(value) for value in values]
+
+
+def _read_values(view, offset, count, kind):
+    if kind == 'str':
+        lengths, offset = _array('H', view, offset, count)
+        end = offset + sum(lengths)
+        if end > len(view):
+            raise ValueError('batch is truncated')
+        return _payloads(view, offset, lengths, end), end
+    if offset + _number_header.size > len(view):
+        raise ValueError('batch is truncated')
+    storage, scale = _number_header.unpack_from(view, offset)
+    offset += _number_header.size
+    if storage == b'd':
+        items, offset = _array('d', view, offset, count)
+        values = items.tolist()
+        if any(value != value for value in values):
+            values = [None if value != value else value for value in values]
+        if kind == 'int':
+            values = _whole_numbers(values)
+        return values, offset
+    if storage not in INTEGER_STORAGE or scale > MAX_SCALE:
+        raise ValueError(f'unknown number storage {storage!r}/{scale}')
+    items, offset = _array(storage.decode(), view, offset, count)
+    values = items.tolist()
+    missing = -1 << (items.itemsize * 8 - 1)
+    if kind == 'float':
+        divisor = 10 ** scale
+        values = [None if value == missing else value / divisor for value in values]
+    elif count and min(items) == missing:
+        values = [None if value == missing else value for value in values]
+    return values, offset
+
+
+def _read_column(view, offset, count, kind):
+    if offset >= len(view):
+        raise ValueError('batch is truncated')
+    layout = view[offset]
+    offset += 1
+    if layout == PLAIN:
+        return _read_values(view, offset, count, kind)
+    if layout == CONSTANT:
+        value, offset = _read_values(view, offset, 1, kind)
+        return value * count, offset
+    if layout not in (DICT8, DICT16):
+        raise ValueError(f'unknown column layout {layout}')
+    if offset + _u16.size > len(view):
+        raise ValueError('batch is truncated')
+    size, = _u16.unpack_from(view, offset)
+    dictionary, offset = _read_values(view, offset + _u16.size, size, kind)
+    codes, offset = _array('B' if layout == DICT8 else 'H', view, offset, count)
+    if count and max(codes) >= size:
+        raise ValueError('column code outside its dictionary')
+    return list(map(dictionary.__getitem__, codes)), offset
+
+
+def _decode_columns(view, offset, count, table):
+    columns = []
+    for field, kind, default in COLUMNS[table]:
+        values, offset = _read_column(view, offset, count, kind)
+        if default is REQUIRED and None in values:
+            raise ValueError(f'{field} is missing in row {values.index(None)}')
+        columns.append(values)
+    if offset != len(view):
+        raise ValueError(f'{len(view) - offset} unexpected bytes after the last column')
+    if table == 'transmissions':
+        compression = columns[-1]
+        if None in compression:
+            columns[-1] = [1.0 if value is None else value for value in compression]
+    return list(zip(*columns))
+
+
+def _decode_records(view, offset, count, table):
+    # Version 1
+    if table == 'transmissions':
+        strings, offset = _strings(view, offset)
+        record = TRANSMISSION
+    else:
+        record = RECEPTION
+    end = offset + count * record.size
+    if end > len(view):
+        raise ValueError(f'batch declares {count} records but is truncated')
+    records = list(record.iter_unpack(view[offset:end]))
+    if not records:
+        return []
+    data = _payloads(view, end, [r[-1] for r in records])
+
+    if table == 'receptions':
+        return [
+            (payload, None if rssi == MISSING_RSSI else rssi, None if snr != snr else snr)
+            for (rssi, snr, _), payload in zip(records, data)
+        ]
+    try:
+        return [
+            (strings[type_index], payload, sf, bw, cr,
+             None if rssi == MISSING_RSSI else rssi, None if snr != snr else snr,
+             None if delay == MISSING_DELAY else delay,
+             None if datarate != datarate else datarate, None if latency != latency else latency,
+             strings[source_index], 1.0 if compression != compression else compression)
+            for (type_index, source_index, sf, cr, bw, rssi, snr, delay, datarate, latency, compression, _), payload
+            in zip(records, data)
+        ]
+    except IndexError:
+        raise ValueError('record refers to a string outside the string table')
+
+
+def decode(body, table):
+    # Returns the insert tuples for write_rows(); raises ValueError on a malformed batch
+    view = memoryview(body)
+    if len(view) < HEADER.size:
+        raise ValueError('batch is shorter than its header')
+    magic, version, table_id, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError('not a binary batch (bad magic)')
+    if TABLES.get(table_id) != table:
+        raise ValueError(f'batch holds {TABLES.get(table_id, "unknown")} records, expected {table}')
+    if version == 2:
+        if count > MAX_ROWS:
+            raise ValueError(f'batch declares {count} rows, more than {MAX_ROWS}')
+        return _decode_columns(view, HEADER.size, count, table)
+    if version == 1:
+        return _decode_records(view, HEADER.size, count, table)
+    raise ValueError(f'unsupported batch version {version}')
+
+
+def _number_storage(values, kind):
+    # (storage, scale) of the smallest exact encoding of the non-missing values
+    present = [value for value in values if value is not None]
+    for scale in range(MAX_SCALE + 1 if kind == 'float' else 1):
+        divisor = 10 ** scale
+        try:
+            scaled = [round(value * divisor) for value in present]
+        except (OverflowError, ValueError):
+            break
+        if kind == 'float' and any(number / divisor != value for number, value in zip(scaled, present)):
+            continue
+        low, high = (min(scaled), max(scaled)) if scaled else (0, 0)
+        for storage in INTEGER_STORAGE:
+            bits = array(storage.decode()).itemsize * 8
+            # The smallest value of each storage type marks a missing value
+            if -(1 << (bits - 1)) < low and high < 1 << (bits - 1):
+                return storage, scale
+    return b'd', 0
+
+
+def _write_strings(parts, values, encoded):
+    lengths = array('H', (len(encoded[value]) for value in values))
+    if _swap:
+        lengths.byteswap()
+    parts.append(lengths.tobytes())
+    parts.append(b''.join(encoded[value] for value in values))
+
+
+def _write_numbers(parts, values, storage, scale):
+    parts.append(_number_header.pack(storage, scale))
+    if storage == b'd':
+        items = array('d', (NAN if value is None else value for value in values))
+    else:
+        items = array(storage.decode())
+        missing = -1 << (items.itemsize * 8 - 1)
+        divisor = 10 ** scale
+        items.extend(missing if value is None else round(value * divisor) for value in values)
+    if _swap:
+        items.byteswap()
+    parts.append(items.tobytes())
+
+
+def _write_column(parts, values, kind):
+    # Sizes each layout from the distinct values, then writes the smallest
+    distinct = list(dict.fromkeys(values))
+    if kind == 'str':
+        encoded = {value: value.encode('utf-8') for value in distinct}
+        if any(len(value) > 0xffff for value in encoded.values()):
+            raise ValueError('string longer than 65535 bytes')
+        sizes = {value: 2 + len(data) for value, data in encoded.items()}
+        plain_size = sum(map(sizes.__getitem__, values))
+        dictionary_size = sum(sizes.values())
+
+        def write(values):
+            _write_strings(parts, values, encoded)
+    else:
+        storage, scale = _number_storage(distinct, kind)
+        itemsize = array(storage.decode()).itemsize
+        plain_size = len(values) * itemsize
+        dictionary_size = len(distinct) * itemsize
+
+        def write(values):
+            _write_numbers(parts, values, storage, scale)
+
+    if len(distinct) == 1:
+        parts.append(bytes([CONSTANT]))
+        write(distinct)
+        return
+    code = 'B' if len(distinct) <= 0x100 else 'H'
+    dictionary_size += _u16.size + len(values) * array(code).itemsize
+    if len(distinct) <= 0xffff and dictionary_size < plain_size:
+        index = {value: position for position, value in enumerate(distinct)}
+        codes = array(code, map(index.__getitem__, values))
+        if _swap:
+            codes.byteswap()
+        parts.append(bytes([DICT8 if code == 'B' else DICT16]))
+        parts.append(_u16.pack(len(distinct)))
+        write(distinct)
+        parts.append(codes.tobytes())
+        return
+    parts.append(bytes([PLAIN]))
+    write(values)
+
+
+def _column(rows, field, kind, default):
+    values = [row[field] for row in rows] if default is REQUIRED else [row.get(field, default) for row in rows]
+    if kind == 'str':
+        return [str(value) for value in values]
+    cast = int if kind == 'int' else float
+    # NaN is missing, as the NaN sentinel always was
+    return [None if value is None or value != value else cast(value) for value in values]
+
+
+def encode(table, rows):
+    # Encodes rows given as API dicts (the JSON fields of /api/transmission or
+    # /api/reception); used by gateways and the benchmark
+    parts = [HEADER.pack(MAGIC, VERSION, TABLE_IDS[table], len(rows))]
+    for field, kind, default in COLUMNS[table]:
+        _write_column(parts, _column(rows, field, kind, default), kind)
+    return b''.join(parts)